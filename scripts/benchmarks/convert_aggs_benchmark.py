@@ -0,0 +1,96 @@
+"""
+Benchmark of aggregation conversion: responses/sec of the name-parsing
+conversion with full SnpAggsModel validation used before aggregation plans
+versus the current plan lookup.
+
+Run from the repository root:
+
+    python -m scripts.benchmarks.convert_aggs_benchmark
+"""
+import asyncio
+import json
+import random
+import time
+
+from src.graphql.models.annotation_model import AggregationItem, Bucket, DocCount, Histogram
+from src.graphql.models.generated.snp_aggs import SnpAggsModel
+from src.graphql.models.snp_model import SnpAggs
+from src.graphql.resolvers.helper_resolver import convert_aggs, get_aggregation_query
+from src.utils import clean_field_name
+
+FIELD_COUNT = 500
+RESPONSES = 20
+REPEAT = 3
+
+
+def make_aggregations(field_count: int):
+    with open("./data/anno_tree.json") as f:
+        leaves = [elt for elt in json.load(f) if elt.get("leaf")]
+    aggregation_fields = []
+    for elt in leaves[:field_count]:
+        if elt.get("field_type", "text") == "text":
+            aggregation_fields.append((elt["name"], ["doc_count", "frequency", "missing"]))
+        else:
+            aggregation_fields.append((elt["name"], ["doc_count", "min", "max", "histogram"]))
+    query = asyncio.run(get_aggregation_query(aggregation_fields, Histogram()))
+
+    def buckets():
+        return {
+            "buckets": [
+                {"key": f"value_{i}", "doc_count": random.randint(0, 1000)} for i in range(20)
+            ]
+        }
+
+    values = {
+        "filter": lambda: {"doc_count": random.randint(0, 1_000_000)},
+        "min": lambda: {"value": random.random()},
+        "max": lambda: {"value": random.random()},
+        "missing": lambda: {"doc_count": random.randint(0, 1000)},
+        "terms": buckets,
+        "histogram": buckets,
+    }
+    return {name: values[next(iter(agg))]() for name, agg in query.items()}
+
+
+def _map_aggs_value(key, value):
+    if key.endswith(("min", "max")):
+        return value.get("value")
+    elif key.endswith("missing"):
+        return DocCount(doc_count=value["doc_count"])
+    elif key in ("histogram", "frequency"):
+        return [Bucket(key=b["key"], doc_count=b["doc_count"]) for b in value["buckets"]]
+    else:
+        return value.get("doc_count")
+
+
+def parsed(aggs):
+    data = {}
+    for key, val in aggs.items():
+        for suffix in ("doc_count", "min", "max", "frequency", "missing", "histogram"):
+            if key.endswith("_" + suffix):
+                original_field = key[: -len(suffix) - 1]
+                break
+        cleaned_field = clean_field_name(original_field)
+        if cleaned_field not in data:
+            data[cleaned_field] = AggregationItem(doc_count=None)
+        if hasattr(data[cleaned_field], suffix):
+            setattr(data[cleaned_field], suffix, _map_aggs_value(suffix, val))
+    return SnpAggs.from_pydantic(SnpAggsModel(**data))
+
+
+def responses_per_second(fn, aggs) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(RESPONSES):
+            fn(aggs)
+        best = min(best, time.perf_counter() - start)
+    return RESPONSES / best
+
+
+if __name__ == "__main__":
+    aggs = make_aggregations(FIELD_COUNT)
+    print(f"{FIELD_COUNT} fields, {len(aggs)} aggregations, {RESPONSES} responses, best of {REPEAT}")
+    old = responses_per_second(parsed, aggs)
+    new = responses_per_second(convert_aggs, aggs)
+    print(f"before: {old:10,.0f} responses/s  after: {new:10,.0f} responses/s  ({new / old:.1f}x)")
@@ -0,0 +1,93 @@
+"""
+Benchmark of hit conversion: rows/sec of the per-hit validation path used
+before projection plans versus the current projection path.  The REST
+paths include rendering the response body, which the validated path left to
+the response_model serialization.
+
+Run from the repository root:
+
+    python -m scripts.benchmarks.convert_hits_benchmark
+"""
+import json
+import random
+import time
+
+from src.graphql.models.generated.snp import SnpModel
+from src.graphql.models.return_info_model import OutputSnpInfo
+from src.graphql.models.snp_model import Snp
+from src.graphql.resolvers.api_snp_helper_resolver import render_snp_output
+from src.graphql.resolvers.helper_resolver import convert_scroll_hits
+from src.utils import clean_field_name
+
+ROWS = 10_000
+FIELD_COUNT = 20
+REPEAT = 3
+
+
+def make_hits(rows: int, field_count: int):
+    with open("./data/anno_tree.json") as f:
+        leaves = [elt for elt in json.load(f) if elt.get("leaf")]
+    fields = [elt["name"] for elt in leaves[:field_count]]
+    types = {elt["name"]: elt.get("field_type", "text") for elt in leaves}
+
+    def value(field):
+        if types[field] == "long":
+            return random.randint(0, 1_000_000)
+        if types[field] == "float":
+            return random.random()
+        return f"value_{random.randint(0, 1000)}"
+
+    hits = [
+        {"_id": f"1:{i}A>G", "_source": {field: value(field) for field in fields}}
+        for i in range(rows)
+    ]
+    return fields, hits
+
+
+def validated_graphql(fields, hits):
+    results = []
+    for hit in hits:
+        values = {clean_field_name(k): v for k, v in hit["_source"].items()}
+        values["id"] = hit["_id"]
+        results.append(Snp.from_pydantic(SnpModel(**values)))
+    return results
+
+
+def validated_rest(fields, hits):
+    return OutputSnpInfo(
+        success=True,
+        message="OK",
+        details=[
+            SnpModel(**{clean_field_name(k): v for k, v in hit["_source"].items()})
+            for hit in hits
+        ],
+    ).model_dump_json(by_alias=True, exclude_none=True)
+
+
+def projected_rest(fields, hits):
+    return render_snp_output(fields, hits)
+
+
+def projected_graphql(fields, hits):
+    return convert_scroll_hits(hits, None, fields)
+
+
+def rows_per_second(fn, fields, hits) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(fields, hits)
+        best = min(best, time.perf_counter() - start)
+    return len(hits) / best
+
+
+if __name__ == "__main__":
+    fields, hits = make_hits(ROWS, FIELD_COUNT)
+    print(f"{ROWS} hits, {FIELD_COUNT} fields, best of {REPEAT}")
+    for label, before, after in (
+        ("REST", validated_rest, projected_rest),
+        ("GraphQL", validated_graphql, projected_graphql),
+    ):
+        old = rows_per_second(before, fields, hits)
+        new = rows_per_second(after, fields, hits)
+        print(f"{label:8s} before: {old:12,.0f} rows/s  after: {new:12,.0f} rows/s  ({new / old:.1f}x)")
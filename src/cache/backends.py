@@ -0,0 +1,77 @@
+import pickle
+from typing import Any, Protocol
+
+from src.cache.lru_ttl_cache import MISSING, LRUTTLCache
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> Any: ...
+
+    async def set(self, key: str, value: Any, ttl_seconds: float | None = None): ...
+
+    async def clear(self): ...
+
+
+class InMemoryCacheBackend:
+    """
+    Process-local backend, used by default and as the stand-in for shared
+    backends in tests.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache = LRUTTLCache(max_size, ttl_seconds)
+
+    async def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl_seconds: float | None = None):
+        self._cache.set(key, value, ttl_seconds)
+
+    async def clear(self):
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class RedisCacheBackend:
+    """
+    Backend shared by several workers through Redis.  Values are pickled and
+    Redis enforces the TTL; size is bounded by the server's maxmemory policy.
+    Requires the optional `redis` package.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError("The 'redis' package is required for a redis:// CACHE_URL") from e
+        self._client = redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Any:
+        data = await self._client.get(key)
+        return MISSING if data is None else pickle.loads(data)
+
+    async def set(self, key: str, value: Any, ttl_seconds: float | None = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        await self._client.set(key, pickle.dumps(value), px=int(ttl * 1000))
+
+    async def clear(self):
+        # Keys carry the index generation, so stale entries simply expire
+        pass
+
+
+def create_cache_backend(url: str | None, max_size: int, ttl_seconds: float) -> CacheBackend:
+    """
+    Create the cache backend for a CACHE_URL setting
+
+    Params: url: redis:// or rediss:// URL for a shared cache, empty for in-memory
+            max_size: Maximum number of entries of the in-memory backend
+            ttl_seconds: Default time-to-live of entries
+
+    Returns: CacheBackend
+    """
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisCacheBackend(url, ttl_seconds)
+    return InMemoryCacheBackend(max_size, ttl_seconds)
@@ -0,0 +1,174 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Names of indexed downloads: a content key or random id (a uuid for files
+# written by earlier versions) and the file extension
+_DOWNLOAD_FILE = re.compile(r"^([0-9a-f][0-9a-f-]{31,63})\.txt$")
+# Temporary files of downloads that were still being written
+_PARTIAL_FILE = re.compile(r"\.part$")
+
+
+class DownloadFile(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    last_access: float
+
+
+class DownloadCache:
+    """
+    In-memory index of the files in the download directory, keyed on the
+    content key (or random id) in their names, with least-recently-used
+    eviction.
+
+    Quotas on the total size and the number of files are enforced when a file
+    is added, and files idle for too long are dropped by expire().  Entries
+    are kept in access order, so both only look at the files they evict and
+    never list the directory.  The size of an entry includes the gzip copy
+    next to the file, if any.
+
+    The index only tracks files; evicted paths are returned to the caller to
+    delete, so that the file system calls can run off the event loop.
+    """
+
+    def __init__(self, max_bytes: int, max_files: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.total_bytes = 0
+        self._files: OrderedDict[str, DownloadFile] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def get(self, key: str) -> str | None:
+        """
+        Path of a cached download, marked as recently used
+
+        Params: key: Content key of the download
+
+        Returns: path, or None when the file is not cached (or was removed)
+        """
+        entry = self._files.get(key)
+        if entry is None or not os.path.isfile(entry.path):
+            if entry is not None:
+                self._forget(key)
+            self.misses += 1
+            return None
+        self.mark_used(key)
+        self.hits += 1
+        return entry.path
+
+    def mark_used(self, key: str):
+        """Record an access to a file, e.g. when it is served"""
+        entry = self._files.get(key)
+        if entry is not None:
+            self._files[key] = entry._replace(last_access=time.time())
+            self._files.move_to_end(key)
+
+    def _forget(self, key: str) -> DownloadFile:
+        entry = self._files.pop(key)
+        self.total_bytes -= entry.size
+        return entry
+
+    def _over_quota(self) -> bool:
+        return self.total_bytes > self.max_bytes or (
+            self.max_files is not None and len(self._files) > self.max_files
+        )
+
+    def add(
+        self,
+        key: str,
+        path: str,
+        size: int,
+        mtime: float | None = None,
+        last_access: float | None = None,
+    ) -> list[str]:
+        """
+        Record a finished download, evicting the least recently used files
+        until the byte and file quotas are met again.  The new file itself is
+        never evicted.
+
+        Params: key: Content key of the download
+                path: Path of the file
+                size: File size in bytes
+                mtime: Modification time, defaults to now
+                last_access: Time of the last access, defaults to mtime
+
+        Returns: paths of the evicted files, to be deleted
+        """
+        if key in self._files:
+            self._forget(key)
+        mtime = time.time() if mtime is None else mtime
+        last_access = mtime if last_access is None else last_access
+        self._files[key] = DownloadFile(path, size, mtime, last_access)
+        self.total_bytes += size
+        evicted = []
+        while self._over_quota() and len(self._files) > 1:
+            evicted.append(self._forget(next(iter(self._files))).path)
+        self.evicted += len(evicted)
+        return evicted
+
+    def expire(self, idle_seconds: float) -> list[str]:
+        """
+        Drop the files not accessed for idle_seconds
+
+        Returns: paths of the expired files, to be deleted
+        """
+        cutoff = time.time() - idle_seconds
+        expired = []
+        while self._files:
+            key, entry = next(iter(self._files.items()))
+            if entry.last_access >= cutoff:
+                break
+            expired.append(self._forget(key).path)
+        self.evicted += len(expired)
+        return expired
+
+    def load(self, directory: str) -> list[str]:
+        """
+        Index the downloads already in a directory, in the order of their
+        modification times, e.g. after a restart
+
+        Params: directory: Download directory
+
+        Returns: paths of the files to delete: leftovers of interrupted
+                 downloads and the files evicted to meet the quotas
+        """
+        if not os.path.isdir(directory):
+            return []
+        found = []
+        stale = []
+        with os.scandir(directory) as entries:
+            for dir_entry in entries:
+                if _PARTIAL_FILE.search(dir_entry.name):
+                    stale.append(dir_entry.path)
+                    continue
+                match = _DOWNLOAD_FILE.match(dir_entry.name)
+                if match:
+                    stat = dir_entry.stat()
+                    size = stat.st_size
+                    if os.path.isfile(dir_entry.path + ".gz"):
+                        size += os.path.getsize(dir_entry.path + ".gz")
+                    found.append((stat.st_mtime, match.group(1), dir_entry.path, size))
+        for mtime, key, path, size in sorted(found):
+            stale += self.add(key, path, size, mtime)
+        return stale
+
+    def stats(self) -> dict:
+        oldest = next(iter(self._files.values()), None)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "files": len(self._files),
+            "max_files": self.max_files,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "oldest_access_seconds": round(time.time() - oldest.last_access, 1) if oldest else None,
+        }
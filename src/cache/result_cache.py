@@ -0,0 +1,80 @@
+import hashlib
+from typing import Any
+
+import orjson
+
+from src.cache.backends import CacheBackend
+from src.cache.lru_ttl_cache import MISSING
+from src.config.settings import settings
+
+def get_index_generation() -> str:
+    """
+    Identifier of the data currently served: index name and the configured
+    ES_INDEX_GENERATION.  Results cached for another generation are never
+    read again and expire with their TTL.
+    """
+    return f"{settings.ES_INDEX}:{settings.ES_INDEX_GENERATION}"
+
+
+def _serialize_default(obj: Any):
+    # Named tuples such as Region serialize as arrays
+    if isinstance(obj, tuple):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def canonical_key(*parts: Any) -> str:
+    """
+    Stable digest of JSON-serializable parts (queries, field lists, windows),
+    independent of dictionary key order.
+    """
+    data = orjson.dumps(parts, default=_serialize_default, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of query results keyed on the canonical query and the index
+    generation, with hit/miss counters.
+    """
+
+    def __init__(self, namespace: str, backend: CacheBackend):
+        self.namespace = namespace
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def make_key(self, *parts: Any) -> str:
+        return f"annoq:{self.namespace}:{get_index_generation()}:{canonical_key(*parts)}"
+
+    async def get(self, key: str) -> Any:
+        """Cached value, or MISSING when absent or when the backend fails"""
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            # An unreachable cache (e.g. Redis down) or an entry that does not
+            # load must not fail the request: count it as a miss
+            self.errors += 1
+            value = MISSING
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl_seconds: float | None = None):
+        """Store a value; backend failures only skip the store"""
+        try:
+            await self.backend.set(key, value, ttl_seconds)
+        except Exception:
+            self.errors += 1
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        stats = {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+        if hasattr(self.backend, "__len__"):
+            stats["size"] = len(self.backend)
+        return stats
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key so that only one underlying
+    coroutine runs; every caller awaiting that key receives its result.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn for key unless a call for the same key is already in flight.
+
+        The shared call runs as its own task, so a cancelled caller does not
+        cancel the work other callers are waiting on.
+
+        Params: key: Key identifying identical calls
+                fn: Zero-argument coroutine function doing the actual work
+
+        Returns: result of fn
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
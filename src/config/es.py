@@ -6,4 +6,12 @@ es = AsyncElasticsearch(settings.ES_URL,
     connections_per_node=400,
     request_timeout=120,
     max_retries=10,
-    retry_on_timeout=True)
\ No newline at end of file
+    retry_on_timeout=True)
+
+# Separate pool for download streams, so that long PIT scans can not take
+# the connections interactive queries need
+es_bulk = AsyncElasticsearch(settings.ES_URL,
+    connections_per_node=settings.ES_BULK_CONNECTIONS,
+    request_timeout=120,
+    max_retries=10,
+    retry_on_timeout=True)
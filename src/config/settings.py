@@ -6,6 +6,8 @@ load_dotenv(override=True)
 
 class Settings(BaseSettings):
     DEBUG:bool = os.getenv("DEBUG")
+    # Validate every SNP returned against SnpModel (slow, for debugging the index contents)
+    VALIDATE_SNP_OUTPUT:bool = os.getenv("VALIDATE_SNP_OUTPUT", False)
     ES_HOST:str = os.getenv("ES_HOST")
     ES_PORT:int = int(os.getenv("ES_PORT"))
     ES_INDEX:str = os.getenv("ES_INDEX")
@@ -17,4 +19,42 @@ class Settings(BaseSettings):
     SIZE_DOWNLOAD_SIZE:int = int(os.getenv("SIZE_DOWNLOAD_SIZE"))
     GA_MEASUREMENT_ID:str = os.getenv("GA_MEASUREMENT_ID", "")
     GA_API_SECRET:str = os.getenv("GA_API_SECRET", "")
+    ES_INDEX_GENERATION:str = os.getenv("ES_INDEX_GENERATION", "")
+    CACHE_URL:str = os.getenv("CACHE_URL", "")
+    SEARCH_CACHE_SIZE:int = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+    SEARCH_CACHE_TTL_SECONDS:int = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 600))
+    COUNT_CACHE_SIZE:int = int(os.getenv("COUNT_CACHE_SIZE", 4096))
+    COUNT_CACHE_TTL_SECONDS:int = int(os.getenv("COUNT_CACHE_TTL_SECONDS", 3600))
+    # Complete frequency bucket sets kept for paging, per field and query
+    FREQUENCY_CACHE_SIZE:int = int(os.getenv("FREQUENCY_CACHE_SIZE", 256))
+    FREQUENCY_CACHE_TTL_SECONDS:int = int(os.getenv("FREQUENCY_CACHE_TTL_SECONDS", 600))
+    # Most buckets kept per field and query, later pages are queried directly
+    FREQUENCY_CACHE_MAX_BUCKETS:int = int(os.getenv("FREQUENCY_CACHE_MAX_BUCKETS", 100000))
+    # Concurrent PIT slices per download stream, and batches prefetched ahead of the client
+    STREAM_SLICES:int = int(os.getenv("STREAM_SLICES", 4))
+    STREAM_QUEUE_SIZE:int = int(os.getenv("STREAM_QUEUE_SIZE", 8))
+    # Download pages are sized to about this many bytes per elasticsearch response, within the batch size bounds
+    STREAM_TARGET_BATCH_BYTES:int = int(os.getenv("STREAM_TARGET_BATCH_BYTES", 8 * 1024 * 1024))
+    STREAM_MIN_BATCH_SIZE:int = int(os.getenv("STREAM_MIN_BATCH_SIZE", 250))
+    STREAM_MAX_BATCH_SIZE:int = int(os.getenv("STREAM_MAX_BATCH_SIZE", 10000))
+    # How long a download PIT outlives its last request; bounds how late a download stopped by the client can resume
+    STREAM_PIT_KEEP_ALIVE:str = os.getenv("STREAM_PIT_KEEP_ALIVE", "10m")
+    # Download admission: concurrent streams overall and per client, and how many may wait for a slot
+    DOWNLOAD_MAX_STREAMS:int = int(os.getenv("DOWNLOAD_MAX_STREAMS", 8))
+    DOWNLOAD_MAX_STREAMS_PER_CLIENT:int = int(os.getenv("DOWNLOAD_MAX_STREAMS_PER_CLIENT", 2))
+    DOWNLOAD_MAX_QUEUED:int = int(os.getenv("DOWNLOAD_MAX_QUEUED", 32))
+    DOWNLOAD_QUEUE_TIMEOUT_SECONDS:float = float(os.getenv("DOWNLOAD_QUEUE_TIMEOUT_SECONDS", 30))
+    # Connections of the separate elasticsearch client used by download streams
+    ES_BULK_CONNECTIONS:int = int(os.getenv("ES_BULK_CONNECTIONS", 32))
+    # GraphQL file downloads: concurrent export jobs, file writer threads and bytes buffered per write
+    DOWNLOAD_MAX_JOBS:int = int(os.getenv("DOWNLOAD_MAX_JOBS", 4))
+    DOWNLOAD_WRITER_THREADS:int = int(os.getenv("DOWNLOAD_WRITER_THREADS", 4))
+    DOWNLOAD_WRITE_BUFFER_BYTES:int = int(os.getenv("DOWNLOAD_WRITE_BUFFER_BYTES", 1024 * 1024))
+    # Quotas of the download directory (least recently used files are deleted first) and idle file expiry
+    DOWNLOAD_CACHE_MAX_BYTES:int = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+    DOWNLOAD_CACHE_MAX_FILES:int = int(os.getenv("DOWNLOAD_CACHE_MAX_FILES", 10000))
+    DOWNLOAD_FILE_MAX_IDLE_SECONDS:int = int(os.getenv("DOWNLOAD_FILE_MAX_IDLE_SECONDS", 24 * 3600))
+    DOWNLOAD_JANITOR_INTERVAL_SECONDS:int = int(os.getenv("DOWNLOAD_JANITOR_INTERVAL_SECONDS", 60))
+    # Write a .gz copy of every finished download, served to clients accepting gzip
+    DOWNLOAD_GZIP_COPIES:bool = os.getenv("DOWNLOAD_GZIP_COPIES", False)
 settings = Settings()
@@ -1,4 +1,4 @@
-from src.data_adapter.snp_attributes import get_keyword_searchable_set
+from src.data_adapter.snp_attributes import get_keyword_searchable_fields
 
 def keyword_query_for_fields_with_filters(keyword: str, keyword_fields:list[str] = None, filter_fields:list[str] = None):
     """
@@ -14,7 +14,7 @@ def keyword_query_for_fields_with_filters(keyword: str, keyword_fields:list[str]
     #     data = json.load(f)
     #     searchable_fields = [elt['name'] for elt in data if data.get('keyword_searchable', False)]
     if keyword_fields is None:
-      searchable_fields = list(get_keyword_searchable_set())
+      searchable_fields = get_keyword_searchable_fields()
     else:
       searchable_fields = keyword_fields  
       
@@ -45,6 +45,7 @@ class SnpAttributes:
         self.leaf_set = None
         self.gene_id_search_fields = None
         self.leaf_name_to_type = None
+        self.keyword_searchable_fields = None
 
     def initialize(self):
         with open("./data/anno_tree.json") as f:
@@ -55,6 +56,7 @@ class SnpAttributes:
             leaf_name_lookup = {}
             leaf_name_to_type = {}
             gene_id_search_fields = []
+            keyword_searchable_fields = []
 
             for elt in data:
                 if "id" in elt:
@@ -86,6 +88,7 @@ class SnpAttributes:
                     # cur["searchable"] = searchable
                     if searchable == True:
                         searchable_set.add(elt["name"])
+                        keyword_searchable_fields.append(elt["name"])
                     # if 'label' in elt:
                     #     cur["display_label"] = elt['label']
                     if "detail" in elt:
@@ -116,6 +119,8 @@ class SnpAttributes:
         self.leaf_set = set(leaf_name_lookup.keys())
         self.gene_id_search_fields = gene_id_search_fields
         self.leaf_name_to_type = leaf_name_to_type
+        # Immutable so it can be shared by every keyword query without copying
+        self.keyword_searchable_fields = tuple(keyword_searchable_fields)
 
 
 # def init_snp_attribute_info():
@@ -157,6 +162,10 @@ def get_keyword_searchable_set():
     return snpAttributes.searchable_set
 
 
+def get_keyword_searchable_fields():
+    return snpAttributes.keyword_searchable_fields
+
+
 def get_version_info(fields):
     rtn_lookup = {}
     for field in fields:
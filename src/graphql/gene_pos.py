@@ -1,8 +1,28 @@
-import requests
+import logging
+import os
+from bisect import bisect_right
+from typing import Iterable, NamedTuple
+
+import aiohttp
+
+from src.cache.lru_ttl_cache import MISSING, LRUTTLCache
+from src.cache.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 host = 'https://pantherdb.org'
 gene_mapping_api = '/services/oai/pantherdb/geneinfo'
-params = {"geneInputList":"ABCA1", "organism":9606}
+organism = 9606
+
+GENE_MAPPING_TIMEOUT_SECONDS = 5
+GENE_MAPPING_MAX_CONNECTIONS = 20
+GENE_CACHE_SIZE = 20000
+GENE_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+CHROMOSOME_LOCATION_FILE = './data/others/Homo_sapiens.chromosome_location_hg19'
+# Optional tab separated table of "<symbol>\t<HGNC id>" rows (e.g. an HGNC export).
+# When present, gene symbols resolve locally without calling PANTHER.
+GENE_SYMBOL_FILE = './data/others/Homo_sapiens.gene_symbols'
 
 def load_chromosomal_location(dfile='./data/others/Homo_sapiens.chromosome_location_hg19'):
     dic = {}
@@ -10,21 +30,261 @@ def load_chromosomal_location(dfile='./data/others/Homo_sapiens.chromosome_locat
         line = i.rstrip().split('\t')
         dic[line[0]] = (line[1], int(line[2]), int(line[3]))
     return dic
-    
-def map_gene(k):
-    params["geneInputList"] = k
-    try:
-        r = requests.post(url = host + gene_mapping_api, data = params, timeout=5)
-        data = r.json()
-        return data['search']['mapped_genes']['gene']["accession"]
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        print('gene mapping error:', k)
-        return ''
+
+
+class GeneRecord(NamedTuple):
+    contig: str
+    start: int
+    end: int
+    gene_id: str
+
+
+def _normalize_hgnc(value: str) -> str:
+    value = value.strip().upper()
+    if value.startswith("HGNC:"):
+        value = value[5:]
+    return "HGNC:" + value
+
+
+class GeneIndex:
+    """
+    In-memory index over the bundled chromosome location file.
+
+    Every PANTHER long gene id (e.g. HUMAN|HGNC=10741|UniProtKB=O75326) is split
+    into its identifiers, and the HGNC id, UniProt accession and any other
+    identifier in the key all point at the same GeneRecord.  Symbols are indexed
+    only when the optional symbol table is available.
+    """
+
+    def __init__(self):
+        self.by_gene_id: dict[str, GeneRecord] = {}
+        self._aliases: dict[str, GeneRecord] = {}
+
+    def add(self, record: GeneRecord):
+        self.by_gene_id[record.gene_id] = record
+        for part in record.gene_id.split("|")[1:]:
+            id_type, _, value = part.partition("=")
+            if not value:
+                continue
+            if id_type == "HGNC":
+                self._aliases.setdefault(_normalize_hgnc(value), record)
+            else:
+                self._aliases.setdefault(value.upper(), record)
+
+    def add_symbols(self, dfile: str):
+        """
+        Index gene symbols from a tab separated symbol, HGNC id table
+
+        Params: dfile: Path of the symbol table
+        """
+        for i in open(dfile):
+            line = i.rstrip().split('\t')
+            if len(line) < 2:
+                continue
+            record = self._aliases.get(_normalize_hgnc(line[1]))
+            if record is not None:
+                self._aliases.setdefault(line[0].strip().upper(), record)
+
+    def lookup(self, gene: str) -> GeneRecord | None:
+        """
+        Look up a gene by PANTHER long id, HGNC id, UniProt accession or symbol
+
+        Returns: GeneRecord or None if the gene is not indexed locally
+        """
+        record = self.by_gene_id.get(gene)
+        if record is not None:
+            return record
+        key = gene.strip().upper()
+        record = self._aliases.get(key)
+        if record is None and key.startswith("HGNC"):
+            record = self._aliases.get(_normalize_hgnc(key.replace("=", ":")))
+        return record
+
+    def __len__(self) -> int:
+        return len(self.by_gene_id)
+
+
+def load_gene_index(dfile=CHROMOSOME_LOCATION_FILE, symbol_file=GENE_SYMBOL_FILE):
+    index = GeneIndex()
+    for i in open(dfile):
+        line = i.rstrip().split('\t')
+        index.add(GeneRecord(line[1], int(line[2]), int(line[3]), line[0]))
+    if symbol_file and os.path.exists(symbol_file):
+        index.add_symbols(symbol_file)
+    return index
+
+
+class GeneOverlapIndex:
+    """
+    Reverse index from a chromosome position to the genes overlapping it.
+
+    Each chromosome is cut into elementary segments at every gene start and
+    end, and every segment stores the ids of the genes covering it.  A lookup
+    is one binary search over the segment boundaries plus returning the k
+    overlapping ids, i.e. O(log n + k).
+    """
+
+    _EMPTY: tuple[str, ...] = ()
+
+    def __init__(self, records: Iterable[GeneRecord]):
+        by_contig: dict[str, list[GeneRecord]] = {}
+        for record in records:
+            by_contig.setdefault(record.contig, []).append(record)
+
+        self._bounds: dict[str, list[int]] = {}
+        self._segments: dict[str, list[tuple[str, ...]]] = {}
+        for contig, contig_records in by_contig.items():
+            self._bounds[contig], self._segments[contig] = self._build(contig_records)
+
+    @staticmethod
+    def _build(records: list[GeneRecord]):
+        # Intervals are inclusive, so a gene stops covering positions at end + 1
+        events: dict[int, list[tuple[bool, str]]] = {}
+        for record in records:
+            # A few rows of the location file list the end before the start
+            start, end = sorted((record.start, record.end))
+            events.setdefault(start, []).append((True, record.gene_id))
+            events.setdefault(end + 1, []).append((False, record.gene_id))
+
+        bounds = []
+        segments = []
+        active: dict[str, int] = {}
+        for position in sorted(events):
+            for is_start, gene_id in events[position]:
+                if is_start:
+                    active[gene_id] = active.get(gene_id, 0) + 1
+                elif active[gene_id] == 1:
+                    del active[gene_id]
+                else:
+                    active[gene_id] -= 1
+            bounds.append(position)
+            segments.append(tuple(active))
+        return bounds, segments
+
+    def genes_at(self, contig: str, pos: int) -> tuple[str, ...]:
+        """
+        Get the ids of the genes overlapping a position
+
+        Params: contig: Chromosome
+                pos: 1-based position
+
+        Returns: tuple of PANTHER long gene ids (empty if none overlap)
+        """
+        bounds = self._bounds.get(contig)
+        if bounds is None or pos is None:
+            return self._EMPTY
+        i = bisect_right(bounds, pos) - 1
+        if i < 0:
+            return self._EMPTY
+        return self._segments[contig][i]
+
+
+class GeneResolver:
+    """
+    Maps gene symbols to PANTHER long gene ids without blocking the event loop.
+
+    Lookups go through a pooled aiohttp session, results (including "not found")
+    are kept in a TTL+LRU cache, and concurrent lookups of the same gene share a
+    single upstream request.
+    """
+
+    def __init__(
+        self,
+        url: str = host + gene_mapping_api,
+        cache_size: int = GENE_CACHE_SIZE,
+        ttl_seconds: float = GENE_CACHE_TTL_SECONDS,
+        timeout_seconds: float = GENE_MAPPING_TIMEOUT_SECONDS,
+        max_connections: int = GENE_MAPPING_MAX_CONNECTIONS,
+    ):
+        self.url = url
+        self.timeout_seconds = timeout_seconds
+        self.max_connections = max_connections
+        self._cache = LRUTTLCache(cache_size, ttl_seconds)
+        self._inflight = SingleFlight()
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+            )
+        return self._session
+
+    async def _fetch(self, gene: str) -> str:
+        """
+        Query PANTHER for a gene and cache the outcome.
+
+        Returns: PANTHER long gene id, or '' if the gene could not be mapped
+        """
+        params = {"geneInputList": gene, "organism": organism}
+        try:
+            async with self._get_session().post(self.url, data=params) as r:
+                data = await r.json(content_type=None)
+        except Exception as e:
+            # Transport failures are not cached so the next request retries
+            logger.warning(f"gene mapping error for {gene}: {e}")
+            return ''
+
+        try:
+            accession = data['search']['mapped_genes']['gene']["accession"]
+        except (KeyError, TypeError):
+            accession = ''
+        self._cache.set(gene, accession)
+        return accession
+
+    async def resolve(self, gene: str) -> str:
+        """
+        Map a gene symbol to its PANTHER long gene id
+
+        Params: gene: Gene symbol, gene id or UniProt id
+
+        Returns: PANTHER long gene id, or '' if the gene could not be mapped
+        """
+        cached = self._cache.get(gene)
+        if cached is not MISSING:
+            return cached
+        return await self._inflight.do(gene, lambda: self._fetch(gene))
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+gene_resolver = GeneResolver()
+
+
+async def map_gene(k):
+    return await gene_resolver.resolve(k)
 
 def get_pos_from_gene_id(gid, chromosomal_location_dic):
     return chromosomal_location_dic.get(gid ,None)
 
-chromosomal_location_dic = load_chromosomal_location('./data/others/Homo_sapiens.chromosome_location_hg19')
+gene_index = load_gene_index()
+chromosomal_location_dic = gene_index.by_gene_id
+gene_overlap_index = GeneOverlapIndex(chromosomal_location_dic.values())
+
+
+def get_overlapping_genes(contig: str, pos: int) -> tuple[str, ...]:
+    return gene_overlap_index.genes_at(contig, pos)
+
+
+async def resolve_gene(gene: str) -> GeneRecord | None:
+    """
+    Resolve a gene product to its location, using the local index first and
+    falling back to PANTHER only for identifiers the index does not know.
+
+    Params: gene: Gene symbol, HGNC id, UniProt accession or PANTHER long gene id
+
+    Returns: GeneRecord or None if the gene could not be located
+    """
+    record = gene_index.lookup(gene)
+    if record is not None:
+        return record
+    gene_id = await map_gene(gene)
+    return gene_index.lookup(gene_id) if gene_id else None
 
 
@@ -40,6 +40,20 @@ class AggregationItem:
     frequency: Optional[list[Bucket]] = None
     missing: Optional[DocCount] = None
 
+@strawberry.input(
+        description="Page of frequency buckets: the after_key of the previous page and the maximum number of buckets"
+)
+class FrequencyPageArgs:
+    after: Optional[str] = None
+    size: Optional[int] = 100
+
+@strawberry.type(
+        description="Page of the complete frequency buckets of a field, in key order"
+)
+class FrequencyPage:
+    buckets: list[Bucket]
+    after_key: Optional[str] = strawberry.field(default=None, description="Pass as after to get the next page; null on the last page")
+
 
 class QueryType(Enum):
     DOWNLOAD = 'DOWNLOAD'
@@ -52,3 +66,21 @@ class QueryTypeOption(Enum):
     SNPS = 'SNPS'
     SCROLL = 'SCROLL'
 
+@strawberry.enum
+class DownloadState(Enum):
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+@strawberry.type(
+        description="Progress of a file download started by one of the download fields"
+)
+class DownloadStatus:
+    id: str
+    state: DownloadState
+    records: int = strawberry.field(description="Number of records written so far")
+    bytes_written: int
+    url: Optional[str] = strawberry.field(default=None, description="/download URL of the file, once the state is DONE")
+    error: Optional[str] = None
+    cached: bool = strawberry.field(default=False, description="Served the file of an earlier identical download; records is not counted then")
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 #import strawberry
 #from src.graphql.models.snp_model import SnpList, Snp
@@ -14,9 +14,15 @@ class OperationInfo(BaseModel):
 class OutputSnpInfo(OperationInfo):
     details: Optional[List[SnpModel]] = None
     version: Optional[str] = None
+    # Ids of the genes overlapping each SNP, aligned with details (only when requested)
+    genes: Optional[List[List[str]]] = None
     
 class OutputCountInfo(OperationInfo):
     details: int    
+
+class OutputGeneCountInfo(OutputCountInfo):
+    gene_counts: Optional[Dict[str, int]] = None
+    unresolved_genes: Optional[List[str]] = None
     
     
     
\ No newline at end of file
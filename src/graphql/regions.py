@@ -0,0 +1,120 @@
+from typing import NamedTuple
+
+# Karyotype order used to return multi-region results in genomic order;
+# contigs not listed sort after these, alphabetically.
+CHROMOSOME_ORDER = [str(i) for i in range(1, 23)] + ["X", "Y", "MT"]
+_CHROMOSOME_RANK = {contig: rank for rank, contig in enumerate(CHROMOSOME_ORDER)}
+
+# Upper bound of range clauses sent to elasticsearch in a single query
+REGIONS_PER_QUERY = 1_000
+
+
+class Region(NamedTuple):
+    contig: str
+    start: int
+    end: int
+
+
+def normalize_contig(contig: str) -> str:
+    contig = contig.strip()
+    if contig[:3].lower() == "chr":
+        contig = contig[3:]
+    return contig.upper() if contig.lower() in ("x", "y", "mt", "m") else contig
+
+
+def contig_sort_key(contig: str):
+    return (_CHROMOSOME_RANK.get(contig, len(CHROMOSOME_ORDER)), contig)
+
+
+def parse_inline_regions(text: str) -> list[Region]:
+    """
+    Parse regions given as "chr:start-end" separated by commas
+
+    Params: text: e.g. "1:10000-20000,X:500-900" (1-based, inclusive)
+
+    Returns: List of Region
+    """
+    regions = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        contig, sep, interval = item.rpartition(":")
+        start, dash, end = interval.partition("-")
+        if not sep or not dash:
+            raise ValueError(f"Invalid region '{item}', expected chr:start-end")
+        region = Region(normalize_contig(contig), int(start), int(end))
+        if region.start > region.end:
+            raise ValueError(f"Invalid region '{item}', start is after end")
+        regions.append(region)
+    return regions
+
+
+def parse_bed(text: str) -> list[Region]:
+    """
+    Parse regions from BED formatted text
+
+    BED intervals are 0-based and half-open; they are converted to the 1-based,
+    inclusive positions used by the index.  Header, track, browser and comment
+    lines are skipped, and so are empty intervals (start equal to end).
+
+    Params: text: BED content (tab or whitespace separated chrom, start, end, ...)
+
+    Returns: List of Region
+    """
+    regions = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith(("#", "track", "browser")):
+            continue
+        cols = line.split()
+        if len(cols) < 3:
+            raise ValueError(f"Invalid BED line {line_number}: expected chrom, start and end")
+        try:
+            start, end = int(cols[1]), int(cols[2])
+        except ValueError:
+            raise ValueError(f"Invalid BED line {line_number}: start and end must be integers")
+        if start > end:
+            raise ValueError(f"Invalid BED line {line_number}: start is after end")
+        if start == end:
+            # Empty interval, contains no position
+            continue
+        regions.append(Region(normalize_contig(cols[0]), start + 1, end))
+    return regions
+
+
+def merge_regions(regions: list[Region]) -> list[Region]:
+    """
+    Sort regions in genomic order and merge overlapping or adjacent ones
+
+    Params: regions: List of Region with start <= end, in any order
+
+    Returns: List of disjoint Region in genomic order
+    """
+    merged: list[Region] = []
+    ordered = sorted(regions, key=lambda r: (contig_sort_key(r.contig), r.start))
+    for region in ordered:
+        if merged and merged[-1].contig == region.contig and region.start <= merged[-1].end + 1:
+            last = merged[-1]
+            merged[-1] = Region(last.contig, last.start, max(last.end, region.end))
+        else:
+            merged.append(region)
+    return merged
+
+
+def chunk_regions(regions: list[Region], chunk_size: int = REGIONS_PER_QUERY) -> list[list[Region]]:
+    """
+    Split merged regions into single-chromosome chunks of at most chunk_size
+    regions, keeping genomic order.
+
+    Params: regions: List of disjoint Region in genomic order
+            chunk_size: Maximum number of regions per chunk
+
+    Returns: List of chunks
+    """
+    chunks: list[list[Region]] = []
+    for region in regions:
+        if not chunks or chunks[-1][0].contig != region.contig or len(chunks[-1]) >= chunk_size:
+            chunks.append([])
+        chunks[-1].append(region)
+    return chunks
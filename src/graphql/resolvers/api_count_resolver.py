@@ -1,11 +1,112 @@
+import asyncio
+from src.cache.backends import create_cache_backend
+from src.cache.lru_ttl_cache import MISSING
+from src.cache.result_cache import ResultCache, get_index_generation
+from src.cache.singleflight import SingleFlight
 from src.config.es import es
 from src.config.settings import settings
 from src.graphql.models.annotation_model import FilterArgs, PageArgs
-from src.graphql.resolvers.helper_resolver import IDs_query, chromosome_query, rsIDs_query, gene_query
+from src.graphql.resolvers.helper_resolver import IDs_query, chromosome_query, rsIDs_query, gene_query, resolve_genes, gene_interval_filter, gene_records_query, regions_query
+from src.graphql.regions import Region, chunk_regions
 from src.data_access_object.keyword_search import keyword_query_for_fields_with_filters
-from src.graphql.models.return_info_model import OutputCountInfo
+from src.graphql.models.return_info_model import OutputCountInfo, OutputGeneCountInfo
 #from src.graphql.resolvers.api_snp_helper_resolver import output_error_msg, convert_scroll_hits
 
+# Counts keyed on the canonical query; identical concurrent counts share one ES request
+count_cache = ResultCache(
+      "count",
+      create_cache_backend(settings.CACHE_URL, settings.COUNT_CACHE_SIZE, settings.COUNT_CACHE_TTL_SECONDS),
+)
+_count_flight = SingleFlight()
+
+# Per-chromosome (count, min pos, max pos) for the current index generation
+_chromosome_totals: dict[str, dict[str, tuple[int, int, int]]] = {}
+
+
+async def _count_and_cache(key: str, query: dict) -> int:
+      resp = await es.count(
+              index = settings.ES_INDEX,
+              query = query
+      )
+      await count_cache.set(key, resp['count'])
+      return resp['count']
+
+
+async def cached_count(query: dict) -> int:
+      """ 
+      Count documents matching a query, using the count cache
+
+      Params: query: Elasticsearch query object
+
+      Returns: integer for count of annotations
+      """
+      key = count_cache.make_key(query)
+      count = await count_cache.get(key)
+      if count is not MISSING:
+            return count
+      return await _count_flight.do(key, lambda: _count_and_cache(key, query))
+
+
+async def _load_chromosome_totals() -> dict[str, tuple[int, int, int]]:
+      """ 
+      Per-chromosome totals keyed by the token the analyzed chr field indexes
+      (the lowercased value), which is what the term query of
+      chromosome_query matches: "x" counts the "X" documents, while "X"
+      matches nothing there and is not in the table either.  Values the
+      analyzer would split into several tokens are left out.
+      """
+      resp = await es.search(
+              index = settings.ES_INDEX,
+              size = 0,
+              aggs = {"chromosomes": {
+                    "terms": {"field": "chr.keyword", "size": 1000},
+                    "aggs": {"min_pos": {"min": {"field": "pos"}}, "max_pos": {"max": {"field": "pos"}}},
+              }},
+      )
+      totals: dict[str, tuple[int, int, int]] = {}
+      for bucket in resp['aggregations']['chromosomes']['buckets']:
+            token = str(bucket['key']).lower()
+            if not token.isalnum():
+                  continue
+            count, min_pos, max_pos = bucket['doc_count'], int(bucket['min_pos']['value']), int(bucket['max_pos']['value'])
+            if token in totals:
+                  # Keyword values differing only in case share the token
+                  other = totals[token]
+                  count, min_pos, max_pos = count + other[0], min(min_pos, other[1]), max(max_pos, other[2])
+            totals[token] = (count, min_pos, max_pos)
+      return totals
+
+
+async def get_chromosome_totals() -> dict[str, tuple[int, int, int]]:
+      """ 
+      Table of per-chromosome totals, loaded once per index generation with a
+      single aggregation
+
+      Returns: Dictionary of analyzed chr token to (count, min pos, max pos)
+      """
+      generation = get_index_generation()
+      totals = _chromosome_totals.get(generation)
+      if totals is None:
+            totals = await _count_flight.do(("chromosome_totals", generation), _load_chromosome_totals)
+            _chromosome_totals.clear()
+            _chromosome_totals[generation] = totals
+      return totals
+
+
+async def _chromosome_total(chr: str) -> tuple[int, int, int] | None:
+      """ 
+      Totals of a chromosome, or None to count it with a query.  The table
+      has the semantics of the term query on the analyzed chr field, so any
+      chr it lacks (e.g. "X", which that query does not match) is counted
+      by the query, and a failed load is not fatal
+      """
+      try:
+            totals = await get_chromosome_totals()
+      except Exception:
+            return None
+      return totals.get(chr)
+
+
 async def count_by_chromosome(chr: str, start: int, end: int, filter_args: FilterArgs | None = None):
       """ 
       Query for getting count of annotation by chromosome with start and end range of pos
@@ -19,11 +120,13 @@ async def count_by_chromosome(chr: str, start: int, end: int, filter_args: Filte
       Returns: integer for count of annotations
       """
       try:
-        resp = await es.count(
-                index = settings.ES_INDEX,
-                query = chromosome_query(chr, start, end, filter_args),
-        )
-        return OutputCountInfo(success = False, message = "OK", details =  resp['count'])
+        if not (filter_args and filter_args.exists):
+              # Unfiltered counts spanning the whole chromosome come from the totals table
+              total = await _chromosome_total(chr)
+              if total is not None and start <= total[1] and end >= total[2]:
+                    return OutputCountInfo(success = False, message = "OK", details = total[0])
+        count = await cached_count(chromosome_query(chr, start, end, filter_args))
+        return OutputCountInfo(success = False, message = "OK", details = count)
       except Exception:
             message = "Unable to retrieve count information for search by chromosome"
             return output_error_msg(message)
@@ -40,11 +143,8 @@ async def count_by_rsIDs(rsIDs: list[str], filter_args: FilterArgs | None = None
       Returns: integer for count of annotations
       """
       try:
-        resp = await es.count(
-                index = settings.ES_INDEX,
-                query = rsIDs_query(rsIDs, filter_args)
-        )
-        return OutputCountInfo(success = True, message = "OK", details =  resp['count'])
+        count = await cached_count(rsIDs_query(rsIDs, filter_args))
+        return OutputCountInfo(success = True, message = "OK", details = count)
       except Exception:
             message = "Unable to retrieve count information for search by RSID list"
             return output_error_msg(message)
@@ -61,11 +161,8 @@ async def count_by_IDs(ids: list[str], filter_args: FilterArgs | None = None):
       Returns: integer for count of annotations
       """
       try:      
-        resp = await es.count(
-                index = settings.ES_INDEX,
-                query = IDs_query(ids, filter_args)
-        )   
-        return OutputCountInfo(success = True, message = "OK", details =  resp['count'])
+        count = await cached_count(IDs_query(ids, filter_args))
+        return OutputCountInfo(success = True, message = "OK", details = count)
       except Exception:
             message = "Unable to retrieve count information for search by ID list"
             return output_error_msg(message)    
@@ -81,11 +178,8 @@ async def count_by_keyword(keyword: str, keyword_fields: list[str] = None, filte
       Returns: integer for count of annotations
       """
       try:
-        resp = await es.count(
-                index = settings.ES_INDEX,
-                query = keyword_query_for_fields_with_filters(keyword, keyword_fields, filter_fields)
-        )
-        return OutputCountInfo(success = True, message = "OK", details =  resp['count'])
+        count = await cached_count(keyword_query_for_fields_with_filters(keyword, keyword_fields, filter_fields))
+        return OutputCountInfo(success = True, message = "OK", details = count)
       except Exception:
         message = "Unable to retrieve count information for search by keyword"    
         return output_error_msg(message)  
@@ -103,18 +197,75 @@ async def count_by_gene_product(gene:str, filter_args: FilterArgs | None = None)
       """
       
       try: 
-        query = gene_query(gene, filter_args)
+        query = await gene_query(gene, filter_args)
 
         if query is not None:
-            resp = await es.count(
-                    index = settings.ES_INDEX,
-                    query = query
-            )
-            return OutputCountInfo(success = True, message = "OK", details =  resp['count'])
+            count = await cached_count(query)
+            return OutputCountInfo(success = True, message = "OK", details = count)
         else:
             return output_error_msg("Unable to construct query for counting by gene")      
       except Exception:
         return output_error_msg("Unable to retrieve count information for search by gene")  
+
+
+async def count_by_gene_products(genes: list[str], filter_args: FilterArgs | None = None, per_gene: bool = False):
+      """ 
+      Query for getting count of annotation by a list of gene products
+
+      Params: genes: List of gene products
+            filter_args: FilterArgs object for field exists filter
+            per_gene: Also return the count for each gene, computed in the same request
+
+      Returns: OutputGeneCountInfo with the total count and optional per gene counts
+      """
+      try:
+        resolved = await resolve_genes(genes)
+        records = list(dict.fromkeys(r for r in resolved.values() if r is not None))
+        unresolved = [gene for gene, record in resolved.items() if record is None] or None
+
+        if not records:
+            return OutputGeneCountInfo(success = False, message = "Unable to construct query for counting by gene products", details = -1, unresolved_genes = unresolved)
+
+        query = gene_records_query(records, filter_args)
+        if not per_gene:
+            count = await cached_count(query)
+            return OutputGeneCountInfo(success = True, message = "OK", details = count, unresolved_genes = unresolved)
+
+        # One filters aggregation gives every gene's count alongside the total
+        resp = await es.search(
+                index = settings.ES_INDEX,
+                query = query,
+                size = 0,
+                track_total_hits = True,
+                aggs = {"genes": {"filters": {"filters": {
+                      gene: gene_interval_filter(record) for gene, record in resolved.items() if record is not None
+                }}}},
+        )
+        buckets = resp['aggregations']['genes']['buckets']
+        gene_counts = {gene: bucket['doc_count'] for gene, bucket in buckets.items()}
+        return OutputGeneCountInfo(success = True, message = "OK", details = resp['hits']['total']['value'], gene_counts = gene_counts, unresolved_genes = unresolved)
+      except Exception:
+        return output_error_msg("Unable to retrieve count information for search by gene products")  
+
+
+async def count_by_regions(regions: list[Region], filter_args: FilterArgs | None = None):
+      """ 
+      Query for getting count of annotation within a list of regions
+
+      Params: regions: List of disjoint Region in genomic order
+            filter_args: FilterArgs object for field exists filter
+
+      Returns: integer for count of annotations
+      """
+      try:
+        # Chunks are disjoint, so their counts add up to the total
+        counts = await asyncio.gather(*[
+              cached_count(regions_query(chunk, filter_args))
+              for chunk in chunk_regions(regions)
+        ])
+        return OutputCountInfo(success = True, message = "OK", details = sum(counts))
+      except Exception:
+        return output_error_msg("Unable to retrieve count information for search by regions")  
   
   
   
@@ -1,31 +1,189 @@
+from functools import lru_cache
+import orjson
+from fastapi.responses import Response
+from src.config.settings import settings
 from src.graphql.models.return_info_model import OutputSnpInfo
 from src.graphql.models.generated.snp import SnpModel
+from src.graphql.gene_pos import get_overlapping_genes
 from src.utils import clean_field_name
-from src.data_adapter.snp_attributes import get_version_info
+from src.data_adapter.snp_attributes import get_name_to_type, get_version_info
+
+# Fields needed to place a SNP on the genome for gene overlap lookups
+LOCATION_FIELDS = ("chr", "pos")
+
+# Cleaned API field name (the SnpModel alias) to SnpModel attribute name
+_ALIAS_TO_ATTRIBUTE = {
+    (field.alias or name): name for name, field in SnpModel.model_fields.items()
+}
+# Position of each cleaned API field name in SnpModel, the key order of responses
+_ALIAS_ORDER = {alias: i for i, alias in enumerate(_ALIAS_TO_ATTRIBUTE)}
+# anno_tree.json field type to the type SnpModel validation coerces values to
+_COERCERS = {
+    "long": int,
+    "integer": int,
+    "float": float,
+    "double": float,
+    "keyword": str,
+    "text": str,
+}
+
+
+class SnpJSONResponse(Response):
+    """JSON response whose body was already rendered by render_snp_output"""
+
+    media_type = "application/json"
+
+
+class ProjectionPlan:
+    """
+    Renames for the fields of a request, computed once and applied to every hit.
+    renames maps original ES names to cleaned API names (SnpModel aliases) and
+    attributes maps them to SnpModel/Snp attribute names.  output_renames
+    carries the type each value is coerced to in responses, None to keep it.
+    """
+
+    __slots__ = ("fields", "renames", "attributes", "output_renames")
+
+    def __init__(self, es_fields: tuple[str, ...]):
+        self.fields = es_fields
+        self.renames = tuple((field, clean_field_name(field)) for field in es_fields)
+        self.attributes = tuple(
+            (field, _ALIAS_TO_ATTRIBUTE.get(cleaned, cleaned))
+            for field, cleaned in self.renames
+        )
+        # Renames of the SnpModel fields only, in SnpModel order, matching
+        # what serializing a SnpModel by alias would produce
+        type_lookup = get_name_to_type()
+        self.output_renames = tuple(
+            sorted(
+                (
+                    (field, cleaned, _COERCERS.get(type_lookup.get(field)))
+                    for field, cleaned in self.renames
+                    if cleaned in _ALIAS_ORDER
+                ),
+                key=lambda rename: _ALIAS_ORDER[rename[1]],
+            )
+        )
+
+    def project(self, source: dict) -> dict:
+        """Values of the requested fields present in source, keyed by cleaned name"""
+        return {
+            cleaned: source[field] for field, cleaned in self.renames if field in source
+        }
+
+    def project_attributes(self, source: dict) -> dict:
+        """Values of the requested fields present in source, keyed by attribute name"""
+        return {
+            attribute: source[field]
+            for field, attribute in self.attributes
+            if field in source
+        }
+
+    def project_output(self, source: dict) -> dict:
+        """
+        Non-null values of the requested SnpModel fields, coerced to their
+        field type as serialized in responses
+        """
+        values = {}
+        for field, cleaned, coerce in self.output_renames:
+            value = source.get(field)
+            if value is not None:
+                if coerce is not None and type(value) is not coerce:
+                    value = coerce(value)
+                values[cleaned] = value
+        return values
+
+
+@lru_cache(maxsize=512)
+def _get_projection_plan(es_fields: tuple[str, ...]) -> ProjectionPlan:
+    return ProjectionPlan(es_fields)
+
+
+def get_projection_plan(es_fields) -> ProjectionPlan:
+    return _get_projection_plan(tuple(es_fields))
 
 
 def output_error_msg(message: str):
     return OutputSnpInfo(success=False, message=message)
 
 
-def convert_hits_to_output(es_fields: list[str], hits: list):
+def with_location_fields(es_fields: list[str]) -> list[str]:
+    """
+    Extends the requested fields with the fields needed for gene overlap lookups
+    """
+    return es_fields + [f for f in LOCATION_FIELDS if f not in es_fields]
+
+
+def render_error_msg(message: str) -> bytes:
+    return orjson.dumps({"success": False, "message": message})
+
+
+def _row_renderer(plan: ProjectionPlan, include_genes: bool = False):
     """
-    Converts hits from elasticsearch to OutputSnpInfo object
+    Function rendering the _source of a hit to the JSON of its SnpModel,
+    optionally with a genes key listing the genes overlapping the SNP
+    """
+    if settings.VALIDATE_SNP_OUTPUT:
+        def project(source):
+            return SnpModel(**plan.project(source)).model_dump(
+                mode="json", by_alias=True, exclude_none=True
+            )
+    else:
+        project = plan.project_output
+
+    if not include_genes:
+        return lambda source: orjson.dumps(project(source))
+
+    def render_row(source):
+        row = project(source)
+        row["genes"] = get_overlapping_genes(source.get("chr"), source.get("pos"))
+        return orjson.dumps(row)
+    return render_row
+
+
+def render_snp_output(es_fields: list[str], hits: list, include_genes: bool = False) -> bytes:
+    """
+    Renders hits from elasticsearch straight to the JSON body of an OutputSnpInfo
+    response, without building SnpModel objects.  Keys, key order and the
+    dropping of null fields match the response_model serialization.
 
     Params: es_fields: List of fields requested
             hits: hits from elasticsearch
+            include_genes: Attach the ids of the genes overlapping each SNP.
+                The hits must then carry chr and pos.
+
+    Returns: JSON body as bytes
+    """
+    render_row = _row_renderer(get_projection_plan(es_fields))
+
+    parts = [b'{"success":true,"message":"OK","details":[']
+    parts.append(b",".join([render_row(hit["_source"]) for hit in hits]))
+    parts.append(b'],"version":')
+    parts.append(orjson.dumps(get_version_info(es_fields)))
+    if include_genes:
+        genes = [
+            get_overlapping_genes(hit["_source"].get("chr"), hit["_source"].get("pos"))
+            for hit in hits
+        ]
+        parts.append(b',"genes":')
+        parts.append(orjson.dumps(genes))
+    parts.append(b"}")
+    return b"".join(parts)
+
 
-    Returns: OutputSnpInfo object
+def render_ndjson(es_fields: list[str], hits: list, include_genes: bool = False) -> bytes:
     """
-    compliant_results = []
-    for hit in hits:
-        source = hit["_source"]
-        values = {clean_field_name(key): value for key, value in source.items()}
-        compliant_results.append(SnpModel(**values))
+    Renders hits from elasticsearch as NDJSON, one SnpModel per line with
+    cleaned keys and without null fields.
 
-    return OutputSnpInfo(
-        success=True,
-        message="OK",
-        details=compliant_results,
-        version=get_version_info(es_fields),
-    )
+    Params: es_fields: List of fields requested
+            hits: hits from elasticsearch
+            include_genes: Add a genes key with the ids of the genes overlapping
+                each SNP.  The hits must then carry chr and pos.
+
+    Returns: NDJSON lines as bytes
+    """
+    render_row = _row_renderer(get_projection_plan(es_fields), include_genes)
+    if not hits:
+        return b""
+    return b"\n".join([render_row(hit["_source"]) for hit in hits]) + b"\n"
@@ -1,3 +1,7 @@
+import asyncio
+from src.cache.backends import create_cache_backend
+from src.cache.lru_ttl_cache import MISSING
+from src.cache.result_cache import ResultCache
 from src.config.es import es
 from src.config.settings import settings
 from src.graphql.models.annotation_model import FilterArgs, PageArgs
@@ -6,11 +10,36 @@ from src.graphql.resolvers.helper_resolver import (
     chromosome_query,
     rsIDs_query,
     gene_query,
+    genes_query,
+    regions_query,
 )
+from src.graphql.regions import Region, chunk_regions
 from src.data_access_object.keyword_search import keyword_query_for_fields_with_filters
 from src.graphql.resolvers.api_snp_helper_resolver import (
-    output_error_msg,
-    convert_hits_to_output,
+    SnpJSONResponse,
+    render_error_msg,
+    render_snp_output,
+    with_location_fields,
+)
+
+# Genomic order within a single-chromosome chunk.  Ids are chr:pos ref>alt, so
+# ref and alt break the ties of multi-allelic sites and pages cut with
+# from/size neither repeat nor skip records (sorting on _id is disabled in ES)
+REGION_SORT = [{"pos": "asc"}, {"ref.keyword": "asc"}, {"alt.keyword": "asc"}]
+
+
+def output_error_msg(message: str) -> SnpJSONResponse:
+    return SnpJSONResponse(render_error_msg(message))
+
+
+# Rendered paginated results keyed on the canonical query, fields and page window
+search_cache = ResultCache(
+    "search",
+    create_cache_backend(
+        settings.CACHE_URL,
+        settings.SEARCH_CACHE_SIZE,
+        settings.SEARCH_CACHE_TTL_SECONDS,
+    ),
 )
 
 
@@ -19,26 +48,38 @@ async def _execute_search(
     query: dict,
     page_args: PageArgs,
     error_message: str,
+    include_genes: bool = False,
 ):
     """
     Generic search execution function to eliminate code duplication.
+    Successful results are served from search_cache when available.
 
     Params: es_fields: List of fields to be returned in elasticsearch query
             query: Elasticsearch query object
             page_args: PageArgs object for pagination
             error_message: Custom error message for this operation
+            include_genes: Attach the ids of the genes overlapping each SNP
 
-    Returns: OutputSnpInfo with list of Snps
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
     """
     try:
+        cache_key = search_cache.make_key(
+            query, es_fields, page_args.from_, page_args.size, include_genes
+        )
+        cached = await search_cache.get(cache_key)
+        if cached is not MISSING:
+            return SnpJSONResponse(cached)
+
         resp = await es.search(
             index=settings.ES_INDEX,
-            source=es_fields,  # type: ignore
+            source=with_location_fields(es_fields) if include_genes else es_fields,  # type: ignore
             from_=page_args.from_,
             size=page_args.size,
             query=query,
         )
-        return convert_hits_to_output(es_fields, resp["hits"]["hits"])
+        body = render_snp_output(es_fields, resp["hits"]["hits"], include_genes)
+        await search_cache.set(cache_key, body)
+        return SnpJSONResponse(body)
     except Exception:
         return output_error_msg(error_message)
 
@@ -50,6 +91,7 @@ async def search_by_chromosome(
     end: int,
     page_args: PageArgs,
     filter_args: FilterArgs | None = None,
+    include_genes: bool = False,
 ):
     """
     Query for getting annotation by chromosome with start and end range of pos
@@ -60,8 +102,9 @@ async def search_by_chromosome(
             end: End position
             page_args: PageArgs object for pagination
             filter_args: FilterArgs object for field exists filter
+            include_genes: Attach the ids of the genes overlapping each SNP
 
-    Returns: OutputSnpInfo with list of Snps
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
     """
     page_args = page_args or PageArgs()
     query = chromosome_query(chr, start, end, filter_args)
@@ -70,6 +113,7 @@ async def search_by_chromosome(
         query,
         page_args,
         "Unable to retrieve information for search by chromosome",
+        include_genes,
     )
 
 
@@ -87,7 +131,7 @@ async def search_by_rsIDs(
             page_args: PageArgs object for pagination
             filter_args: FilterArgs object for field exists filter
 
-    Returns: OutputSnpInfo with list of Snps
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
     """
     page_args = page_args or PageArgs()
     query = rsIDs_query(rsIDs, filter_args)
@@ -113,7 +157,7 @@ async def search_by_IDs(
             page_args: PageArgs object for pagination
             filter_args: FilterArgs object for field exists filter
 
-    Returns: OutputSnpInfo with list of Snps
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
     """
     page_args = page_args or PageArgs()
     query = IDs_query(ids, filter_args)
@@ -141,7 +185,7 @@ async def search_by_keyword(
             keyword_fields: Fields to search keyword in
             filter_fields: Fields that must exist
 
-    Returns: OutputSnpInfo with list of Snps
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
     """
     page_args = page_args or PageArgs()
     query = keyword_query_for_fields_with_filters(
@@ -171,10 +215,10 @@ async def search_by_gene_product(
             page_args: PageArgs object for pagination
             filter_args: FilterArgs object for field exists filter
 
-    Returns: OutputSnpInfo with list of Snps
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
     """
     page_args = page_args or PageArgs()
-    query = gene_query(gene, filter_args)
+    query = await gene_query(gene, filter_args)
 
     if query is None:
         return output_error_msg(
@@ -187,3 +231,95 @@ async def search_by_gene_product(
         page_args,
         "Unable to retrieve information for search by gene product",
     )
+
+
+async def search_by_gene_products(
+    es_fields: list[str],
+    genes: list[str],
+    page_args: PageArgs,
+    filter_args: FilterArgs | None = None,
+):
+    """
+    Query for getting annotation by a list of gene products
+
+    Params: es_fields: List of fields to be returned in elasticsearch query
+            genes: List of gene products
+            page_args: PageArgs object for pagination
+            filter_args: FilterArgs object for field exists filter
+
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
+    """
+    page_args = page_args or PageArgs()
+    query = await genes_query(genes, filter_args)
+
+    if query is None:
+        return output_error_msg(
+            "Unable to construct query for search by gene products operation"
+        )
+
+    return await _execute_search(
+        es_fields,
+        query,
+        page_args,
+        "Unable to retrieve information for search by gene products",
+    )
+
+
+async def search_by_regions(
+    es_fields: list[str],
+    regions: list[Region],
+    page_args: PageArgs,
+    filter_args: FilterArgs | None = None,
+):
+    """
+    Query for getting annotation within a list of regions, in genomic order
+
+    Regions are queried in single-chromosome chunks sorted by position.  When
+    there are several chunks, each chunk is counted first so that only the
+    chunks overlapping the requested page are searched.
+
+    Params: es_fields: List of fields to be returned in elasticsearch query
+            regions: List of disjoint Region in genomic order
+            page_args: PageArgs object for pagination
+            filter_args: FilterArgs object for field exists filter
+
+    Returns: SnpJSONResponse with the rendered OutputSnpInfo body
+    """
+    page_args = page_args or PageArgs()
+    queries = [regions_query(chunk, filter_args) for chunk in chunk_regions(regions)]
+
+    try:
+        window_start = page_args.from_
+        window_end = page_args.from_ + page_args.size
+        if len(queries) == 1:
+            pages = [(queries[0], window_start, page_args.size)]
+        else:
+            counts = await asyncio.gather(
+                *[es.count(index=settings.ES_INDEX, query=query) for query in queries]
+            )
+            pages = []
+            offset = 0
+            for query, count in zip(queries, counts):
+                n = count["count"]
+                if offset < window_end and offset + n > window_start:
+                    from_ = max(window_start - offset, 0)
+                    pages.append((query, from_, min(window_end - offset, n) - from_))
+                offset += n
+
+        responses = await asyncio.gather(
+            *[
+                es.search(
+                    index=settings.ES_INDEX,
+                    source=es_fields,  # type: ignore
+                    from_=from_,
+                    size=size,
+                    query=query,
+                    sort=REGION_SORT,
+                )
+                for query, from_, size in pages
+            ]
+        )
+        hits = [hit for resp in responses for hit in resp["hits"]["hits"]]
+        return SnpJSONResponse(render_snp_output(es_fields, hits))
+    except Exception:
+        return output_error_msg("Unable to retrieve information for search by regions")
@@ -98,7 +98,7 @@ async def count_by_gene(gene:str, filter_args=FilterArgs):
 
       Returns: integer for count of annotations
       """
-      query = gene_query(gene, filter_args)
+      query = await gene_query(gene, filter_args)
 
       if query is not None:
         resp = await es.count(
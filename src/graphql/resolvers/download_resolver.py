@@ -1,37 +1,336 @@
+import asyncio
+import gzip
+import os
+import secrets
+import shutil
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import AsyncGenerator, Any
 from ...config.settings import settings
+from src.cache.download_cache import DownloadCache
+from src.cache.result_cache import canonical_key, get_index_generation
+from src.graphql.models.annotation_model import DownloadState
+
+# Number of finished jobs whose status can still be looked up
+FINISHED_JOBS_KEPT = 1000
+# Format of the download files, part of their content key
+DOWNLOAD_FORMAT = "tsv"
+# Suffix of the gzip copies written next to finished downloads
+GZIP_SUFFIX = ".gz"
+
+_writer_pool = ThreadPoolExecutor(
+    max_workers=max(1, settings.DOWNLOAD_WRITER_THREADS),
+    thread_name_prefix="download-writer",
+)
+
+
+async def _in_writer_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_writer_pool, func, *args)
+
+
+class BufferedFileWriter:
+    """
+    File written by the download writer threads.
+
+    write() only appends to an in-memory buffer.  Once the buffer holds
+    DOWNLOAD_WRITE_BUFFER_BYTES it is handed to a writer thread in a single
+    write call, while the next buffer fills up on the event loop.
+    """
+
+    def __init__(self, path: str, buffer_bytes: int | None = None):
+        self.path = path
+        self.buffer_bytes = buffer_bytes or settings.DOWNLOAD_WRITE_BUFFER_BYTES
+        self.bytes_written = 0
+        self._file = None
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._pending: asyncio.Future | None = None
+
+    async def open(self):
+        self._file = await _in_writer_pool(open, self.path, "wb")
+
+    async def write(self, data: bytes):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.buffer_bytes:
+            await self._flush()
+
+    async def _flush(self):
+        # One write in flight at a time keeps the file in order
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        if self._buffer:
+            data = b"".join(self._buffer)
+            self._buffer = []
+            self._buffered = 0
+            self.bytes_written += len(data)
+            self._pending = asyncio.ensure_future(_in_writer_pool(self._file.write, data))
+
+    async def close(self):
+        try:
+            await self._flush()
+            if self._pending is not None:
+                await self._pending
+        finally:
+            self._pending = None
+            await _in_writer_pool(self._file.close)
+
+
+class DownloadJob:
+    """
+    State of a file download running in the background.  Jobs with a content
+    key write the file named after it, which is shared with later identical
+    requests; cached is set on jobs served such an existing file.
+    """
+
+    def __init__(self, fields: list[str], key: str | None = None):
+        self.id = secrets.token_hex(8)
+        self.fields = fields
+        self.key = key
+        self.cached = False
+        self.state = DownloadState.PENDING
+        self.records = 0
+        self.bytes_written = 0
+        self.url: str | None = None
+        self.error: str | None = None
+        self.created = time.time()
+        self.finished: float | None = None
+        self.task: asyncio.Task | None = None
+
+
+class DownloadJobRegistry:
+    """
+    Runs download jobs as background tasks, at most DOWNLOAD_MAX_JOBS at a
+    time, and keeps their status until FINISHED_JOBS_KEPT newer jobs finished.
+    Running jobs can be looked up by content key, so that identical requests
+    share one writer.
+    """
+
+    def __init__(self, max_jobs: int, kept: int = FINISHED_JOBS_KEPT):
+        self._jobs: OrderedDict[str, DownloadJob] = OrderedDict()
+        self._running: dict[str, DownloadJob] = {}
+        self._finished: OrderedDict[str, None] = OrderedDict()
+        self._kept = kept
+        self._max_jobs = max(1, max_jobs)
+        self._slots: asyncio.Semaphore | None = None
+
+    def start(self, job: DownloadJob, stream: AsyncGenerator[Any, None]) -> DownloadJob:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_jobs)
+        self._jobs[job.id] = job
+        if job.key is not None:
+            self._running[job.key] = job
+        job.task = asyncio.create_task(self._run(job, stream))
+        return job
+
+    def running(self, key: str) -> DownloadJob | None:
+        return self._running.get(key)
+
+    def add_finished(self, job: DownloadJob) -> DownloadJob:
+        """Register a job completed without running, e.g. served from the cache"""
+        self._jobs[job.id] = job
+        self._retire(job)
+        return job
+
+    async def _run(self, job: DownloadJob, stream: AsyncGenerator[Any, None]):
+        try:
+            async with self._slots:
+                job.state = DownloadState.RUNNING
+                job.url = await _write_download(job, stream)
+                job.state = DownloadState.DONE
+        except asyncio.CancelledError:
+            job.state = DownloadState.FAILED
+            job.error = "Download cancelled"
+            raise
+        except Exception as e:
+            job.state = DownloadState.FAILED
+            job.error = str(e)
+        finally:
+            job.task = None
+            if self._running.get(job.key) is job:
+                del self._running[job.key]
+            self._retire(job)
+
+    def _retire(self, job: DownloadJob):
+        job.finished = time.time()
+        self._finished[job.id] = None
+        while len(self._finished) > self._kept:
+            old_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(old_id, None)
+
+    def get(self, job_id: str) -> DownloadJob | None:
+        return self._jobs.get(job_id)
+
+
+download_jobs = DownloadJobRegistry(settings.DOWNLOAD_MAX_JOBS)
+download_cache = DownloadCache(
+    settings.DOWNLOAD_CACHE_MAX_BYTES, settings.DOWNLOAD_CACHE_MAX_FILES
+)
+
+
+def download_key(query: Any, fields: list[str]) -> str:
+    """
+    Content key of a download: the data currently served, the canonical
+    elasticsearch query, the fields, the file format and the record limit
+    """
+    return canonical_key(
+        get_index_generation(), query, fields, DOWNLOAD_FORMAT, settings.SIZE_DOWNLOAD_SIZE
+    )
+
+
+def _download_url(filename: str) -> str:
+    folder = os.path.basename(os.path.normpath(settings.SITE_DOWNLOAD_DIR))
+    return f"/download/{folder}/{filename}"
+
+
+def _remove_files(paths: list[str]):
+    """Delete download files along with their gzip copies"""
+    for path in paths:
+        for file_path in (path, path + GZIP_SUFFIX):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+
+def _touch_files(path: str):
+    for file_path in (path, path + GZIP_SUFFIX):
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+
+
+def _write_gzip_copy(path: str) -> int:
+    """
+    Write a gzip copy of a finished download next to it, for clients that
+    accept gzip
+
+    Returns: size of the copy in bytes
+    """
+    gz_path = path + GZIP_SUFFIX
+    part_path = f"{gz_path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(path, "rb") as src, gzip.open(part_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, settings.DOWNLOAD_WRITE_BUFFER_BYTES)
+        os.replace(part_path, gz_path)
+    except BaseException:
+        _remove_files([part_path])
+        raise
+    return os.path.getsize(gz_path)
+
+
+def load_download_cache():
+    """Index the download files kept from before a restart"""
+    _remove_files(download_cache.load(settings.SITE_DOWNLOAD_DIR))
+
+
+async def run_download_janitor():
+    """
+    Deletes the download files idle for DOWNLOAD_FILE_MAX_IDLE_SECONDS, every
+    DOWNLOAD_JANITOR_INTERVAL_SECONDS, until cancelled.  The quotas are
+    enforced as files are added, so this only handles expiry.
+    """
+    while True:
+        await asyncio.sleep(settings.DOWNLOAD_JANITOR_INTERVAL_SECONDS)
+        expired = download_cache.expire(settings.DOWNLOAD_FILE_MAX_IDLE_SECONDS)
+        if expired:
+            await _in_writer_pool(_remove_files, expired)
+
+
+async def _write_download(job: DownloadJob, stream: AsyncGenerator[Any, None]) -> str:
+    """
+    Writes the records of a stream to a tab separated file, updating the job
+    progress as it goes.  The file is written under a temporary name and
+    renamed once complete, then added to download_cache, which deletes the
+    files evicted to make room.  Files of jobs without a content key get a
+    random name, so they are never served to another request.
+
+    Params: job: DownloadJob listing the fields to write
+            stream: Async generator yielding SNP records
+
+    Returns: /download URL of the file
+    """
+    fields = job.fields
+    file_key = job.key or uuid.uuid4().hex
+    filename = file_key + ".txt"
+    final_path = settings.SITE_DOWNLOAD_DIR + "/" + filename
+    path = f"{final_path}.{uuid.uuid4().hex}.part"
+    writer = BufferedFileWriter(path)
+    await writer.open()
+    completed = False
+    try:
+        await writer.write(("\t".join(fields) + "\n").encode())
+        async for doc in stream:
+            if job.records >= settings.SIZE_DOWNLOAD_SIZE:
+                break
+            li = []
+            for k in fields:
+                if k == "id":
+                    li.append(str(doc["_id"]))
+                else:
+                    li.append(str(doc["_source"].get(k, ".")))
+            await writer.write(("\t".join(li) + "\n").encode())
+            job.records += 1
+            job.bytes_written = writer.bytes_written
+        completed = True
+    finally:
+        await stream.aclose()
+        await writer.close()
+        job.bytes_written = writer.bytes_written
+        if not completed:
+            await _in_writer_pool(_remove_files, [path])
+
+    await _in_writer_pool(os.replace, path, final_path)
+    size = writer.bytes_written
+    if settings.DOWNLOAD_GZIP_COPIES:
+        try:
+            size += await _in_writer_pool(_write_gzip_copy, final_path)
+        except OSError:
+            # The download is complete; it is just served uncompressed
+            pass
+    evicted = download_cache.add(file_key, final_path, size)
+    if evicted:
+        await _in_writer_pool(_remove_files, evicted)
+    return _download_url(filename)
 
 
 async def download_annotations_from_stream(
-    fields: list[str], stream: AsyncGenerator[Any, None]
+    fields: list[str], stream: AsyncGenerator[Any, None], query: Any = None
 ):
     """
-    Download annotations from a streaming source
+    Download annotations from a streaming source in the background
+
+    A download identical to a cached one is served that file at once, and
+    one identical to a running job joins it instead of starting a new one.
 
     Params: fields: List of fields to be returned
             stream: Async generator yielding SNP records
+            query: Elasticsearch query of the stream, keying the file in
+                download_cache; without it the download is not shared
+
+    Returns: id of the download job, see download_jobs
+    """
+    key = download_key(query, fields) if query is not None else None
+    if key is not None:
+        job = download_jobs.running(key)
+        if job is None:
+            path = download_cache.get(key)
+            if path is not None:
+                # Keeps the access order across restarts
+                await _in_writer_pool(_touch_files, path)
+                job = DownloadJob(fields, key)
+                job.cached = True
+                job.state = DownloadState.DONE
+                job.url = _download_url(os.path.basename(path))
+                download_jobs.add_finished(job)
+        if job is not None:
+            await stream.aclose()
+            return job.id
 
-    Returns: string for download filename
-    """
-    count = 0
-    filename = str(uuid.uuid4()) + ".txt"
-    f = open(settings.SITE_DOWNLOAD_DIR + "/" + filename, "w")
-    f.write("\t".join(fields) + "\n")
-
-    async for doc in stream:
-        count += 1
-        if count > settings.SIZE_DOWNLOAD_SIZE:
-            f.close()
-            return "/downloads/" + filename
-
-        li = []
-        for k in fields:
-            if k == "id":
-                li.append(str(doc["_id"]))
-            else:
-                li.append(str(doc["_source"].get(k, ".")))
-        f.write("\t".join(li) + "\n")
-
-    f.close()
-    return "/downloads/" + filename
+    job = DownloadJob(fields, key)
+    download_jobs.start(job, stream)
+    return job.id
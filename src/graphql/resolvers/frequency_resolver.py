@@ -0,0 +1,221 @@
+import asyncio
+import base64
+from typing import Any, Optional
+
+import orjson
+
+from ...config.es import es
+from ...config.settings import settings
+from src.cache.lru_ttl_cache import LRUTTLCache
+from src.cache.result_cache import canonical_key, get_index_generation
+from src.graphql.models.annotation_model import (
+    Bucket,
+    FilterArgs,
+    FrequencyPage,
+    FrequencyPageArgs,
+)
+from .helper_resolver import aggregation_field, annotation_query, chromosome_query, gene_query
+
+# Buckets requested from elasticsearch per composite aggregation call
+FETCH_SIZE = 1000
+# Largest page a client can ask for
+MAX_PAGE_SIZE = 10000
+# Most buckets one cached list holds
+MAX_CACHED_BUCKETS = settings.FREQUENCY_CACHE_MAX_BUCKETS
+
+
+class _BucketList:
+    """
+    Frequency buckets of one field and query fetched so far, in composite
+    order.  The list starts after the bucket with key `after`, at offset
+    `start` of the complete set, and is complete once elasticsearch returned
+    its last bucket.  It is full, and no longer extended, at MAX_CACHED_BUCKETS.
+    """
+
+    def __init__(self, start: int = 0, after: Any = None):
+        self.start = start
+        self.after = after
+        self.buckets: list[tuple[Any, int]] = []
+        self.complete = False
+        self.lock = asyncio.Lock()
+
+    def covers(self, offset: int) -> bool:
+        return self.start <= offset <= self.start + len(self.buckets)
+
+    def full(self) -> bool:
+        return len(self.buckets) >= MAX_CACHED_BUCKETS
+
+
+frequency_cache = LRUTTLCache(
+    settings.FREQUENCY_CACHE_SIZE, settings.FREQUENCY_CACHE_TTL_SECONDS
+)
+
+
+def encode_after_key(offset: int, key: Any) -> str:
+    data = orjson.dumps({"o": offset, "k": key})
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def decode_after_key(token: str) -> tuple[int, Any]:
+    """
+    Decode an after_key of a FrequencyPage
+
+    Params: token: after_key from encode_after_key
+
+    Returns: offset of the next bucket and the key of the bucket before it
+
+    Raises: ValueError if the token is malformed
+    """
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        offset = int(data["o"])
+        if offset < 0:
+            raise ValueError()
+        return offset, data["k"]
+    except Exception:
+        raise ValueError("Invalid after_key")
+
+
+async def _fetch_buckets(field: str, query: dict, after: Any, size: int) -> list[tuple[Any, int]]:
+    """
+    Next buckets of a composite terms aggregation on a field
+
+    Params: field: ES field to count the values of
+            query: Query for elasticsearch
+            after: Key of the last bucket already fetched, None to start
+            size: Number of buckets to fetch
+
+    Returns: (key, doc_count) of the buckets, fewer than size at the end
+    """
+    composite = {
+        "size": size,
+        "sources": [{"key": {"terms": {"field": aggregation_field(field)}}}],
+    }
+    if after is not None:
+        composite["after"] = {"key": after}
+    resp = await es.search(
+        index=settings.ES_INDEX,
+        query=query,
+        size=0,
+        aggs={"frequency": {"composite": composite}},
+    )
+    return [
+        (b["key"]["key"], b["doc_count"])
+        for b in resp["aggregations"]["frequency"]["buckets"]
+    ]
+
+
+async def frequency_page(
+    field: str, query: dict, after: Optional[str] = None, size: int = 100
+) -> FrequencyPage:
+    """
+    Page of the complete frequency buckets of a field, in key order
+
+    The buckets are fetched with a composite aggregation and kept in
+    frequency_cache per field and query, so that the next pages only query
+    elasticsearch for the buckets not fetched yet.  When the cached list is gone,
+    the composite aggregation resumes after the key in the after_key.  Pages
+    running past a full list are fetched from elasticsearch without caching.
+
+    Params: field: ES field to count the values of
+            query: Query for elasticsearch
+            after: after_key of the previous page, None for the first page
+            size: Maximum number of buckets on the page
+
+    Returns: FrequencyPage, with after_key None on the last page
+
+    Raises: ValueError if after is not a valid after_key
+    """
+    size = max(1, min(size, MAX_PAGE_SIZE))
+    offset, after_value = decode_after_key(after) if after else (0, None)
+    cache_key = canonical_key(get_index_generation(), field, query)
+    entry = frequency_cache.get(cache_key, None)
+    if entry is None or not entry.covers(offset):
+        entry = _BucketList(offset, after_value)
+        frequency_cache.set(cache_key, entry)
+
+    index = offset - entry.start
+    async with entry.lock:
+        while not entry.complete and not entry.full() and len(entry.buckets) < index + size:
+            last = entry.buckets[-1][0] if entry.buckets else entry.after
+            wanted = max(FETCH_SIZE, index + size - len(entry.buckets))
+            wanted = min(wanted, MAX_CACHED_BUCKETS - len(entry.buckets))
+            fetched = await _fetch_buckets(field, query, last, wanted)
+            entry.buckets.extend(fetched)
+            entry.complete = len(fetched) < wanted
+
+    if entry.complete or len(entry.buckets) >= index + size:
+        page = entry.buckets[index : index + size]
+        more = index + len(page) < len(entry.buckets) or not entry.complete
+    else:
+        before = entry.buckets[index - 1][0] if index else entry.after
+        fetched = await _fetch_buckets(field, query, before, size + 1)
+        page, more = fetched[:size], len(fetched) > size
+    return FrequencyPage(
+        buckets=[Bucket(key=str(key), doc_count=count) for key, count in page],
+        after_key=encode_after_key(offset + len(page), page[-1][0]) if page and more else None,
+    )
+
+
+def _page(page_args: Optional[FrequencyPageArgs]) -> tuple[Optional[str], int]:
+    if page_args is None:
+        return None, 100
+    return page_args.after, page_args.size or 100
+
+
+async def frequency_of_annotations(field: str, page_args: Optional[FrequencyPageArgs] = None) -> FrequencyPage:
+    """
+    Page of the frequency buckets of a field over all annotations
+
+    Params: field: ES field to count the values of
+            page_args: FrequencyPageArgs with the after_key and page size
+
+    Returns: FrequencyPage
+    """
+    return await frequency_page(field, annotation_query(), *_page(page_args))
+
+
+async def frequency_by_chromosome(
+    field: str,
+    chr: str,
+    start: int,
+    end: int,
+    page_args: Optional[FrequencyPageArgs] = None,
+    filter_args: Optional[FilterArgs] = None,
+) -> FrequencyPage:
+    """
+    Page of the frequency buckets of a field by chromosome with start and end range of pos
+
+    Params: field: ES field to count the values of
+            chr: Chromosome number
+            start: Start position
+            end: End position
+            page_args: FrequencyPageArgs with the after_key and page size
+            filter_args: FilterArgs object for field exists filter
+
+    Returns: FrequencyPage
+    """
+    query = chromosome_query(chr, start, end, filter_args)
+    return await frequency_page(field, query, *_page(page_args))
+
+
+async def frequency_by_gene(
+    field: str,
+    gene: str,
+    page_args: Optional[FrequencyPageArgs] = None,
+    filter_args: Optional[FilterArgs] = None,
+) -> FrequencyPage:
+    """
+    Page of the frequency buckets of a field by gene product
+
+    Params: field: ES field to count the values of
+            gene: Gene product
+            page_args: FrequencyPageArgs with the after_key and page size
+            filter_args: FilterArgs object for field exists filter
+
+    Returns: FrequencyPage, empty for an unknown gene
+    """
+    query = await gene_query(gene, filter_args)
+    if query is None:
+        return FrequencyPage(buckets=[])
+    return await frequency_page(field, query, *_page(page_args))
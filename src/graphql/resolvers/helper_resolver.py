@@ -1,10 +1,8 @@
-import json
-from typing import Dict
-from src.graphql.gene_pos import (
-    get_pos_from_gene_id,
-    map_gene,
-    chromosomal_location_dic,
-)
+import asyncio
+from functools import lru_cache
+from typing import Any, Callable, Dict, NamedTuple
+from src.graphql.gene_pos import GeneRecord, resolve_gene
+from src.graphql.regions import Region
 from src.graphql.models.generated.snp import SnpModel
 from src.graphql.models.snp_model import ScrollSnp, Snp, SnpAggs
 from src.graphql.models.generated.snp_aggs import SnpAggsModel
@@ -14,133 +12,175 @@ from src.graphql.models.annotation_model import (
     DocCount,
     Histogram,
 )
-from src.data_adapter.snp_attributes import get_name_to_type
+from src.data_adapter.snp_attributes import (
+    get_keyword_searchable_fields,
+    get_name_to_type,
+)
 
+from src.config.settings import settings
+from src.graphql.resolvers.api_snp_helper_resolver import (
+    ProjectionPlan,
+    get_projection_plan,
+)
 from src.utils import clean_field_name
 
 
-def _map_aggs_value(key, value):
+def _doc_count_value(value):
+    return value.get("doc_count")
+
+
+def _metric_value(value):
+    return value.get("value")
+
+
+def _missing_value(value):
+    return DocCount(doc_count=value["doc_count"])
+
+
+def _bucket_values(value):
+    return [Bucket(key=b["key"], doc_count=b["doc_count"]) for b in value["buckets"]]
+
+
+# AggregationItem attribute to the function extracting its value from an ES aggregation
+_AGGREGATION_EXTRACTORS = {
+    "doc_count": _doc_count_value,
+    "min": _metric_value,
+    "max": _metric_value,
+    "missing": _missing_value,
+    "histogram": _bucket_values,
+    "frequency": _bucket_values,
+}
+# Cleaned API field name (the SnpAggsModel alias) to SnpAggs attribute name
+_AGGS_ALIAS_TO_ATTRIBUTE = {
+    (field.alias or name): name for name, field in SnpAggsModel.model_fields.items()
+}
+
+
+class AggregationSlot(NamedTuple):
+    """Where the value of an ES aggregation goes in SnpAggs"""
+
+    attribute: str
+    slot: str
+    extract: Callable[[dict], Any]
+
+
+# ES aggregation name to its slot, or None for aggregations SnpAggs has no
+# field for.  Entries are added as get_aggregation_query names aggregations,
+# so convert_aggs never parses the names of the aggregations it converts.
+_aggregation_plan: dict[str, AggregationSlot | None] = {}
+
+
+def plan_aggregation(field: str, subfield: str) -> str:
     """
-    Mapping aggregation values to the correct type
+    Name of the aggregation of a field and subfield, registered in the
+    aggregation plan of convert_aggs
 
-    Params: key: key of the aggregation
-            value: values of the aggregation
+    Params: field: Original ES field name
+            subfield: AggregationItem attribute, e.g. "frequency"
 
-    Returns: value of the aggregation for the key
+    Returns: aggregation name
     """
-    if key.endswith(("min", "max")):
-        return value.get("value")
-    elif key.endswith("missing"):
-        return DocCount(doc_count=value["doc_count"])
-    elif key in ("histogram", "frequency"):
-        return [
-            Bucket(key=b["key"], doc_count=b["doc_count"]) for b in value["buckets"]
-        ]
-    else:
-        return value.get("doc_count")
+    name = f"{field}_{subfield}"
+    if name not in _aggregation_plan:
+        attribute = _AGGS_ALIAS_TO_ATTRIBUTE.get(clean_field_name(field))
+        extract = _AGGREGATION_EXTRACTORS.get(subfield)
+        _aggregation_plan[name] = (
+            AggregationSlot(attribute, subfield, extract)
+            if attribute is not None and extract is not None
+            else None
+        )
+    return name
+
+
+def _parse_aggregation_name(key: str) -> tuple[str, str]:
+    """
+    Field and subfield of an aggregation name like "1000Gp3_AC_doc_count",
+    for aggregations not named by get_aggregation_query
+    """
+    for suffix in _AGGREGATION_EXTRACTORS:
+        if key.endswith("_" + suffix):
+            return key[: -len(suffix) - 1], suffix
+    key_split = key.split("_")
+    return "_".join(key_split[:-1]), key_split[-1]
+
+
+def _hit_to_snp(plan: ProjectionPlan, hit) -> Snp:
+    """
+    Builds a Snp directly from a hit using the request's projection plan.
+    The SnpModel round-trip (with validation) is only made when
+    VALIDATE_SNP_OUTPUT is set.
+    """
+    if settings.VALIDATE_SNP_OUTPUT:
+        values = plan.project(hit["_source"])
+        return Snp.from_pydantic(SnpModel(**values), extra={"id": hit["_id"]})
+
+    values = plan.project_attributes(hit["_source"])
+    values["id"] = hit["_id"]
+    return Snp(**values)
+
+
+def _hits_to_snps(hits, es_fields=None) -> list[Snp]:
+    if es_fields is not None:
+        plan = get_projection_plan(es_fields)
+        return [_hit_to_snp(plan, hit) for hit in hits]
+    # Without the requested fields, plan on each hit's own keys (plans are cached)
+    return [_hit_to_snp(get_projection_plan(hit["_source"]), hit) for hit in hits]
 
 
-def convert_hits(hits):
+def convert_hits(hits, es_fields=None):
     """
     Converts hits from elasticsearch to Snp objects
 
     Params: hits: hits from elasticsearch
+            es_fields: List of fields requested
 
     Returns: List of Snp objects
     """
-    compliant_results = []
-    for hit in hits:
-        source = hit["_source"]
-        values = {clean_field_name(key): value for key, value in source.items()}
-        values["id"] = hit["_id"]
-        model_instance = SnpModel(**values)
-        compliant_results.append(Snp.from_pydantic(model_instance))
+    return _hits_to_snps(hits, es_fields)
 
-    return compliant_results
 
-
-def convert_scroll_hits(hits, scroll_id=None):
+def convert_scroll_hits(hits, scroll_id=None, es_fields=None):
     """
     Converts hits from elasticsearch to ScrollSnp object
 
     Params: hits: hits from elasticsearch
             scroll_id: scroll_id from elasticsearch
+            es_fields: List of fields requested
 
     Returns: ScrollSnp object
     """
-    compliant_results = []
-    for hit in hits:
-        source = hit["_source"]
-        values = {clean_field_name(key): value for key, value in source.items()}
-        values["id"] = hit["_id"]
-
-        model_instance = SnpModel(**values)
-        compliant_results.append(Snp.from_pydantic(model_instance))
-    return ScrollSnp(snps=compliant_results, scroll_id=scroll_id)
+    return ScrollSnp(snps=_hits_to_snps(hits, es_fields), scroll_id=scroll_id)
 
 
 def convert_aggs(aggs: Dict) -> SnpAggs:
     """
     Converts aggregates from elasticsearch to SnpAggs object.
 
-    The ES response contains keys like "1000Gp3_AC_doc_count" but the SnpAggsModel
-    expects cleaned field names like "_1000Gp3_AC". We need to:
-    1. Extract the original field name prefix from the ES response key
-    2. Convert it to the cleaned API field name
-    3. Build the SnpAggsModel with cleaned field names
+    Aggregation names such as "1000Gp3_AC_doc_count" are looked up in the
+    aggregation plan, which maps them to the SnpAggs attribute of the cleaned
+    field name ("_1000Gp3_AC"), the AggregationItem slot and the function
+    extracting the value.  SnpAggs is built directly; the SnpAggsModel
+    round-trip (with validation) is only made when VALIDATE_SNP_OUTPUT is set.
 
     Params: aggs: Dictionary of aggregates from elasticsearch
 
     Returns: SnpAggs object
     """
-    data = {}
-
-    for key, val in aggs.items():
-        # Keys are like: "1000Gp3_AC_doc_count", "chr_frequency", "pos_min", etc.
-        # We need to extract the field name and suffix
-
-        # Handle _doc_count suffix (note: this is actually "field_doc_count")
-        if key.endswith("_doc_count"):
-            original_field = key[:-10]  # Remove '_doc_count'
-            suffix = "doc_count"
-        elif key.endswith("_min"):
-            original_field = key[:-4]  # Remove '_min'
-            suffix = "min"
-        elif key.endswith("_max"):
-            original_field = key[:-4]  # Remove '_max'
-            suffix = "max"
-        elif key.endswith("_frequency"):
-            original_field = key[:-10]  # Remove '_frequency'
-            suffix = "frequency"
-        elif key.endswith("_missing"):
-            original_field = key[:-8]  # Remove '_missing'
-            suffix = "missing"
-        elif key.endswith("_histogram"):
-            original_field = key[:-10]  # Remove '_histogram'
-            suffix = "histogram"
-        else:
-            # Unknown suffix, try to parse it
-            key_split = key.split("_")
-            original_field = "_".join(key_split[:-1])
-            suffix = key_split[-1]
-            if suffix == "count":
-                suffix = "doc_count"
-                prefix_split = original_field.split("_")
-                original_field = "_".join(prefix_split[:-1])
-
-        # Convert original ES field name to cleaned API field name
-        cleaned_field = clean_field_name(original_field)
-
-        if cleaned_field not in data:
-            data[cleaned_field] = AggregationItem(doc_count=None)
-
-        if hasattr(data[cleaned_field], suffix):
-            setattr(data[cleaned_field], suffix, _map_aggs_value(suffix, val))
-
-    model_instance = SnpAggsModel(**data)
-    return SnpAggs.from_pydantic(model_instance)
-
-    return SnpAggs(**data)
+    items = {}
+    for name, value in aggs.items():
+        if name not in _aggregation_plan:
+            plan_aggregation(*_parse_aggregation_name(name))
+        slot = _aggregation_plan[name]
+        if slot is None:
+            continue
+        item = items.get(slot.attribute)
+        if item is None:
+            item = items[slot.attribute] = AggregationItem(doc_count=None)
+        setattr(item, slot.slot, slot.extract(value))
+
+    if settings.VALIDATE_SNP_OUTPUT:
+        return SnpAggs.from_pydantic(SnpAggsModel(**items))
+    return SnpAggs(**items)
 
 
 def annotation_query():
@@ -176,6 +216,53 @@ def chromosome_query(chr, start, end, filter_args=None):
     return query
 
 
+def regions_query(regions: list[Region], filter_args=None):
+    """
+    Query for getting annotation within any of a list of regions.
+    Regions are grouped per chromosome into one term filter and a bool.should
+    of position ranges.
+
+    Params: regions: List of Region
+            filter_args: FilterArgs object for field exists filter
+
+    Returns: Query for elasticsearch
+    """
+    by_contig: dict[str, list[dict]] = {}
+    for region in regions:
+        by_contig.setdefault(region.contig, []).append(
+            {"range": {"pos": {"gte": region.start, "lte": region.end}}}
+        )
+
+    contig_filters = [
+        {
+            "bool": {
+                "filter": [
+                    {"term": {"chr": contig}},
+                    {"bool": {"should": ranges, "minimum_should_match": 1}},
+                ]
+            }
+        }
+        for contig, ranges in by_contig.items()
+    ]
+
+    if len(contig_filters) == 1:
+        query = contig_filters[0]
+    else:
+        query = {
+            "bool": {
+                "filter": [{"bool": {"should": contig_filters, "minimum_should_match": 1}}]
+            }
+        }
+
+    if filter_args and filter_args.exists:
+        for field in filter_args.exists:
+            if field == "id":
+                field = "_id"
+            query["bool"]["filter"].append({"exists": {"field": field}})
+
+    return query
+
+
 def rsID_query(rsID, filter_args=None):
     """
     Query for getting annotation by rsID
@@ -242,7 +329,7 @@ def IDs_query(ids, filter_args=None):
     return query
 
 
-def gene_query(gene, filter_args=None):
+async def gene_query(gene, filter_args=None):
     """
     Query for getting annotation by gene product
 
@@ -251,20 +338,98 @@ def gene_query(gene, filter_args=None):
 
     Returns: Query for elasticsearch
     """
-    gene_id = map_gene(gene)
-    gene_pos = get_pos_from_gene_id(gene_id, chromosomal_location_dic)
+    gene_pos = await resolve_gene(gene)
 
     if gene_pos:
-        chr = gene_pos[0]
-        start = gene_pos[1]
-        end = gene_pos[2]
-
-        query = chromosome_query(chr, start, end, filter_args)
+        query = chromosome_query(gene_pos.contig, gene_pos.start, gene_pos.end, filter_args)
         return query
 
     return None
 
 
+async def resolve_genes(genes: list[str]) -> dict[str, GeneRecord | None]:
+    """
+    Resolve a list of gene products concurrently
+
+    Params: genes: List of gene products
+
+    Returns: Dictionary of gene product to GeneRecord (None if not found)
+    """
+    records = await asyncio.gather(*[resolve_gene(gene) for gene in genes])
+    return dict(zip(genes, records))
+
+
+def gene_interval_filter(record: GeneRecord):
+    """
+    Filter matching the chromosome interval of a gene
+
+    Params: record: GeneRecord of the gene
+
+    Returns: Query for elasticsearch
+    """
+    return {
+        "bool": {
+            "filter": [
+                {"term": {"chr": record.contig}},
+                {"range": {"pos": {"gte": record.start, "lte": record.end}}},
+            ]
+        }
+    }
+
+
+def gene_records_query(records: list[GeneRecord], filter_args=None):
+    """
+    Query for getting annotation within any of the intervals of a list of genes
+
+    Params: records: List of GeneRecord
+            filter_args: FilterArgs object for field exists filter
+
+    Returns: Query for elasticsearch
+    """
+    query = {
+        "bool": {
+            "filter": [
+                {
+                    "bool": {
+                        "should": [gene_interval_filter(record) for record in records],
+                        "minimum_should_match": 1,
+                    }
+                }
+            ]
+        }
+    }
+
+    if filter_args and filter_args.exists:
+        for field in filter_args.exists:
+            if field == "id":
+                field = "_id"
+            query["bool"]["filter"].append({"exists": {"field": field}})
+
+    return query
+
+
+async def genes_query(genes: list[str], filter_args=None):
+    """
+    Query for getting annotation by a list of gene products
+
+    Params: genes: List of gene products
+            filter_args: FilterArgs object for field exists filter
+
+    Returns: Query for elasticsearch, or None if no gene could be resolved
+    """
+    resolved = await resolve_genes(genes)
+    records = list(dict.fromkeys(r for r in resolved.values() if r is not None))
+
+    if records:
+        return gene_records_query(records, filter_args)
+
+    return None
+
+
+# multi_match over the keyword-searchable fields, copied with the keyword per query
+_KEYWORD_MATCH = {"fields": get_keyword_searchable_fields()}
+
+
 def keyword_query(keyword: str):
     """
     Query for getting annotation by keyword
@@ -273,17 +438,28 @@ def keyword_query(keyword: str):
 
     Returns: Query for elasticsearch
     """
+    return {"multi_match": {"query": keyword, **_KEYWORD_MATCH}}
 
-    searchable_fields = []
-    with open("./data/anno_tree.json") as f:
-        data = json.load(f)
-        searchable_fields = [
-            elt["name"] for elt in data if elt.get("keyword_searchable", False)
-        ]
 
-    query = {"multi_match": {"query": keyword, "fields": searchable_fields}}
+@lru_cache(maxsize=None)
+def aggregation_field(field: str) -> str:
+    """
+    Name to aggregate a field on, cached per field: text fields are counted
+    on their .keyword subfield
 
-    return query
+    Params: field: Original ES field name
+
+    Returns: Field name for terms, composite and missing aggregations
+    """
+    # Types come from anno_tree.json.  DO NOT USE the Snp class, its field
+    # names do not match what is in the data store
+    type_lookup = get_name_to_type()
+    if field not in type_lookup:
+        print(f"Found non-existent field  {field}")
+        return field
+    if type_lookup[field] == "text":
+        return field + ".keyword"
+    return field
 
 
 async def get_aggregation_query(
@@ -298,48 +474,35 @@ async def get_aggregation_query(
     Returns: Query for elasticsearch
     """
     results = dict()
-    type_lookup = get_name_to_type()
     for field, subfields in aggregation_fields:
-        # Check the type of the field. If it is a string, then we have to add .keyword to the field name while querying missing and frequency
-        # Using the pydantic model Snp, we can check the type of the field
-        # annotations = getattr(Snp, '__annotations__', {})
-        # is_text_field = typing.get_args(annotations[field])[0] == str
-        # is_text_field = typing.get_args(inspect.get_annotations(Snp)[field])[0] == str
-        # DO NOT USE SNP class.  The field names do not match what is in the data store
-        textual_suffix = ""
-        if field in type_lookup:
-            field_type = type_lookup[field]
-            if field_type == "text":
-                textual_suffix = ".keyword"
-        else:
-            print(f"Found non-existent field  {field}")
+        keyword_field = aggregation_field(field)
 
         for subfield in subfields:
             if subfield == "doc_count":
-                results[f"{field}_doc_count"] = {"filter": {"exists": {"field": field}}}
+                results[plan_aggregation(field, "doc_count")] = {"filter": {"exists": {"field": field}}}
 
             elif subfield == "min":
-                results[f"{field}_min"] = {"min": {"field": field}}
+                results[plan_aggregation(field, "min")] = {"min": {"field": field}}
 
             elif subfield == "max":
-                results[f"{field}_max"] = {"max": {"field": field}}
+                results[plan_aggregation(field, "max")] = {"max": {"field": field}}
 
             elif subfield == "frequency":
-                results[f"{field}_frequency"] = {
+                results[plan_aggregation(field, "frequency")] = {
                     "terms": {
-                        "field": field + textual_suffix,
+                        "field": keyword_field,
                         "min_doc_count": 0,
                         "size": 20,
                     }
                 }
 
             elif subfield == "missing":
-                results[f"{field}_missing"] = {
-                    "missing": {"field": field + textual_suffix}
+                results[plan_aggregation(field, "missing")] = {
+                    "missing": {"field": keyword_field}
                 }
 
             elif subfield == "histogram":
-                results[f"{field}_histogram"] = {
+                results[plan_aggregation(field, "histogram")] = {
                     "histogram": {
                         "field": field,
                         "interval": histogram.interval,
@@ -1,5 +1,11 @@
+import asyncio
+import heapq
+import time
 from typing import Any, AsyncGenerator
-from src.config.es import es
+
+import orjson
+
+from src.config.es import es_bulk
 from src.config.settings import settings
 from src.graphql.models.annotation_model import FilterArgs
 from src.graphql.resolvers.helper_resolver import (
@@ -7,70 +13,368 @@ from src.graphql.resolvers.helper_resolver import (
     chromosome_query,
     rsIDs_query,
     gene_query,
+    genes_query,
+    regions_query,
 )
+from src.graphql.regions import Region, chunk_regions
 from src.data_access_object.keyword_search import keyword_query_for_fields_with_filters
+from src.graphql.resolvers.resume_token import ResumePoint
+from src.graphql.resolvers.stream_metrics import StreamMetrics
+
+# Position order with the PIT doc as tiebreaker, for results in genomic order
+POSITION_SORT = [{"pos": "asc"}, "_shard_doc"]
+
+
+# Marks the end of a slice worker's output in its queue
+_SLICE_DONE = object()
+
+# Size guess for the first page: bytes per requested field plus the hit envelope
+# (_index, _id, _score, sort)
+BYTES_PER_FIELD_ESTIMATE = 40
+HIT_OVERHEAD_BYTES = 150
+# Hits serialized to estimate the response size when there is no Content-Length
+SAMPLE_HITS = 16
+
+
+class AdaptiveBatchSize:
+    """
+    Page size of a download stream, aiming at settings.STREAM_TARGET_BATCH_BYTES
+    per elasticsearch response.
+
+    The first page is sized from the number of requested fields.  After every
+    response the bytes per hit are measured and averaged with the previous
+    ones, and the size follows them within STREAM_MIN_BATCH_SIZE and
+    STREAM_MAX_BATCH_SIZE.  An explicit batch_size pins the size; the bytes
+    are still measured for the metrics.
+    """
+
+    def __init__(self, field_count: int, batch_size: int | None = None):
+        self.fixed = batch_size is not None
+        self.measured = False
+        self.bytes_per_hit = float(
+            HIT_OVERHEAD_BYTES + BYTES_PER_FIELD_ESTIMATE * max(1, field_count)
+        )
+        self.size = batch_size if batch_size is not None else self._fit()
+
+    def _fit(self) -> int:
+        size = int(settings.STREAM_TARGET_BATCH_BYTES / self.bytes_per_hit)
+        return max(settings.STREAM_MIN_BATCH_SIZE, min(settings.STREAM_MAX_BATCH_SIZE, size))
+
+    def observe(self, hits: int, nbytes: int):
+        """Account for a response of nbytes holding hits records"""
+        if hits <= 0 or nbytes <= 0:
+            return
+        measured = nbytes / hits
+        if self.measured:
+            self.bytes_per_hit = (self.bytes_per_hit + measured) / 2
+        else:
+            self.bytes_per_hit = measured
+            self.measured = True
+        if not self.fixed:
+            self.size = self._fit()
+
+
+def _response_bytes(resp, hits: list) -> int:
+    """Size of a search response, from Content-Length or estimated on a sample of hits"""
+    meta = getattr(resp, "meta", None)
+    if meta is not None:
+        length = meta.headers.get("content-length")
+        if length:
+            return int(length)
+    if not hits:
+        return 0
+    sample = hits[:: max(1, len(hits) // SAMPLE_HITS)][:SAMPLE_HITS]
+    return len(orjson.dumps(sample)) * len(hits) // len(sample)
+
+
+async def _timed_search(
+    search_body: dict, sizer: AdaptiveBatchSize, metrics: StreamMetrics | None
+):
+    start = time.monotonic()
+    resp = await es_bulk.search(body=search_body)
+    seconds = time.monotonic() - start
+    hits = resp["hits"]["hits"]
+    nbytes = _response_bytes(resp, hits)
+    sizer.observe(len(hits), nbytes)
+    if metrics is not None:
+        metrics.record_response(search_body["size"], len(hits), nbytes, seconds)
+    return resp
+
+
+async def _slice_worker(
+    queue: asyncio.Queue,
+    pit_id: str,
+    es_fields: list[str],
+    query: dict,
+    max_results: int,
+    sizer: AdaptiveBatchSize,
+    sort: list,
+    slice_id: int,
+    slices: int,
+    metrics: StreamMetrics | None = None,
+    search_after: list | None = None,
+):
+    """
+    Pages through one slice of a PIT with search_after, starting after the
+    given sort values, and puts every batch of hits on the queue as
+    (slice_id, hits), followed by _SLICE_DONE or the exception that stopped it.
+
+    The request for the next page is sent as soon as the sort values of the
+    current page are known, before waiting for room in the queue, so
+    elasticsearch works while the client drains earlier batches.  The bounded
+    queue caps how far ahead the worker reads.  Every page is sized by the
+    sizer, which is shared by the slices of a stream.
+    """
+
+    def search_body(size: int, search_after: list | None) -> dict:
+        body = {
+            "size": size,
+            "query": query,
+            "pit": {"id": pit_id, "keep_alive": settings.STREAM_PIT_KEEP_ALIVE},
+            "sort": sort,
+            "_source": es_fields,
+        }
+        # ES only accepts slicing into at least 2 slices
+        if slices > 1:
+            body["slice"] = {"id": slice_id, "max": slices}
+        if search_after:
+            body["search_after"] = search_after
+        return body
+
+    size = min(sizer.size, max_results)
+    pending = asyncio.create_task(
+        _timed_search(search_body(size, search_after), sizer, metrics)
+    )
+    fetched = 0
+    try:
+        while pending is not None:
+            resp = await pending
+            pending = None
+            hits = resp["hits"]["hits"]
+            if not hits:
+                break
+            fetched += len(hits)
+            # A short page is the last one of the slice
+            if len(hits) == size and fetched < max_results:
+                size = min(sizer.size, max_results - fetched)
+                pending = asyncio.create_task(
+                    _timed_search(search_body(size, hits[-1]["sort"]), sizer, metrics)
+                )
+
+            start = time.monotonic()
+            await queue.put((slice_id, hits))
+            if metrics is not None:
+                metrics.client_wait_seconds += time.monotonic() - start
+    except Exception as e:
+        await queue.put(e)
+        return
+    finally:
+        if pending is not None:
+            pending.cancel()
+    await queue.put(_SLICE_DONE)
+
+
+async def _next_batch(queue: asyncio.Queue, metrics: StreamMetrics | None = None):
+    """Next (slice_id, hits) batch of a slice, or None once the slice is exhausted"""
+    start = time.monotonic()
+    item = await queue.get()
+    if metrics is not None:
+        metrics.es_wait_seconds += time.monotonic() - start
+    if item is _SLICE_DONE:
+        return None
+    if isinstance(item, Exception):
+        raise item
+    if metrics is not None:
+        metrics.batches += 1
+        metrics.hits += len(item[1])
+    return item
+
+
+async def _merge_unordered(
+    queue: asyncio.Queue, cursors: list, metrics: StreamMetrics | None = None
+) -> AsyncGenerator[Any, None]:
+    """
+    Yields batches of hits from a queue shared by all slices, in arrival order.
+    cursors[i] is kept at the sort values of the last hit yielded from slice i.
+    """
+    remaining = len(cursors)
+    while remaining:
+        batch = await _next_batch(queue, metrics)
+        if batch is None:
+            remaining -= 1
+            continue
+        i, hits = batch
+        cursors[i] = hits[-1]["sort"]
+        yield hits
+
+
+async def _merge_ordered(
+    queues: list[asyncio.Queue],
+    cursors: list,
+    sizer: AdaptiveBatchSize,
+    metrics: StreamMetrics | None = None,
+) -> AsyncGenerator[Any, None]:
+    """
+    Yields batches of sizer.size hits from per-slice queues merged on their sort
+    values.  Every slice is sorted on its own, so a k-way merge restores the
+    global order.
+    cursors[i] is kept at the sort values of the last hit yielded from slice i.
+    """
+    heap = []
+    merged = []
+
+    async def pull(i: int):
+        batch = await _next_batch(queues[i], metrics)
+        if batch is not None:
+            heapq.heappush(heap, (batch[1][0]["sort"], i, 0, batch[1]))
+
+    for i in range(len(queues)):
+        await pull(i)
+    while heap:
+        _, i, j, hits = heapq.heappop(heap)
+        merged.append(hits[j])
+        cursors[i] = hits[j]["sort"]
+        if len(merged) >= sizer.size:
+            yield merged
+            merged = []
+        if j + 1 < len(hits):
+            heapq.heappush(heap, (hits[j + 1]["sort"], i, j + 1, hits))
+        else:
+            await pull(i)
+    if merged:
+        yield merged
 
 
 async def _stream_search_with_pit(
     es_fields: list[str],
     query: dict,
     max_results: int,
-    batch_size: int = 10000,
+    batch_size: int | None = None,
+    sort: list | None = None,
+    ordered: bool = False,
+    slices: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
+    sizer: AdaptiveBatchSize | None = None,
 ) -> AsyncGenerator[Any, None]:
     """
     Generic streaming search using Point in Time API.
 
+    The PIT is read by concurrent slice workers that prefetch into bounded
+    queues ahead of the client, so throughput scales with the shards rather
+    than with the latency of a single search_after round trip.
+
+    After the consumer is done with each batch, a ResumePoint with the slice
+    cursors is recorded in metrics.  Resuming from it reads the same PIT from
+    there on; the PIT is therefore left open (until its keep alive expires)
+    when the consumer stops before the end.  It is closed when the stream
+    completes or fails on an elasticsearch or worker error.
+
     Params: es_fields: List of fields to be returned in elasticsearch query
             query: Elasticsearch query object
             max_results: Maximum number of results to stream
-            batch_size: Number of results per batch
-
-    Yields: Individual SNP records
+            batch_size: Number of results per batch, adapted to the
+                measured record size when None (see AdaptiveBatchSize)
+            sort: Sort order, defaults to index order (_shard_doc)
+            ordered: Merge the slices on the sort values so that results come
+                out in sort order; otherwise batches are yielded as they arrive
+            slices: Number of concurrent PIT slices, defaults to settings.STREAM_SLICES
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records, one per page, instead of single records
+            resume: Point to resume from, counting its rows towards max_results
+            sizer: AdaptiveBatchSize to share with other searches of the same
+                stream, instead of one built from batch_size
+
+    Yields: Individual SNP records, or lists of them when batched
     """
-    pit_id: str | None = None
+    resume = resume or ResumePoint(None, (), 0)
+    pit_id = resume.pit_id
+    cursors = list(resume.cursors) or [None] * max(1, slices or settings.STREAM_SLICES)
+    slices = len(cursors)
+    sort = sort or ["_shard_doc"]
+    sizer = sizer or AdaptiveBatchSize(len(es_fields), batch_size)
+    workers: list[asyncio.Task] = []
+    merged = None
+    completed = False
+    failed = False
     try:
-        # Create PIT
-        pit_response = await es.open_point_in_time(
-            index=settings.ES_INDEX, keep_alive="5m"
+        if resume.rows >= max_results:
+            # Nothing left to read; a resumed PIT is closed below
+            completed = True
+            return
+        if pit_id is None:
+            pit_response = await es_bulk.open_point_in_time(
+                index=settings.ES_INDEX, keep_alive=settings.STREAM_PIT_KEEP_ALIVE
+            )
+            pit_id = pit_response["id"]
+
+        queue_size = max(1, settings.STREAM_QUEUE_SIZE)
+        if ordered:
+            queues = [
+                asyncio.Queue(maxsize=max(1, queue_size // slices)) for _ in range(slices)
+            ]
+        else:
+            queues = [asyncio.Queue(maxsize=queue_size)] * slices
+        workers = [
+            asyncio.create_task(
+                _slice_worker(
+                    queues[i],
+                    pit_id,
+                    es_fields,
+                    query,
+                    max_results - resume.rows,
+                    sizer,
+                    sort,
+                    i,
+                    slices,
+                    metrics,
+                    cursors[i],
+                )
+            )
+            for i in range(slices)
+        ]
+
+        merged = (
+            _merge_ordered(queues, cursors, sizer, metrics)
+            if ordered
+            else _merge_unordered(queues[0], cursors, metrics)
         )
-        pit_id = pit_response["id"]
-
-        search_after = None
-        total_fetched = 0
-
-        while total_fetched < max_results:
-            remaining = max_results - total_fetched
-            size = min(batch_size, remaining)
-
-            search_body = {
-                "size": size,
-                "query": query,
-                "pit": {"id": pit_id, "keep_alive": "1m"},
-                "sort": ["_shard_doc"],
-                "_source": es_fields,
-            }
-            if search_after:
-                search_body["search_after"] = search_after
-
-            # Execute search
-            resp = await es.search(body=search_body)
-            hits = resp["hits"]["hits"]
-            if not hits:
+        total_fetched = resume.rows
+        async for hits in merged:
+            after = tuple(cursors)
+            hits = hits[: max_results - total_fetched]
+            total_fetched += len(hits)
+            point = ResumePoint(pit_id, after, total_fetched, resume.part)
+            if batched:
+                yield hits
+            else:
+                for snp in hits:
+                    yield snp
+            if metrics is not None:
+                metrics.checkpoint(point)
+            if total_fetched >= max_results:
                 break
-
-            # Update PIT id (ES can return a refreshed id)
-            pit_id = resp.get("pit_id", pit_id)
-
-            for snp in hits:
-                yield snp
-                total_fetched += 1
-                if total_fetched >= max_results:
-                    break
-            search_after = hits[-1]["sort"]
+        completed = True
+    except (GeneratorExit, asyncio.CancelledError):
+        # The consumer stopped (e.g. the client disconnected): the PIT stays
+        # open for STREAM_PIT_KEEP_ALIVE so that the download can be resumed
+        raise
+    except BaseException:
+        # Elasticsearch or a slice worker failed: a resume would most likely
+        # fail the same way, so do not hold the PIT context open
+        failed = True
+        raise
     finally:
-        if pit_id:
+        if merged is not None:
+            await merged.aclose()
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        if pit_id and (completed or failed):
             try:
-                await es.close_point_in_time(body={"id": pit_id})
+                await es_bulk.close_point_in_time(body={"id": pit_id})
             except Exception:
                 pass
 
@@ -82,7 +386,10 @@ async def stream_by_chromosome(
     end: int,
     max_results: int,
     filter_args: FilterArgs | None = None,
-    batch_size: int = 10000,
+    batch_size: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
 ) -> AsyncGenerator[Any, None]:
     """
     Stream annotations by chromosome with start and end range of pos.
@@ -93,12 +400,17 @@ async def stream_by_chromosome(
             end: End position
             max_results: Maximum number of results to stream
             filter_args: FilterArgs object for field exists filter
-            batch_size: Number of results per batch
+            batch_size: Number of results per batch, adapted to the record size when None
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records instead of single records
+            resume: Point to resume an interrupted stream from
 
-    Yields: Individual SNP records
+    Yields: Individual SNP records, or lists of them when batched
     """
     query = chromosome_query(chr, start, end, filter_args)
-    async for snp in _stream_search_with_pit(es_fields, query, max_results, batch_size):
+    async for snp in _stream_search_with_pit(
+        es_fields, query, max_results, batch_size, metrics=metrics, batched=batched, resume=resume
+    ):
         yield snp
 
 
@@ -107,7 +419,10 @@ async def stream_by_rsIDs(
     rsIDs: list[str],
     max_results: int,
     filter_args: FilterArgs | None = None,
-    batch_size: int = 10000,
+    batch_size: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
 ) -> AsyncGenerator[Any, None]:
     """
     Stream annotations by list of rsIDs.
@@ -116,12 +431,17 @@ async def stream_by_rsIDs(
             rsIDs: List of rsIDs of snps
             max_results: Maximum number of results to stream
             filter_args: FilterArgs object for field exists filter
-            batch_size: Number of results per batch
+            batch_size: Number of results per batch, adapted to the record size when None
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records instead of single records
+            resume: Point to resume an interrupted stream from
 
-    Yields: Individual SNP records
+    Yields: Individual SNP records, or lists of them when batched
     """
     query = rsIDs_query(rsIDs, filter_args)
-    async for snp in _stream_search_with_pit(es_fields, query, max_results, batch_size):
+    async for snp in _stream_search_with_pit(
+        es_fields, query, max_results, batch_size, metrics=metrics, batched=batched, resume=resume
+    ):
         yield snp
 
 
@@ -130,7 +450,10 @@ async def stream_by_IDs(
     ids: list[str],
     max_results: int,
     filter_args: FilterArgs | None = None,
-    batch_size: int = 10000,
+    batch_size: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
 ) -> AsyncGenerator[Any, None]:
     """
     Stream annotations by IDs.
@@ -139,12 +462,17 @@ async def stream_by_IDs(
             ids: List of IDs of snps
             max_results: Maximum number of results to stream
             filter_args: FilterArgs object for field exists filter
-            batch_size: Number of results per batch
+            batch_size: Number of results per batch, adapted to the record size when None
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records instead of single records
+            resume: Point to resume an interrupted stream from
 
-    Yields: Individual SNP records
+    Yields: Individual SNP records, or lists of them when batched
     """
     query = IDs_query(ids, filter_args)
-    async for snp in _stream_search_with_pit(es_fields, query, max_results, batch_size):
+    async for snp in _stream_search_with_pit(
+        es_fields, query, max_results, batch_size, metrics=metrics, batched=batched, resume=resume
+    ):
         yield snp
 
 
@@ -154,7 +482,10 @@ async def stream_by_keyword(
     max_results: int,
     keyword_fields: list[str] | None = None,
     filter_fields: list[str] | None = None,
-    batch_size: int = 10000,
+    batch_size: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
 ) -> AsyncGenerator[Any, None]:
     """
     Stream annotations by keyword.
@@ -164,16 +495,21 @@ async def stream_by_keyword(
             max_results: Maximum number of results to stream
             keyword_fields: Fields to search keyword in
             filter_fields: Fields that must exist
-            batch_size: Number of results per batch
+            batch_size: Number of results per batch, adapted to the record size when None
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records instead of single records
+            resume: Point to resume an interrupted stream from
 
-    Yields: Individual SNP records
+    Yields: Individual SNP records, or lists of them when batched
     """
     query = keyword_query_for_fields_with_filters(
         keyword,
         keyword_fields,  # type: ignore
         filter_fields,  # type: ignore
     )
-    async for snp in _stream_search_with_pit(es_fields, query, max_results, batch_size):
+    async for snp in _stream_search_with_pit(
+        es_fields, query, max_results, batch_size, metrics=metrics, batched=batched, resume=resume
+    ):
         yield snp
 
 
@@ -182,7 +518,10 @@ async def stream_by_gene_product(
     gene: str,
     max_results: int,
     filter_args: FilterArgs | None = None,
-    batch_size: int = 10000,
+    batch_size: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
 ) -> AsyncGenerator[Any, None]:
     """
     Stream annotations by gene product.
@@ -191,14 +530,112 @@ async def stream_by_gene_product(
             gene: Gene product
             max_results: Maximum number of results to stream
             filter_args: FilterArgs object for field exists filter
-            batch_size: Number of results per batch
+            batch_size: Number of results per batch, adapted to the record size when None
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records instead of single records
+            resume: Point to resume an interrupted stream from
+
+    Yields: Individual SNP records, or lists of them when batched
+    """
+    query = await gene_query(gene, filter_args)
+
+    if query is None:
+        return
+
+    async for snp in _stream_search_with_pit(
+        es_fields, query, max_results, batch_size, metrics=metrics, batched=batched, resume=resume
+    ):
+        yield snp
+
+
+async def stream_by_gene_products(
+    es_fields: list[str],
+    genes: list[str],
+    max_results: int,
+    filter_args: FilterArgs | None = None,
+    batch_size: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
+) -> AsyncGenerator[Any, None]:
+    """
+    Stream annotations by a list of gene products.
+
+    Params: es_fields: List of fields to be returned in elasticsearch query
+            genes: List of gene products
+            max_results: Maximum number of results to stream
+            filter_args: FilterArgs object for field exists filter
+            batch_size: Number of results per batch, adapted to the record size when None
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records instead of single records
+            resume: Point to resume an interrupted stream from
 
-    Yields: Individual SNP records
+    Yields: Individual SNP records, or lists of them when batched
     """
-    query = gene_query(gene, filter_args)
+    query = await genes_query(genes, filter_args)
 
     if query is None:
         return
 
-    async for snp in _stream_search_with_pit(es_fields, query, max_results, batch_size):
+    async for snp in _stream_search_with_pit(
+        es_fields, query, max_results, batch_size, metrics=metrics, batched=batched, resume=resume
+    ):
         yield snp
+
+
+async def stream_by_regions(
+    es_fields: list[str],
+    regions: list[Region],
+    max_results: int,
+    filter_args: FilterArgs | None = None,
+    batch_size: int | None = None,
+    metrics: StreamMetrics | None = None,
+    batched: bool = False,
+    resume: ResumePoint | None = None,
+) -> AsyncGenerator[Any, None]:
+    """
+    Stream annotations within a list of regions, in genomic order.
+    Regions are streamed in single-chromosome chunks, each with its own PIT.
+
+    Params: es_fields: List of fields to be returned in elasticsearch query
+            regions: List of disjoint Region in genomic order
+            max_results: Maximum number of results to stream
+            filter_args: FilterArgs object for field exists filter
+            batch_size: Number of results per batch, adapted to the record size when None
+            metrics: StreamMetrics receiving the ES and client wait times
+            batched: Yield lists of records instead of single records
+            resume: Point to resume an interrupted stream from
+
+    Yields: Individual SNP records, or lists of them when batched
+    """
+    resume = resume or ResumePoint(None, (), 0)
+    total_fetched = resume.rows
+    # Chunks share the measured record size
+    sizer = AdaptiveBatchSize(len(es_fields), batch_size)
+    for part, chunk in enumerate(chunk_regions(regions)):
+        if part < resume.part:
+            continue
+        if total_fetched >= max_results:
+            break
+        query = regions_query(chunk, filter_args)
+        async for hits in _stream_search_with_pit(
+            es_fields,
+            query,
+            max_results,
+            batch_size,
+            POSITION_SORT,
+            ordered=True,
+            metrics=metrics,
+            batched=True,
+            resume=resume if part == resume.part else ResumePoint(None, (), total_fetched, part),
+            sizer=sizer,
+        ):
+            total_fetched += len(hits)
+            if batched:
+                yield hits
+            else:
+                for snp in hits:
+                    yield snp
+        # The PIT of a finished chunk is closed, so resume from the next chunk
+        if metrics is not None:
+            metrics.checkpoint(ResumePoint(None, (), total_fetched, part + 1))
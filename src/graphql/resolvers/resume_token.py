@@ -0,0 +1,87 @@
+import base64
+from typing import Any, NamedTuple
+
+import orjson
+
+from src.cache.result_cache import canonical_key, get_index_generation
+
+
+# Most PIT slices a resume token may carry cursors for
+MAX_RESUME_SLICES = 64
+
+
+class ResumePoint(NamedTuple):
+    """
+    Position of a download stream after its first `rows` records.
+
+    pit_id is the point in time being read and cursors the search_after sort
+    values of every PIT slice (None for a slice nothing was read from yet).
+    part is the index of the query for streams made of several queries, such
+    as region chunks.  A point without pit_id starts a fresh PIT.
+    """
+
+    pit_id: str | None
+    cursors: tuple
+    rows: int
+    part: int = 0
+
+
+def stream_request_hash(*parts: Any) -> str:
+    """Digest identifying a download request on the data currently served"""
+    return canonical_key(get_index_generation(), *parts)
+
+
+def encode_resume_token(request_hash: str, point: ResumePoint) -> str:
+    data = orjson.dumps(
+        {
+            "h": request_hash,
+            "pit": point.pit_id,
+            "after": point.cursors,
+            "rows": point.rows,
+            "part": point.part,
+        }
+    )
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _valid_cursor(cursor: Any) -> bool:
+    """A slice cursor is None or the sort values of a hit"""
+    return cursor is None or (
+        isinstance(cursor, list)
+        and all(value is None or isinstance(value, (str, int, float)) for value in cursor)
+    )
+
+
+def decode_resume_token(token: str, max_rows: int | None = None) -> tuple[str, ResumePoint]:
+    """
+    Decode a resume token
+
+    The request hash only identifies the request, so the position the token
+    carries is range checked here before it reaches elasticsearch.
+
+    Params: token: Token from encode_resume_token
+            max_rows: Record limit of the request, which rows may not exceed
+
+    Returns: request hash and ResumePoint
+
+    Raises: ValueError if the token is malformed or out of range
+    """
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        point = ResumePoint(
+            data["pit"], tuple(data["after"]), int(data["rows"]), int(data["part"])
+        )
+        request_hash = data["h"]
+    except Exception:
+        raise ValueError("Invalid resume token")
+    if (
+        not isinstance(request_hash, str)
+        or not (point.pit_id is None or isinstance(point.pit_id, str))
+        or point.rows < 0
+        or point.part < 0
+        or (max_rows is not None and point.rows > max_rows)
+        or len(point.cursors) > MAX_RESUME_SLICES
+        or not all(_valid_cursor(cursor) for cursor in point.cursors)
+    ):
+        raise ValueError("Invalid resume token")
+    return request_hash, point
@@ -33,11 +33,13 @@ async def query_return(query_type, es_fields, resp):
             resp: Response from elasticsearch query
     """
     if query_type == QueryType.SCROLL:
-        results = convert_scroll_hits(resp["hits"]["hits"], resp["_scroll_id"])
+        results = convert_scroll_hits(
+            resp["hits"]["hits"], resp["_scroll_id"], es_fields
+        )
         return results
 
     elif query_type == QueryType.SNPS:
-        results = convert_scroll_hits(resp["hits"]["hits"], None)
+        results = convert_scroll_hits(resp["hits"]["hits"], None, es_fields)
         return results
 
     elif query_type == QueryType.AGGS:
@@ -126,7 +128,9 @@ async def search_by_chromosome(
         stream = large_result_streaming_resolver.stream_by_chromosome(
             es_fields, chr, start, end, settings.SIZE_DOWNLOAD_SIZE, filter_args
         )
-        return await download_annotations_from_stream(es_fields, stream)
+        return await download_annotations_from_stream(
+            es_fields, stream, chromosome_query(chr, start, end, filter_args)
+        )
 
     resp = await es.search(
         index=settings.ES_INDEX,
@@ -177,7 +181,9 @@ async def search_by_rsID(
         stream = large_result_streaming_resolver.stream_by_rsIDs(
             es_fields, [rsID], settings.SIZE_DOWNLOAD_SIZE, filter_args
         )
-        return await download_annotations_from_stream(es_fields, stream)
+        return await download_annotations_from_stream(
+            es_fields, stream, rsIDs_query([rsID], filter_args)
+        )
 
     resp = await es.search(
         index=settings.ES_INDEX,
@@ -228,7 +234,9 @@ async def search_by_rsIDs(
         stream = large_result_streaming_resolver.stream_by_rsIDs(
             es_fields, rsIDs, settings.SIZE_DOWNLOAD_SIZE, filter_args
         )
-        return await download_annotations_from_stream(es_fields, stream)
+        return await download_annotations_from_stream(
+            es_fields, stream, rsIDs_query(rsIDs, filter_args)
+        )
 
     resp = await es.search(
         index=settings.ES_INDEX,
@@ -280,7 +288,9 @@ async def search_by_IDs(
         stream = large_result_streaming_resolver.stream_by_IDs(
             es_fields, ids, settings.SIZE_DOWNLOAD_SIZE, filter_args
         )
-        return await download_annotations_from_stream(es_fields, stream)
+        return await download_annotations_from_stream(
+            es_fields, stream, IDs_query(ids, filter_args)
+        )
 
     resp = await es.search(
         index=settings.ES_INDEX,
@@ -331,9 +341,12 @@ async def search_by_gene(
         stream = large_result_streaming_resolver.stream_by_gene_product(
             es_fields, gene, settings.SIZE_DOWNLOAD_SIZE, filter_args
         )
-        return await download_annotations_from_stream(es_fields, stream)
+        # Gene positions are cached, so resolving the query again is cheap
+        return await download_annotations_from_stream(
+            es_fields, stream, await gene_query(gene, filter_args)
+        )
 
-    query = gene_query(gene, filter_args)
+    query = await gene_query(gene, filter_args)
 
     if query is not None:
         resp = await es.search(
@@ -397,7 +410,15 @@ async def search_by_keyword_on_specific_fields(
             keyword_fields,  # type: ignore
             filter_fields,
         )
-        return await download_annotations_from_stream(es_fields, stream)
+        return await download_annotations_from_stream(
+            es_fields,
+            stream,
+            keyword_query_for_fields_with_filters(
+                keyword,
+                keyword_fields,  # type: ignore
+                filter_fields,
+            ),
+        )
 
     resp = await es.search(
         index=settings.ES_INDEX,
@@ -450,7 +471,9 @@ async def search_by_keyword(
         stream = large_result_streaming_resolver.stream_by_keyword(
             es_fields, keyword, settings.SIZE_DOWNLOAD_SIZE, None, None
         )
-        return await download_annotations_from_stream(es_fields, stream)
+        return await download_annotations_from_stream(
+            es_fields, stream, keyword_query_for_fields_with_filters(keyword)
+        )
 
     resp = await es.search(
         index=settings.ES_INDEX,
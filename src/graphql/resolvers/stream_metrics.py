@@ -0,0 +1,123 @@
+import secrets
+import time
+from collections import deque
+
+from src.graphql.resolvers.resume_token import ResumePoint, encode_resume_token
+
+# Number of finished streams kept for /streams/stats
+RECENT_STREAMS = 100
+# Number of resume points kept per stream
+RESUME_POINTS = 10
+# Number of elasticsearch responses kept per stream
+RECENT_RESPONSES = 20
+
+
+class StreamMetrics:
+    """
+    Timings of one download stream.
+
+    es_wait_seconds is the time the stream stalled because no batch had
+    arrived from elasticsearch yet.  client_wait_seconds is the time fetched
+    batches were held back because the prefetch queue was full, i.e. the
+    client was not draining the response; it is summed over slice workers.
+    es_request_seconds is the summed latency of the search requests; the
+    requested page size, hits, bytes and latency of the latest responses are
+    kept as well, along with the range of page sizes used.
+
+    The stream also keeps its latest resume points.  A point is recorded once
+    the records before it have been handed to the response, and is exposed
+    as a token that restarts the same request from there.
+    """
+
+    def __init__(self, name: str = "", request_hash: str = ""):
+        self.id = secrets.token_hex(8)
+        self.name = name
+        self.request_hash = request_hash
+        self.resume_points: deque[ResumePoint] = deque(maxlen=RESUME_POINTS)
+        self.started = time.monotonic()
+        self.finished: float | None = None
+        self.es_wait_seconds = 0.0
+        self.client_wait_seconds = 0.0
+        self.es_request_seconds = 0.0
+        self.batches = 0
+        self.hits = 0
+        self.response_bytes = 0
+        self.batch_size_min: int | None = None
+        self.batch_size_max: int | None = None
+        self.responses: deque[tuple[int, int, int, float]] = deque(maxlen=RECENT_RESPONSES)
+
+    def record_response(self, size: int, hits: int, nbytes: int, seconds: float):
+        """Account for a search response to a page request of the given size"""
+        self.es_request_seconds += seconds
+        self.response_bytes += nbytes
+        if self.batch_size_min is None or size < self.batch_size_min:
+            self.batch_size_min = size
+        if self.batch_size_max is None or size > self.batch_size_max:
+            self.batch_size_max = size
+        self.responses.append((size, hits, nbytes, seconds))
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    def checkpoint(self, point: ResumePoint):
+        self.resume_points.append(point)
+
+    def as_dict(self) -> dict:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return {
+            "id": self.id,
+            "name": self.name,
+            "active": self.finished is None,
+            "elapsed_seconds": round(end - self.started, 3),
+            "es_wait_seconds": round(self.es_wait_seconds, 3),
+            "client_wait_seconds": round(self.client_wait_seconds, 3),
+            "es_request_seconds": round(self.es_request_seconds, 3),
+            "batches": self.batches,
+            "hits": self.hits,
+            "response_bytes": self.response_bytes,
+            "batch_size_min": self.batch_size_min,
+            "batch_size_max": self.batch_size_max,
+            "recent_responses": [
+                {"size": size, "hits": hits, "bytes": nbytes, "seconds": round(seconds, 3)}
+                for size, hits, nbytes, seconds in self.responses
+            ],
+        }
+
+    def resume_tokens(self) -> list[dict]:
+        """Latest resume tokens first, with the number of records each one skips"""
+        return [
+            {"rows": point.rows, "token": encode_resume_token(self.request_hash, point)}
+            for point in reversed(self.resume_points)
+        ]
+
+
+class StreamMetricsRegistry:
+    """Active streams plus the most recently finished ones"""
+
+    def __init__(self, recent: int = RECENT_STREAMS):
+        self._active: dict[str, StreamMetrics] = {}
+        self._recent: deque[StreamMetrics] = deque(maxlen=recent)
+
+    def start(self, metrics: StreamMetrics) -> StreamMetrics:
+        self._active[metrics.id] = metrics
+        return metrics
+
+    def finish(self, metrics: StreamMetrics):
+        metrics.finish()
+        if self._active.pop(metrics.id, None) is not None:
+            self._recent.append(metrics)
+
+    def get(self, stream_id: str) -> StreamMetrics | None:
+        metrics = self._active.get(stream_id)
+        if metrics is None:
+            metrics = next((m for m in self._recent if m.id == stream_id), None)
+        return metrics
+
+    def stats(self) -> dict:
+        return {
+            "active": [m.as_dict() for m in self._active.values()],
+            "recent": [m.as_dict() for m in reversed(self._recent)],
+        }
+
+
+stream_metrics = StreamMetricsRegistry()
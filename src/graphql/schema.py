@@ -1,14 +1,13 @@
 from typing import Optional
 import strawberry
 from strawberry.types import Info
-from src.graphql.gene_pos import (
-    get_pos_from_gene_id,
-    map_gene,
-    chromosomal_location_dic,
-)
+from src.graphql.gene_pos import resolve_gene
 from src.graphql.models.snp_model import Gene, ScrollSnp, SnpAggs
 from src.graphql.models.annotation_model import (
+    DownloadStatus,
     FilterArgs,
+    FrequencyPage,
+    FrequencyPageArgs,
     Histogram,
     PageArgs,
     QueryType,
@@ -25,6 +24,12 @@ from src.graphql.resolvers.snp_resolver import (
     search_by_rsIDs,
     search_by_IDs,
 )
+from src.graphql.resolvers.download_resolver import download_jobs
+from src.graphql.resolvers.frequency_resolver import (
+    frequency_by_chromosome,
+    frequency_by_gene,
+    frequency_of_annotations,
+)
 from src.graphql.resolvers.count_resolver import (
     count_by_IDs,
     count_by_chromosome,
@@ -98,10 +103,37 @@ class Query:
     async def count_annotations(self) -> int:
         return await get_annotations_count()
 
+    @strawberry.field(
+        description="Complete frequency buckets of a field over all annotations, paged with after_key"
+    )
+    async def get_frequency(
+        self, field: str, page_args: Optional[FrequencyPageArgs] = None
+    ) -> FrequencyPage:
+        return await frequency_of_annotations(
+            get_original_field_name_or_self(field), page_args
+        )
+
     @strawberry.field
     async def download_annotations(self, fields: list[str]) -> str:
         return await get_annotations(transform_fields(fields), QueryType.DOWNLOAD)
 
+    @strawberry.field(
+        description="Progress of a download job, by the id a download field returned"
+    )
+    def download_status(self, job_id: str) -> Optional[DownloadStatus]:
+        job = download_jobs.get(job_id)
+        if job is None:
+            return None
+        return DownloadStatus(
+            id=job.id,
+            state=job.state,
+            records=job.records,
+            bytes_written=job.bytes_written,
+            url=job.url,
+            error=job.error,
+            cached=job.cached,
+        )
+
     @strawberry.field
     async def scroll_annotations(
         self, info: Info, scroll_id: Optional[str] = None
@@ -171,6 +203,27 @@ class Query:
             chr, start, end, transform_filter_args(filter_args)
         )
 
+    @strawberry.field(
+        description="Complete frequency buckets of a field by chromosome range, paged with after_key"
+    )
+    async def get_frequency_by_chromosome(
+        self,
+        field: str,
+        chr: str,
+        start: int,
+        end: int,
+        page_args: Optional[FrequencyPageArgs] = None,
+        filter_args: Optional[FilterArgs] = None,
+    ) -> FrequencyPage:
+        return await frequency_by_chromosome(
+            get_original_field_name_or_self(field),
+            chr,
+            start,
+            end,
+            page_args,
+            transform_filter_args(filter_args),
+        )
+
     @strawberry.field
     async def download_SNPs_by_chromosome(
         self,
@@ -451,6 +504,23 @@ class Query:
     ) -> int:
         return await count_by_gene(gene, transform_filter_args(filter_args))
 
+    @strawberry.field(
+        description="Complete frequency buckets of a field by gene product, paged with after_key"
+    )
+    async def get_frequency_by_gene_product(
+        self,
+        field: str,
+        gene: str,
+        page_args: Optional[FrequencyPageArgs] = None,
+        filter_args: Optional[FilterArgs] = None,
+    ) -> FrequencyPage:
+        return await frequency_by_gene(
+            get_original_field_name_or_self(field),
+            gene,
+            page_args,
+            transform_filter_args(filter_args),
+        )
+
     @strawberry.field
     async def download_SNPs_by_gene_product(
         self,
@@ -508,11 +578,13 @@ class Query:
 
     @strawberry.field
     async def gene_info(self, gene: str) -> Gene:
-        gene_id = map_gene(gene)
-        gene_pos = get_pos_from_gene_id(gene_id, chromosomal_location_dic)
+        gene_pos = await resolve_gene(gene)
         if gene_pos:
             return Gene(
-                contig=gene_pos[0], start=gene_pos[1], end=gene_pos[2], gene_id=gene_id
+                contig=gene_pos.contig,
+                start=gene_pos.start,
+                end=gene_pos.end,
+                gene_id=gene_pos.gene_id,
             )
         else:
             raise KeyError(f"Gene {gene} not found")
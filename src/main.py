@@ -1,5 +1,3 @@
-from fastapi.responses import FileResponse
-
 import strawberry
 from fastapi import FastAPI, HTTPException
 from strawberry.fastapi import GraphQLRouter
@@ -12,11 +10,11 @@ from src.utils import field_name_mapper
 from src.analytics.ga4 import track_request
 
 import uvicorn
+import asyncio
+import contextlib
 import json
 import os
-import time
-from datetime import datetime, timedelta
-import threading
+from contextlib import asynccontextmanager
 
 
 from src.config.settings import settings
@@ -25,12 +23,37 @@ from src.graphql.schema import Query
 from src.utils import clean_field_name
 
 from src.routers import snp
+from src.graphql.gene_pos import gene_resolver
+from src.graphql.resolvers.api_snp_resolver import search_cache
+from src.graphql.resolvers.api_count_resolver import count_cache
+from src.graphql.resolvers.frequency_resolver import frequency_cache
+from src.graphql.resolvers.stream_metrics import stream_metrics
+from src.graphql.resolvers.download_resolver import (
+    download_cache,
+    load_download_cache,
+    run_download_janitor,
+)
+from src.routers.admission import download_admission
+from src.routers.file_response import RangedFileResponse
 
 # Initialize field name mappings at startup
 field_name_mapper.initialize_from_anno_tree(anno_tree_path="./data/anno_tree.json")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(load_download_cache)
+    janitor = asyncio.create_task(run_download_janitor())
+    yield
+    janitor.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await janitor
+    await gene_resolver.close()
+
+
 # Create a single FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title=snp.TITLE,
     summary=snp.SUMMARY,
     description=snp.DESCRIPTION,
@@ -46,6 +69,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Stream-Id"],
 )
 
 
@@ -119,45 +143,66 @@ def read_annotations():
     return {"results": read_annotations.anno_tree}
 
 
-@app.get("/download/{folder}/{name}", include_in_schema=False)
-async def download_file(folder: str, name: str):
+@app.get("/cache/stats", include_in_schema=False)
+def read_cache_stats():
+    """
+    Endpoint to get hit/miss counters of the in-process caches
+
+    Returns: Statistics per cache
+    """
+    return {
+        "search": search_cache.stats(),
+        "count": count_cache.stats(),
+        "gene_mapping": gene_resolver.cache_stats(),
+        "download": download_cache.stats(),
+        "frequency": frequency_cache.stats(),
+    }
+
+
+@app.get("/streams/stats", include_in_schema=False)
+def read_stream_stats():
+    """
+    Endpoint to get the time active and recent download streams spent waiting
+    on elasticsearch versus waiting on their clients, and the state of the
+    download admission queue
+
+    Returns: Metrics per stream and admission counters
     """
-    Endpoint for downloading files
+    return {**stream_metrics.stats(), "admission": download_admission.stats()}
+
+
+@app.get("/streams/{stream_id}", include_in_schema=False)
+def read_stream(stream_id: str):
+    """
+    Endpoint to get the metrics and latest resume tokens of a download stream
+
+    Returns: Stream metrics with resume_tokens, latest first
+    """
+    metrics = stream_metrics.get(stream_id)
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Unknown stream")
+    return {**metrics.as_dict(), "resume_tokens": metrics.resume_tokens()}
+
+
+@app.api_route("/download/{folder}/{name}", methods=["GET", "HEAD"], include_in_schema=False)
+async def download_file(folder: str, name: str, request: Request):
+    """
+    Endpoint for downloading files, with byte ranges for resuming and
+    parallel downloads, and ETag based revalidation
 
     Returns: Downloaded File Response
     """
     if folder not in settings.SITE_DOWNLOAD_DIR:
         raise HTTPException(status_code=400, detail="Invalid folder")
-    return FileResponse(
-        path=f"{folder}/{name}", filename=name, media_type="application/octet-stream"
+    download_cache.mark_used(name.removesuffix(".txt"))
+    return RangedFileResponse(
+        f"{folder}/{name}",
+        request.headers,
+        filename=name,
+        send_body=request.method != "HEAD",
     )
 
 
-def delete_old_files_periodically(directory, age_minutes, interval_seconds):
-    def cleanup():
-        while True:
-            now = datetime.now()
-            cutoff = now - timedelta(minutes=age_minutes)
-            print(f"Deleting files at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            for filename in os.listdir(directory):
-                if False == filename.endswith(".txt"):
-                    continue
-                filepath = os.path.join(directory, filename)
-                if os.path.isfile(filepath):
-                    file_modified = datetime.fromtimestamp(os.path.getmtime(filepath))
-                    if file_modified < cutoff:
-                        try:
-                            os.remove(filepath)
-                            print(f"Deleted: {filepath}")
-                        except Exception as e:
-                            print(f"Error deleting {filepath}: {e}")
-            time.sleep(interval_seconds)
-
-    thread = threading.Thread(target=cleanup, daemon=True)
-    thread.start()
-    print(f"Started cleanup thread for '{directory}' every {interval_seconds} seconds.")
-
-
 # @api_app.get("/snpAttributes")
 # def read_snp_attributes():
 #     return get_snp_attrib_json()
@@ -166,9 +211,6 @@ def delete_old_files_periodically(directory, age_minutes, interval_seconds):
 def run_app():
     if not os.path.exists(settings.SITE_DOWNLOAD_DIR):
         os.makedirs(settings.SITE_DOWNLOAD_DIR)
-    delete_old_files_periodically(
-        str(settings.SITE_DOWNLOAD_DIR + "/"), age_minutes=60, interval_seconds=3600
-    )
     print(f"Debug...{settings.DEBUG}")
     print(f"Starting server on port {settings.SITE_PORT}")
     uvicorn.run(
@@ -0,0 +1,175 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+
+from src.config.settings import settings
+
+# Retry-After sent before any download has finished to estimate from
+DEFAULT_RETRY_AFTER_SECONDS = 30
+MAX_RETRY_AFTER_SECONDS = 600
+
+
+class AdmissionRejected(Exception):
+    """Raised when a download can not start; retry_after is in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many downloads, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A granted download slot, returned to the controller by release()"""
+
+    def __init__(self, controller: "AdmissionController", client: str):
+        self._controller = controller
+        self.client = client
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """
+    Limits concurrent downloads globally and per client.
+
+    Downloads that can not start right away wait in a queue with one lane per
+    client, served round-robin so that a client submitting many exports does
+    not delay everyone else.  When the queue is full, or a download waited
+    longer than queue_timeout_seconds, AdmissionRejected carries a Retry-After
+    estimate derived from recent download durations.
+    """
+
+    def __init__(
+        self,
+        max_streams: int,
+        max_streams_per_client: int,
+        max_queued: int,
+        queue_timeout_seconds: float,
+    ):
+        self.max_streams = max_streams
+        self.max_streams_per_client = max_streams_per_client
+        self.max_queued = max_queued
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._active: dict[str, int] = {}
+        self._total = 0
+        self._waiting: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._queued = 0
+        self._durations: deque[float] = deque(maxlen=50)
+        self.rejected = 0
+
+    def _can_admit(self, client: str) -> bool:
+        return (
+            self._total < self.max_streams
+            and self._active.get(client, 0) < self.max_streams_per_client
+        )
+
+    def _admit(self, client: str) -> AdmissionTicket:
+        self._total += 1
+        self._active[client] = self._active.get(client, 0) + 1
+        return AdmissionTicket(self, client)
+
+    def _release(self, ticket: AdmissionTicket):
+        self._durations.append(time.monotonic() - ticket.started)
+        self._total -= 1
+        if self._active[ticket.client] == 1:
+            del self._active[ticket.client]
+        else:
+            self._active[ticket.client] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hands free slots to waiting clients, round-robin"""
+        progressed = True
+        while progressed and self._waiting and self._total < self.max_streams:
+            progressed = False
+            for client in list(self._waiting):
+                if self._total >= self.max_streams:
+                    break
+                if not self._can_admit(client):
+                    continue
+                lane = self._waiting[client]
+                future = lane.popleft()
+                self._queued -= 1
+                if lane:
+                    self._waiting.move_to_end(client)
+                else:
+                    del self._waiting[client]
+                if not future.done():
+                    future.set_result(self._admit(client))
+                progressed = True
+
+    def _remove_waiter(self, client: str, future: asyncio.Future):
+        lane = self._waiting.get(client)
+        if lane is not None and future in lane:
+            lane.remove(future)
+            self._queued -= 1
+            if not lane:
+                del self._waiting[client]
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new download"""
+        if not self._durations:
+            return DEFAULT_RETRY_AFTER_SECONDS
+        average = sum(self._durations) / len(self._durations)
+        estimate = average * (self._queued + 1) / max(1, self.max_streams)
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(estimate)))
+
+    def _reject(self) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(self.retry_after())
+
+    async def acquire(self, client: str) -> AdmissionTicket:
+        """
+        Wait for a download slot
+
+        Params: client: Client identifier, e.g. its address
+
+        Returns: AdmissionTicket to release when the download ends
+
+        Raises: AdmissionRejected if the queue is full or the wait timed out
+        """
+        if client not in self._waiting and self._can_admit(client):
+            return self._admit(client)
+        if self._queued >= self.max_queued:
+            raise self._reject()
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client, deque()).append(future)
+        self._queued += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            # The slot may have been granted just as the wait timed out
+            if future.done():
+                return future.result()
+            self._remove_waiter(client, future)
+            raise self._reject()
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                future.result().release()
+            else:
+                self._remove_waiter(client, future)
+                future.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "active": self._total,
+            "queued": self._queued,
+            "rejected": self.rejected,
+            "max_streams": self.max_streams,
+            "max_streams_per_client": self.max_streams_per_client,
+        }
+
+
+download_admission = AdmissionController(
+    settings.DOWNLOAD_MAX_STREAMS,
+    settings.DOWNLOAD_MAX_STREAMS_PER_CLIENT,
+    settings.DOWNLOAD_MAX_QUEUED,
+    settings.DOWNLOAD_QUEUE_TIMEOUT_SECONDS,
+)
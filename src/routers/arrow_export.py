@@ -0,0 +1,163 @@
+import asyncio
+from typing import AsyncIterator, List
+
+from src.data_adapter.snp_attributes import get_name_to_type
+from src.graphql.gene_pos import get_overlapping_genes
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # parquet and arrow downloads are optional
+    pa = None
+
+ARROW_AVAILABLE = pa is not None
+
+PARQUET = "parquet"
+ARROW = "arrow"
+
+
+def _arrow_type(field: str):
+    field_type = get_name_to_type().get(field)
+    if field_type == "long":
+        return pa.int64()
+    if field_type == "float":
+        return pa.float64()
+    return pa.string()
+
+
+def build_schema(parsed_fields: List[str], include_genes: bool = False):
+    """
+    Arrow schema of a download: long and float attributes of anno_tree.json
+    become int64 and float64 columns, everything else strings.
+
+    Params: parsed_fields: Requested fields, in column order
+            include_genes: Add a genes column listing the overlapping gene ids
+
+    Returns: pyarrow.Schema
+    """
+    columns = [pa.field(field, _arrow_type(field)) for field in parsed_fields]
+    if include_genes:
+        columns.append(pa.field("genes", pa.list_(pa.string())))
+    return pa.schema(columns)
+
+
+def _to_number(value, cast):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _column(values: list, arrow_type):
+    """Column of values, coercing the ones that do not match the mapping type"""
+    if pa.types.is_string(arrow_type):
+        return pa.array(
+            [v if v is None or isinstance(v, str) else str(v) for v in values], type=arrow_type
+        )
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        cast = int if pa.types.is_integer(arrow_type) else float
+        return pa.array(
+            [None if v is None else _to_number(v, cast) for v in values], type=arrow_type
+        )
+
+
+def hits_to_record_batch(hits: list, parsed_fields: List[str], schema, include_genes: bool = False):
+    """
+    Converts a batch of hits from elasticsearch to an Arrow RecordBatch
+
+    Params: hits: hits from elasticsearch
+            parsed_fields: Requested fields, in column order
+            schema: Schema from build_schema
+            include_genes: Fill the genes column
+
+    Returns: pyarrow.RecordBatch
+    """
+    columns = []
+    for field, arrow_field in zip(parsed_fields, schema):
+        if field == "id":
+            values = [hit["_id"] for hit in hits]
+        else:
+            values = [hit["_source"].get(field) for hit in hits]
+        columns.append(_column(values, arrow_field.type))
+    if include_genes:
+        columns.append(
+            pa.array(
+                [
+                    list(get_overlapping_genes(hit["_source"].get("chr"), hit["_source"].get("pos")))
+                    for hit in hits
+                ],
+                type=pa.list_(pa.string()),
+            )
+        )
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object collecting what the Arrow writers produce"""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ArrowStreamWriter:
+    """
+    Writes batches of hits as Parquet (one row group per batch) or as an
+    Arrow IPC stream (one record batch per batch).  Only the current batch is
+    held in memory; write() and close() return the bytes produced so far.
+    """
+
+    def __init__(self, format_type: str, parsed_fields: List[str], include_genes: bool = False):
+        if pa is None:
+            raise ImportError("The 'pyarrow' package is required for parquet and arrow downloads")
+        self.parsed_fields = parsed_fields
+        self.include_genes = include_genes
+        self.schema = build_schema(parsed_fields, include_genes)
+        self._sink = _ChunkSink()
+        if format_type == PARQUET:
+            self._writer = pq.ParquetWriter(self._sink, self.schema)
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def write(self, hits: list) -> bytes:
+        batch = hits_to_record_batch(hits, self.parsed_fields, self.schema, self.include_genes)
+        self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+async def generate_arrow(
+    batches: AsyncIterator, format_type: str, parsed_fields: List[str], include_genes: bool
+) -> AsyncIterator[bytes]:
+    """
+    Encodes batches of hits as Parquet or Arrow IPC.  Encoding runs in a worker
+    thread so that building column batches does not block the event loop.
+    """
+    writer = ArrowStreamWriter(format_type, parsed_fields, include_genes)
+    async for snps in batches:
+        if snps:
+            data = await asyncio.to_thread(writer.write, snps)
+            if data:
+                yield data
+    yield await asyncio.to_thread(writer.close)
@@ -0,0 +1,109 @@
+import asyncio
+import zlib
+from typing import AsyncIterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+ZSTD_AVAILABLE = zstandard is not None
+
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3}
+MAX_LEVELS = {GZIP: 9, ZSTD: 22}
+FILE_EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst"}
+MEDIA_TYPES = {GZIP: "application/gzip", ZSTD: "application/zstd"}
+
+
+class StreamCompressor:
+    """
+    Incremental gzip or zstd compressor.  compress() returns whatever output
+    is ready (possibly nothing) and flush() ends the stream.
+    """
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        level = level or DEFAULT_LEVELS[encoding]
+        if encoding == GZIP:
+            # wbits 16 + MAX_WBITS writes a gzip header and trailer
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == ZSTD:
+            if zstandard is None:
+                raise ImportError("The 'zstandard' package is required for zstd compression")
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"Unsupported compression '{encoding}'")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _accepted_codings(accept_encoding: str) -> dict[str, float]:
+    """Quality value of every coding listed in an Accept-Encoding header"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """Whether an Accept-Encoding header value allows the given encoding"""
+    if not accept_encoding:
+        return False
+    accepted = _accepted_codings(accept_encoding)
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the response compression from an Accept-Encoding header
+
+    Params: accept_encoding: Accept-Encoding header value, if any
+
+    Returns: ZSTD or GZIP (zstd preferred when available), or None
+    """
+    if not accept_encoding:
+        return None
+    accepted = _accepted_codings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in (ZSTD, GZIP):
+        if encoding == ZSTD and not ZSTD_AVAILABLE:
+            continue
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+async def compress_stream(
+    chunks: AsyncIterator[bytes], encoding: str, level: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Compress a byte stream incrementally.  Compression runs in a worker thread
+    (zlib and zstandard release the GIL) so large exports never block the
+    event loop.
+
+    Params: chunks: Uncompressed chunks
+            encoding: GZIP or ZSTD
+            level: Compression level, defaults to DEFAULT_LEVELS[encoding]
+
+    Yields: Compressed chunks
+    """
+    compressor = StreamCompressor(encoding, level)
+    async for chunk in chunks:
+        compressed = await asyncio.to_thread(compressor.compress, chunk)
+        if compressed:
+            yield compressed
+    yield await asyncio.to_thread(compressor.flush)
@@ -0,0 +1,198 @@
+import asyncio
+import mmap
+import os
+from email.utils import formatdate
+from typing import Mapping, Optional
+
+from starlette.responses import Response
+
+from src.routers.compression import GZIP, accepts_encoding
+
+# Largest piece of a file handed to the server in one send
+SEND_CHUNK_SIZE = 1024 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range starts beyond the end of the file"""
+
+
+def file_etag(stat: os.stat_result, encoding: Optional[str] = None) -> str:
+    """Strong ETag of a file version, distinct per content encoding"""
+    tag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    if encoding:
+        tag += f"-{encoding}"
+    return f'"{tag}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value lists the ETag (weak comparison)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def parse_range(header: Optional[str], size: int) -> tuple[int, int] | None:
+    """
+    Byte range of a Range header value
+
+    Params: header: Range header value, if any
+            size: File size
+
+    Returns: (start, end) with end exclusive, or None to serve the whole
+             file (no header, an unsupported unit, a malformed value or
+             several ranges)
+
+    Raises: RangeNotSatisfiable if the range lies beyond the end of the file
+    """
+    if not header or size == 0:
+        return None
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, sep, last = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            if start >= size:
+                raise RangeNotSatisfiable()
+            end = int(last) + 1 if last else size
+            if end <= start:
+                return None
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            start = max(0, size - suffix)
+            end = size
+    except ValueError:
+        return None
+    return start, min(end, size)
+
+
+class RangedFileResponse(Response):
+    """
+    Serves a file with Range, ETag and If-None-Match support.
+
+    The body goes through the ASGI zero-copy send extension when the server
+    offers it, and otherwise as memoryview slices of a read-only mmap of the
+    file, so its bytes are never copied into Python objects.  A gzip copy
+    next to the file (path + ".gz") is served instead to clients accepting
+    gzip, with ranges applying to the compressed bytes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        request_headers: Mapping[str, str],
+        filename: Optional[str] = None,
+        media_type: str = "application/octet-stream",
+        send_body: bool = True,
+    ):
+        self.path = path
+        self.request_headers = request_headers
+        self.filename = filename or os.path.basename(path)
+        self.media_type = media_type
+        self.send_body = send_body
+        self.background = None
+        self.status_code = 200
+        self.init_headers({})
+
+    def _select(self) -> tuple[str, Optional[str], os.stat_result]:
+        """File to serve, its content encoding and stat"""
+        if accepts_encoding(self.request_headers.get("accept-encoding"), GZIP):
+            try:
+                gz_path = self.path + ".gz"
+                return gz_path, GZIP, os.stat(gz_path)
+            except FileNotFoundError:
+                pass
+        return self.path, None, os.stat(self.path)
+
+    async def _start(self, send, status: int, headers: dict[str, str]):
+        self.status_code = status
+        self.init_headers(headers)
+        await send(
+            {"type": "http.response.start", "status": status, "headers": self.raw_headers}
+        )
+
+    async def __call__(self, scope, receive, send):
+        try:
+            path, encoding, stat = await asyncio.to_thread(self._select)
+        except FileNotFoundError:
+            self.media_type = "text/plain"
+            await self._start(send, 404, {"content-length": "9"})
+            await send({"type": "http.response.body", "body": b"Not Found"})
+            return
+
+        etag = file_etag(stat, encoding)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat.st_mtime, usegmt=True),
+            "vary": "Accept-Encoding",
+            "content-disposition": f'attachment; filename="{self.filename}"',
+        }
+        if encoding:
+            headers["content-encoding"] = encoding
+
+        if etag_matches(self.request_headers.get("if-none-match"), etag):
+            await self._start(send, 304, headers)
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        size = stat.st_size
+        byte_range = None
+        if_range = self.request_headers.get("if-range")
+        if if_range is None or if_range.strip() == etag:
+            try:
+                byte_range = parse_range(self.request_headers.get("range"), size)
+            except RangeNotSatisfiable:
+                headers["content-range"] = f"bytes */{size}"
+                await self._start(send, 416, {**headers, "content-length": "0"})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        status = 200
+        start, end = 0, size
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+        headers["content-length"] = str(end - start)
+        await self._start(send, status, headers)
+
+        if not self.send_body or end == start:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(path, "rb") as f:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": f,
+                        "offset": start,
+                        "count": end - start,
+                    }
+                )
+            return
+
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        # The map is released with the last slice: middleware may still hold
+        # the slice of the previous send when the next one starts
+        view = memoryview(mapped)
+        for offset in range(start, end, SEND_CHUNK_SIZE):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": view[offset : min(end, offset + SEND_CHUNK_SIZE)],
+                    "more_body": True,
+                }
+            )
+        await send({"type": "http.response.body", "body": b""})
@@ -1,27 +1,36 @@
 """snp router."""
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from src.graphql.models.annotation_model import FilterArgs, PageArgs
 from src.graphql.resolvers.api_snp_resolver import (
     search_by_chromosome,
     search_by_rsIDs,
     search_by_gene_product,
+    search_by_gene_products,
+    search_by_regions,
 )
 from src.graphql.resolvers.api_count_resolver import (
     count_by_chromosome,
     count_by_rsIDs,
     count_by_gene_product,
+    count_by_gene_products,
+    count_by_regions,
 )
-from src.graphql.models.return_info_model import OutputSnpInfo, OutputCountInfo
+from src.graphql.models.return_info_model import OutputSnpInfo, OutputCountInfo, OutputGeneCountInfo
 from src.data_adapter.snp_attributes import (
     get_snp_attrib_json,
 )
 from src.routers.snp_router_helpers import (
     MAX_ATTRIB_SIZE,
+    MAX_GENE_LIST_SIZE,
     MAX_PAGE_SIZE,
+    MAX_REGION_LIST_SIZE,
+    REGIONS_BODY_OPENAPI,
     ChromosomeIdentifierType,
     CommonSearchQueryParams,
     parse_filter_fields,
+    parse_gene_list,
+    parse_regions_request,
 )
 from src.routers.streaming import router as streaming_router
 
@@ -48,7 +57,7 @@ TAGS_METADATA = [
     {
         "name": "SNP",
         "description": (
-            "Retrieve SNPs by chromosome range, RSID list, or gene product. Each response always includes "
+            "Retrieve SNPs by chromosome range, region list, RSID list, or gene product(s). Each response always includes "
             f"the SNP identifier plus the attributes you request (maximum {MAX_ATTRIB_SIZE} per call)."
         ),
     },
@@ -56,7 +65,7 @@ TAGS_METADATA = [
         "name": "DOWNLOAD",
         "description": (
             "Download SNP annotations for large result sets exceeding pagination limits. Download by chromosome "
-            "range or RSID list in CSV (default) or NDJSON format."
+            "range or RSID list in CSV (default), NDJSON, Parquet or Arrow format."
         ),
     },
     {
@@ -115,6 +124,12 @@ async def get_snps_by_chr(
     end_position: int = Query(
         100000, description="1-based inclusive end position for the search interval."
     ),
+    include_genes: bool = Query(
+        default=False,
+        description=(
+            "Also return `genes`, listing for each SNP in `details` the ids of the genes overlapping its position."
+        ),
+    ),
     params: CommonSearchQueryParams = Depends(),
 ):
     page_args = PageArgs(from_=params.pagination_from, size=params.pagination_size)
@@ -133,6 +148,7 @@ async def get_snps_by_chr(
         end_position,
         page_args,
         filter_args,
+        include_genes,
     )
 
 
@@ -208,6 +224,87 @@ async def get_SNPs_by_gene_product(
     return await search_by_gene_product(attribs, gene, page_args, filter_args)
 
 
+@router.get(
+    "/snp/gene_products",
+    tags=["SNP"],
+    summary="Search SNPs by a list of gene products",
+    description=(
+        "Returns SNPs linked to any of the supplied gene products in a single paginated search.\n\n"
+        "**Use when** you need annotations for a gene panel; all genes are resolved concurrently and searched "
+        "with one query. Switch to `/snp/gene_products/download` for large exports.\n"
+        "**Key limits**\n"
+        f"- At most {MAX_GENE_LIST_SIZE} gene products per call.\n"
+        f"- `pagination_from + pagination_size` must be ≤ {MAX_PAGE_SIZE}.\n"
+        f"- Attribute selection is limited to {MAX_ATTRIB_SIZE} fields per call."
+    ),
+    response_model=OutputSnpInfo,
+    response_model_exclude_none=True,
+    response_description="Paginated SNP results for the requested gene products.",
+)
+async def get_SNPs_by_gene_products(
+    genes: str = Query(
+        example="ZMYND11,ABCA1,BRCA2",
+        description="Comma-separated gene product identifiers (gene ID, gene symbol, or UniProt ID).",
+    ),
+    params: CommonSearchQueryParams = Depends(),
+):
+    page_args = PageArgs(from_=params.pagination_from, size=params.pagination_size)
+    filter_args = (
+        FilterArgs(exists=params._parsed_filter_fields)
+        if params._parsed_filter_fields
+        else None
+    )
+
+    attribs = params._parsed_fields
+
+    return await search_by_gene_products(
+        attribs, parse_gene_list(genes), page_args, filter_args
+    )
+
+
+@router.post(
+    "/snp/regions",
+    tags=["SNP"],
+    summary="Search SNPs in a list of regions",
+    description=(
+        "Paginated search of SNPs within many chromosome intervals, returned in genomic order.\n\n"
+        "**Input**\n"
+        "- `regions`: inline list such as `1:10000-20000,X:500-900` (1-based, inclusive), and/or\n"
+        "- a BED request body (`text/plain`, 0-based half-open, as in the BED format).\n\n"
+        "Overlapping regions are merged before searching. Switch to `/snp/regions/download` for complete exports.\n"
+        "**Key limits**\n"
+        f"- At most {MAX_REGION_LIST_SIZE} regions per call.\n"
+        f"- `pagination_from + pagination_size` must be ≤ {MAX_PAGE_SIZE}.\n"
+        f"- Attribute selection is limited to {MAX_ATTRIB_SIZE} fields per call."
+    ),
+    response_model=OutputSnpInfo,
+    response_model_exclude_none=True,
+    response_description="Paginated SNP results for the requested regions.",
+    openapi_extra=REGIONS_BODY_OPENAPI,
+)
+async def get_SNPs_by_regions(
+    request: Request,
+    regions: str = Query(
+        default=None,
+        example="1:10000-20000,2:50000-60000",
+        description="Comma-separated `chr:start-end` regions (1-based, inclusive).",
+    ),
+    params: CommonSearchQueryParams = Depends(),
+):
+    page_args = PageArgs(from_=params.pagination_from, size=params.pagination_size)
+    filter_args = (
+        FilterArgs(exists=params._parsed_filter_fields)
+        if params._parsed_filter_fields
+        else None
+    )
+
+    attribs = params._parsed_fields
+
+    return await search_by_regions(
+        attribs, await parse_regions_request(request, regions), page_args, filter_args
+    )
+
+
 @router.get(
     "/count/chr",
     tags=["Count"],
@@ -311,3 +408,76 @@ async def count_snps_by_gene_product(
     else:
         filter_args = None
     return await count_by_gene_product(gene, filter_args)
+
+
+@router.get(
+    "/count/gene_products",
+    tags=["Count"],
+    summary="Count SNPs by a list of gene products",
+    description=(
+        "Returns the number of SNPs associated with any of the specified gene products. Set `per_gene` to also "
+        "receive the count for each gene, computed in the same request. Genes that cannot be resolved are "
+        f"listed in `unresolved_genes`. At most {MAX_GENE_LIST_SIZE} gene products per call."
+    ),
+    response_model=OutputGeneCountInfo,
+    response_model_exclude_none=True,
+    response_description="Count of SNPs matching the gene products, optionally broken down per gene.",
+)
+async def count_snps_by_gene_products(
+    genes: str = Query(
+        example="ZMYND11,ABCA1,BRCA2",
+        description="Comma-separated gene product identifiers (gene ID, gene symbol, or UniProt ID).",
+    ),
+    per_gene: bool = Query(
+        default=False, description="Also return the number of SNPs for each gene product."
+    ),
+    filter_fields: str = Query(
+        default=None,
+        description=(
+            "Comma-separated attribute labels that must be non-null for a record to be counted. "
+            "Only valid labels are applied."
+        ),
+    ),
+):
+    parsed_filter_fields = parse_filter_fields(filter_fields)
+    if parsed_filter_fields is not None:
+        filter_args = FilterArgs(exists=parsed_filter_fields)
+    else:
+        filter_args = None
+    return await count_by_gene_products(parse_gene_list(genes), filter_args, per_gene)
+
+
+@router.post(
+    "/count/regions",
+    tags=["Count"],
+    summary="Count SNPs in a list of regions",
+    description=(
+        "Returns the number of SNPs within any of the supplied regions, given inline (`regions`) and/or as a BED "
+        "request body. Overlapping regions are counted once. Apply `filter_fields` to require non-null values for "
+        f"specific attributes. At most {MAX_REGION_LIST_SIZE} regions per call."
+    ),
+    response_model=OutputCountInfo,
+    response_description="Count of SNPs matching the regions and optional filters.",
+    openapi_extra=REGIONS_BODY_OPENAPI,
+)
+async def count_snps_by_regions(
+    request: Request,
+    regions: str = Query(
+        default=None,
+        example="1:10000-20000,2:50000-60000",
+        description="Comma-separated `chr:start-end` regions (1-based, inclusive).",
+    ),
+    filter_fields: str = Query(
+        default=None,
+        description=(
+            "Comma-separated attribute labels that must be non-null for a record to be counted. "
+            "Only valid labels are applied."
+        ),
+    ),
+):
+    parsed_filter_fields = parse_filter_fields(filter_fields)
+    if parsed_filter_fields is not None:
+        filter_args = FilterArgs(exists=parsed_filter_fields)
+    else:
+        filter_args = None
+    return await count_by_regions(await parse_regions_request(request, regions), filter_args)
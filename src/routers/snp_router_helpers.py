@@ -1,12 +1,32 @@
+from fastapi import HTTPException, Request
 from pydantic import BaseModel, Field, model_validator, PrivateAttr
 import json
 from typing import List, Optional
 from src.data_adapter.snp_attributes import get_attrib_list
+from src.graphql.resolvers.api_snp_helper_resolver import with_location_fields
+from src.graphql.regions import Region, merge_regions, parse_bed, parse_inline_regions
+from src.routers.arrow_export import ARROW, ARROW_AVAILABLE, PARQUET
+from src.routers.compression import DEFAULT_LEVELS, GZIP, MAX_LEVELS, ZSTD, ZSTD_AVAILABLE
 from enum import Enum
 
 # Constants
 MAX_PAGE_SIZE = 10_000
 MAX_ATTRIB_SIZE = 20
+MAX_GENE_LIST_SIZE = 1_000
+MAX_REGION_LIST_SIZE = 20_000
+
+# Documents the optional BED request body of the region endpoints
+REGIONS_BODY_OPENAPI = {
+    "requestBody": {
+        "required": False,
+        "content": {
+            "text/plain": {
+                "schema": {"type": "string"},
+                "example": "chr1\t10000\t20000\nchr2\t50000\t60000\n",
+            }
+        },
+    }
+}
 
 
 CHR_1 = "1"
@@ -74,6 +94,49 @@ def parse_filter_fields(filter_fields: Optional[str]) -> List[str] | None:
     return filtered_list or None
 
 
+def parse_gene_list(genes: str) -> List[str]:
+    """
+    Parse a comma-separated string of gene products into a de-duplicated list.
+    Raises a 400 error when the list is empty or longer than MAX_GENE_LIST_SIZE.
+    """
+    gene_list = list(dict.fromkeys(g.strip() for g in genes.split(",") if g.strip()))
+    if not gene_list:
+        raise HTTPException(status_code=400, detail="Please provide at least one gene product.")
+    if len(gene_list) > MAX_GENE_LIST_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Number of gene products ({len(gene_list)}) exceeds maximum allowed ({MAX_GENE_LIST_SIZE}).",
+        )
+    return gene_list
+
+
+async def parse_regions_request(request: Request, regions: Optional[str]) -> List[Region]:
+    """
+    Collect regions from the inline `regions` parameter and the BED request body.
+    Returns the merged, genomically ordered regions; raises a 400 error when the
+    input is invalid, empty or longer than MAX_REGION_LIST_SIZE.
+    """
+    body = (await request.body()).decode("utf-8", errors="replace")
+    try:
+        parsed = parse_inline_regions(regions) if regions else []
+        if body.strip():
+            parsed += parse_bed(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not parsed:
+        raise HTTPException(
+            status_code=400,
+            detail="Please provide regions inline or as a BED request body.",
+        )
+    if len(parsed) > MAX_REGION_LIST_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Number of regions ({len(parsed)}) exceeds maximum allowed ({MAX_REGION_LIST_SIZE}).",
+        )
+    return merge_regions(parsed)
+
+
 class CommonSearchQueryParams(BaseModel):
     """
     Common reusable query params for pagination and field selection.
@@ -169,6 +232,14 @@ class CommonSearchQueryParams(BaseModel):
 class StreamingFormatType(str, Enum):
     CSV = "csv"
     NDJSON = "ndjson"
+    PARQUET = PARQUET
+    ARROW = ARROW
+
+
+class StreamingCompressionType(str, Enum):
+    NONE = "none"
+    GZIP = GZIP
+    ZSTD = ZSTD
 
 
 class StreamingQueryParams(BaseModel):
@@ -192,7 +263,43 @@ class StreamingQueryParams(BaseModel):
     )
     format: StreamingFormatType = Field(
         default=StreamingFormatType.CSV,
-        description="Output format: 'csv' (default) or 'ndjson'",
+        description=(
+            "Output format: 'csv' (default), 'ndjson', 'parquet' (one row group per batch) or "
+            "'arrow' (Arrow IPC stream). Parquet and Arrow columns are typed from the attribute metadata."
+        ),
+    )
+    include_genes: bool = Field(
+        default=False,
+        description=(
+            "Attach the ids of the genes overlapping each SNP, as a `genes` column (semicolon-separated) "
+            "in CSV or a `genes` array in NDJSON."
+        ),
+    )
+    compression: Optional[StreamingCompressionType] = Field(
+        default=None,
+        description=(
+            "Download a compressed file: 'gzip' (`.gz`) or 'zstd' (`.zst`, if available on the server). "
+            "When omitted, the response is compressed transparently according to the `Accept-Encoding` "
+            "header; 'none' disables compression."
+        ),
+    )
+    compression_level: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=MAX_LEVELS[ZSTD],
+        description=(
+            f"Compression level: 1–{MAX_LEVELS[GZIP]} for gzip (default {DEFAULT_LEVELS[GZIP]}), "
+            f"1–{MAX_LEVELS[ZSTD]} for zstd (default {DEFAULT_LEVELS[ZSTD]})."
+        ),
+    )
+    resume_from: Optional[str] = Field(
+        default=None,
+        description=(
+            "Resume token of an interrupted download of the same request, listed at `/streams/{id}` "
+            "where `id` is the `X-Stream-Id` response header. The download restarts after the number of "
+            "records given with the token; CSV is then sent without a header. Not available for "
+            "parquet and arrow downloads."
+        ),
     )
 
     _parsed_fields: List[str] = PrivateAttr(default_factory=list)
@@ -227,3 +334,23 @@ class StreamingQueryParams(BaseModel):
 
         self._parsed_fields = filtered_fields
         self._parsed_filter_fields = parse_filter_fields(self.filter_fields)
+
+        if (
+            self.format in (StreamingFormatType.PARQUET, StreamingFormatType.ARROW)
+            and not ARROW_AVAILABLE
+        ):
+            raise ValueError(f"{self.format.value} downloads are not available on this server.")
+        if self.compression == StreamingCompressionType.ZSTD and not ZSTD_AVAILABLE:
+            raise ValueError("zstd compression is not available on this server.")
+        if (
+            self.compression == StreamingCompressionType.GZIP
+            and self.compression_level is not None
+            and self.compression_level > MAX_LEVELS[GZIP]
+        ):
+            raise ValueError(f"gzip compression_level must be at most {MAX_LEVELS[GZIP]}.")
+
+    def source_fields(self) -> List[str]:
+        """Fields to fetch from elasticsearch, including those needed for gene overlap."""
+        if self.include_genes:
+            return with_location_fields(self._parsed_fields)
+        return self._parsed_fields
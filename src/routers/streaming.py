@@ -1,19 +1,41 @@
-from fastapi import APIRouter, Depends, Query
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
-import orjson
-from src.graphql.resolvers.api_snp_helper_resolver import convert_hits_to_output
+from src.graphql.resolvers.api_snp_helper_resolver import render_ndjson
+from src.graphql.gene_pos import get_overlapping_genes
 from src.graphql.models.annotation_model import FilterArgs
+from src.graphql.resolvers.resume_token import (
+    ResumePoint,
+    decode_resume_token,
+    stream_request_hash,
+)
+from src.graphql.resolvers.stream_metrics import StreamMetrics, stream_metrics
 from src.graphql.resolvers.large_result_streaming_resolver import (
     stream_by_chromosome,
     stream_by_gene_product,
+    stream_by_gene_products,
+    stream_by_regions,
     stream_by_rsIDs,
 )
+from src.routers.admission import AdmissionRejected, AdmissionTicket, download_admission
+from src.routers.arrow_export import generate_arrow
+from src.routers.compression import (
+    FILE_EXTENSIONS,
+    MAX_LEVELS,
+    MEDIA_TYPES,
+    compress_stream,
+    negotiate_encoding,
+)
 from src.routers.snp_router_helpers import (
     MAX_ATTRIB_SIZE,
+    MAX_GENE_LIST_SIZE,
+    MAX_REGION_LIST_SIZE,
+    REGIONS_BODY_OPENAPI,
+    StreamingCompressionType,
     StreamingFormatType,
     StreamingQueryParams,
     ChromosomeIdentifierType,
+    parse_gene_list,
+    parse_regions_request,
 )
 from typing import AsyncIterator, List, Optional, Callable
 import csv
@@ -24,6 +46,9 @@ router = APIRouter()
 
 MAX_DOWNLOAD_SIZE = 1_000_000
 
+# Approximate size of the chunks written to the client
+STREAM_CHUNK_SIZE = 128 * 1024
+
 
 def get_streaming_headers_and_media_type(format_type: str):
     """
@@ -35,6 +60,18 @@ def get_streaming_headers_and_media_type(format_type: str):
             "X-Accel-Buffering": "no",
         }
         media_type = "text/csv"
+    elif format_type == "parquet":
+        headers = {
+            "Content-Disposition": 'attachment; filename="export.parquet"',
+            "X-Accel-Buffering": "no",
+        }
+        media_type = "application/vnd.apache.parquet"
+    elif format_type == "arrow":
+        headers = {
+            "Content-Disposition": 'attachment; filename="export.arrow"',
+            "X-Accel-Buffering": "no",
+        }
+        media_type = "application/vnd.apache.arrow.stream"
     else:  # ndjson
         headers = {
             "Content-Disposition": 'attachment; filename="export.ndjson"',
@@ -50,46 +87,112 @@ async def generate_stream(
     *args,
     format_type: StreamingFormatType,
     parsed_fields: List[str],
+    include_genes: bool = False,
+    metrics: Optional[StreamMetrics] = None,
+    resume: Optional[ResumePoint] = None,
     **kwargs,
 ) -> AsyncIterator[bytes]:
     """
-    Generic generator function that handles both CSV and NDJSON formats.
+    Generic generator function that handles the CSV, NDJSON, Parquet and Arrow formats.
+    With include_genes, the records must carry chr and pos.
+    Timings and resume points of the stream are recorded in stream_metrics.
+    A resumed CSV stream continues without a header.
     """
-    first_record = True
-
-    async for snp in stream_func(*args, **kwargs):
+    metrics = stream_metrics.start(metrics or StreamMetrics(stream_func.__name__))
+    try:
+        batches = stream_func(*args, metrics=metrics, batched=True, resume=resume, **kwargs)
         if format_type == StreamingFormatType.CSV:
-            # For CSV format, create header and comma-separated values with proper escaping
-            if first_record:
-                # Create header row using csv.writer for proper escaping
-                buffer = StringIO()
-                writer = csv.writer(buffer, quoting=csv.QUOTE_MINIMAL)
-                writer.writerow(parsed_fields)
-                yield buffer.getvalue().encode("utf-8")
-                first_record = False
-
-            # Create data row with proper CSV escaping
-            buffer = StringIO()
-            writer = csv.writer(buffer, quoting=csv.QUOTE_MINIMAL)
-
-            values = []
-            for k in parsed_fields:
-                if k == "id":
-                    values.append(str(snp["_id"]))
-                else:
-                    # Get value, use empty string for missing fields instead of "."
-                    value = snp["_source"].get(k, "")
-                    # Convert to string, handle None values
-                    values.append(str(value) if value is not None else "")
-
-            writer.writerow(values)
-            yield buffer.getvalue().encode("utf-8")
+            chunks = _generate_csv(batches, parsed_fields, include_genes, header=resume is None)
+        elif format_type in (StreamingFormatType.PARQUET, StreamingFormatType.ARROW):
+            chunks = generate_arrow(batches, format_type.value, parsed_fields, include_genes)
         else:  # ndjson format
-            # jsonable_encoder -> orjson -> newline (NDJSON)
-            output = convert_hits_to_output(parsed_fields, [snp])
-            if hasattr(output, "details") and output.details:
-                for snp in output.details:
-                    yield orjson.dumps(jsonable_encoder(snp, exclude_none=True)) + b"\n"
+            chunks = _generate_ndjson(batches, parsed_fields, include_genes)
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        stream_metrics.finish(metrics)
+
+
+def _csv_row_builder(parsed_fields: List[str], include_genes: bool) -> Callable:
+    """
+    Returns a function turning a hit into its CSV values: the requested
+    fields in order, "" for missing or null values, and optionally the ids of
+    the overlapping genes.
+    """
+
+    def build_row(snp) -> list:
+        source = snp["_source"]
+        values = [
+            str(snp["_id"])
+            if k == "id"
+            # Use empty string for missing fields instead of "."
+            else ("" if (value := source.get(k, "")) is None else str(value))
+            for k in parsed_fields
+        ]
+        if include_genes:
+            values.append(";".join(get_overlapping_genes(source.get("chr"), source.get("pos"))))
+        return values
+
+    return build_row
+
+
+async def _generate_csv(
+    batches: AsyncIterator, parsed_fields: List[str], include_genes: bool, header: bool = True
+) -> AsyncIterator[bytes]:
+    """
+    Encodes batches of hits as CSV into one reusable buffer and yields it in
+    chunks of about STREAM_CHUNK_SIZE.  The header, if any, is written with the
+    first row.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_MINIMAL)
+    build_row = _csv_row_builder(parsed_fields, include_genes)
+    first_record = header
+
+    async for snps in batches:
+        if first_record and snps:
+            writer.writerow(parsed_fields + ["genes"] if include_genes else parsed_fields)
+            first_record = False
+        for snp in snps:
+            writer.writerow(build_row(snp))
+            if buffer.tell() >= STREAM_CHUNK_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def _generate_ndjson(
+    batches: AsyncIterator, parsed_fields: List[str], include_genes: bool
+) -> AsyncIterator[bytes]:
+    """
+    Encodes batches of hits as NDJSON and yields chunks of about STREAM_CHUNK_SIZE.
+    The rows per chunk follow the size of the rows rendered so far.
+    """
+    rows_per_chunk = 1000
+    async for snps in batches:
+        start = 0
+        while start < len(snps):
+            rows = snps[start : start + rows_per_chunk]
+            start += len(rows)
+            chunk = render_ndjson(parsed_fields, rows, include_genes)
+            rows_per_chunk = max(1, STREAM_CHUNK_SIZE * len(rows) // max(1, len(chunk)))
+            yield chunk
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse releasing its admission ticket once it has been sent"""
+
+    def __init__(self, ticket: AdmissionTicket, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.ticket.release()
 
 
 async def create_streaming_response(
@@ -98,24 +201,101 @@ async def create_streaming_response(
     parsed_fields: List[str],
     filter_args: Optional[FilterArgs],
     *args,
+    include_genes: bool = False,
+    compression: Optional[StreamingCompressionType] = None,
+    compression_level: Optional[int] = None,
+    accept_encoding: Optional[str] = None,
+    resume_from: Optional[str] = None,
+    client: Optional[str] = None,
     **kwargs,
 ) -> StreamingResponse:
     """
     Creates a StreamingResponse with common logic for all download endpoints.
+
+    An explicit compression downloads a compressed file (export.csv.gz, ...).
+    Otherwise the body is compressed with the best encoding the client accepts
+    and sent with Content-Encoding.  compression_level must suit the encoding
+    either way, or the request fails with 400.
+
+    The X-Stream-Id header names the stream at /streams/{id}, which lists its
+    resume tokens.  resume_from restarts the same request after the records
+    counted by the token, for row formats only: parquet and arrow downloads
+    are rejected with 400.
+
+    Downloads hold a slot of download_admission, per client, until the
+    response ends.  When none frees up in time the request fails with 429
+    and a Retry-After header.
     """
+    request_hash = stream_request_hash(
+        stream_func.__name__, parsed_fields, filter_args, include_genes, args, kwargs
+    )
+    resume = None
+    if resume_from and format_type in (StreamingFormatType.PARQUET, StreamingFormatType.ARROW):
+        # Record batches cannot be appended to a broken file
+        raise HTTPException(
+            status_code=400,
+            detail=f"resume_from is not supported for {format_type.value} downloads.",
+        )
+    if resume_from:
+        try:
+            token_hash, resume = decode_resume_token(resume_from, MAX_DOWNLOAD_SIZE)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if token_hash != request_hash:
+            raise HTTPException(
+                status_code=400,
+                detail="resume_from does not belong to this request or the data has changed since.",
+            )
+    metrics = StreamMetrics(stream_func.__name__, request_hash)
+
     headers, media_type = get_streaming_headers_and_media_type(format_type)
+    headers["Vary"] = "Accept-Encoding"
+    headers["X-Stream-Id"] = metrics.id
+
+    encoding = None
+    if compression is None and format_type != StreamingFormatType.PARQUET:
+        # Parquet column chunks are compressed already
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+    elif compression not in (None, StreamingCompressionType.NONE):
+        encoding = compression.value
+        filename = f"export.{format_type.value}{FILE_EXTENSIONS[encoding]}"
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        media_type = MEDIA_TYPES[encoding]
+    if encoding and compression_level is not None and compression_level > MAX_LEVELS[encoding]:
+        # Checked against the negotiated encoding too: compressing at a level
+        # the encoding lacks would fail after the headers were sent
+        raise HTTPException(
+            status_code=400,
+            detail=f"{encoding} compression_level must be at most {MAX_LEVELS[encoding]}.",
+        )
 
     def generator():
-        return generate_stream(
+        chunks = generate_stream(
             stream_func,
             *args,
             format_type=format_type,
             parsed_fields=parsed_fields,
+            include_genes=include_genes,
+            metrics=metrics,
+            resume=resume,
             filter_args=filter_args,
             **kwargs,
         )
+        if encoding:
+            return compress_stream(chunks, encoding, compression_level)
+        return chunks
 
-    return StreamingResponse(generator(), media_type=media_type, headers=headers)
+    try:
+        ticket = await download_admission.acquire(client or "unknown")
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        )
+    return AdmittedStreamingResponse(
+        ticket, generator(), media_type=media_type, headers=headers
+    )
 
 
 @router.post(
@@ -123,7 +303,7 @@ async def create_streaming_response(
     tags=["DOWNLOAD"],
     summary="Download SNPs by chromosome range",
     description=(
-        "Streams every SNP in the specified chromosome interval as CSV (default) or NDJSON without pagination.\n\n"
+        "Streams every SNP in the specified chromosome interval as CSV (default), NDJSON, Parquet or Arrow without pagination.\n\n"
         "**Best for** large exports exceeding the 10,000-record pagination limit.\n"
         "**Constraints**\n"
         f"- Maximum of {MAX_ATTRIB_SIZE} requested attributes.\n"
@@ -131,6 +311,7 @@ async def create_streaming_response(
     ),
 )
 async def download_snps_by_chr(
+    request: Request,
     chromosome_identifier: ChromosomeIdentifierType = Query(
         default=ChromosomeIdentifierType.CHR_1,
         description="Chromosome identifier (`1`–`22` or `X`).",
@@ -154,11 +335,17 @@ async def download_snps_by_chr(
         params.format,
         params._parsed_fields,
         filter_args,
-        params._parsed_fields,
+        params.source_fields(),
         chromosome_identifier.value,
         start_position,
         end_position,
         MAX_DOWNLOAD_SIZE,
+        include_genes=params.include_genes,
+        compression=params.compression,
+        compression_level=params.compression_level,
+        accept_encoding=request.headers.get("accept-encoding"),
+        client=request.client.host if request.client else None,
+        resume_from=params.resume_from,
     )
 
 
@@ -167,11 +354,12 @@ async def download_snps_by_chr(
     tags=["DOWNLOAD"],
     summary="Download SNPs by RSID list",
     description=(
-        "Streams all SNPs whose identifiers match the provided RSIDs as CSV (default) or NDJSON without pagination.\n"
+        "Streams all SNPs whose identifiers match the provided RSIDs as CSV (default), NDJSON, Parquet or Arrow without pagination.\n"
         "Use this endpoint when you need the full result set in a single download."
     ),
 )
 async def download_snps_by_rsidList(
+    request: Request,
     rsid_list: str = Query(
         example="rs1219648,rs2912774,rs2981582,rs1101006,rs1224211,rs1076148,rs2116830,rs1801516,rs2250417,rs1436109,rs1227926,rs1047964,rs900145,rs4757144,rs6486122,rs4627050,rs6578985,rs2074238,rs179429,rs231362,rs231906,rs108961,rs7481311",
         description="Comma-separated RSIDs (e.g. `rs574852966,rs148600903`).",
@@ -191,9 +379,15 @@ async def download_snps_by_rsidList(
         params.format,
         params._parsed_fields,
         filter_args,
-        params._parsed_fields,
+        params.source_fields(),
         rsIDs,
         MAX_DOWNLOAD_SIZE,
+        include_genes=params.include_genes,
+        compression=params.compression,
+        compression_level=params.compression_level,
+        accept_encoding=request.headers.get("accept-encoding"),
+        client=request.client.host if request.client else None,
+        resume_from=params.resume_from,
     )
 
 
@@ -203,10 +397,11 @@ async def download_snps_by_rsidList(
     summary="Download SNPs by gene product",
     description=(
         "Streams every SNP associated with the specified gene product (gene ID, symbol, or UniProt ID) "
-        "as CSV (default) or NDJSON without pagination. Ideal for complete exports beyond the paginated search limit."
+        "as CSV (default), NDJSON, Parquet or Arrow without pagination. Ideal for complete exports beyond the paginated search limit."
     ),
 )
 async def download_snps_by_gene_product(
+    request: Request,
     gene: str = Query(
         example="ZMYND11",
         description="Gene product identifier (gene ID, gene symbol, or UniProt ID).",
@@ -224,7 +419,100 @@ async def download_snps_by_gene_product(
         params.format,
         params._parsed_fields,
         filter_args,
-        params._parsed_fields,
+        params.source_fields(),
         gene,
         MAX_DOWNLOAD_SIZE,
+        include_genes=params.include_genes,
+        compression=params.compression,
+        compression_level=params.compression_level,
+        accept_encoding=request.headers.get("accept-encoding"),
+        client=request.client.host if request.client else None,
+        resume_from=params.resume_from,
+    )
+
+
+@router.post(
+    "/snp/gene_products/download",
+    tags=["DOWNLOAD"],
+    summary="Download SNPs by a list of gene products",
+    description=(
+        "Streams every SNP associated with any of the specified gene products as CSV (default), NDJSON, Parquet or Arrow "
+        "without pagination. All genes are resolved concurrently and exported with a single query.\n\n"
+        f"At most {MAX_GENE_LIST_SIZE} gene products per call."
+    ),
+)
+async def download_snps_by_gene_products(
+    request: Request,
+    genes: str = Query(
+        example="ZMYND11,ABCA1,BRCA2",
+        description="Comma-separated gene product identifiers (gene ID, gene symbol, or UniProt ID).",
+    ),
+    params: StreamingQueryParams = Depends(),
+):
+    filter_args = (
+        FilterArgs(exists=params._parsed_filter_fields)
+        if params._parsed_filter_fields
+        else None
+    )
+
+    return await create_streaming_response(
+        stream_by_gene_products,
+        params.format,
+        params._parsed_fields,
+        filter_args,
+        params.source_fields(),
+        parse_gene_list(genes),
+        MAX_DOWNLOAD_SIZE,
+        include_genes=params.include_genes,
+        compression=params.compression,
+        compression_level=params.compression_level,
+        accept_encoding=request.headers.get("accept-encoding"),
+        client=request.client.host if request.client else None,
+        resume_from=params.resume_from,
+    )
+
+
+@router.post(
+    "/snp/regions/download",
+    tags=["DOWNLOAD"],
+    summary="Download SNPs in a list of regions",
+    description=(
+        "Streams every SNP within the supplied regions as CSV (default), NDJSON, Parquet or Arrow, in genomic order.\n\n"
+        "Regions are given inline (`regions`, 1-based inclusive) and/or as a BED request body. Overlapping "
+        "regions are merged, and large lists are exported chromosome by chromosome in chunks.\n"
+        "**Constraints**\n"
+        f"- At most {MAX_REGION_LIST_SIZE} regions per call.\n"
+        f"- Streaming stops after {MAX_DOWNLOAD_SIZE} records to protect the service."
+    ),
+    openapi_extra=REGIONS_BODY_OPENAPI,
+)
+async def download_snps_by_regions(
+    request: Request,
+    regions: str = Query(
+        default=None,
+        example="1:10000-20000,2:50000-60000",
+        description="Comma-separated `chr:start-end` regions (1-based, inclusive).",
+    ),
+    params: StreamingQueryParams = Depends(),
+):
+    filter_args = (
+        FilterArgs(exists=params._parsed_filter_fields)
+        if params._parsed_filter_fields
+        else None
+    )
+
+    return await create_streaming_response(
+        stream_by_regions,
+        params.format,
+        params._parsed_fields,
+        filter_args,
+        params.source_fields(),
+        await parse_regions_request(request, regions),
+        MAX_DOWNLOAD_SIZE,
+        include_genes=params.include_genes,
+        compression=params.compression,
+        compression_level=params.compression_level,
+        accept_encoding=request.headers.get("accept-encoding"),
+        client=request.client.host if request.client else None,
+        resume_from=params.resume_from,
     )
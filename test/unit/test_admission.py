@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from src.routers.admission import AdmissionController, AdmissionRejected
+
+
+def test_per_client_and_global_limits():
+    async def run():
+        controller = AdmissionController(3, 2, 10, 0.05)
+        a1 = await controller.acquire("a")
+        await controller.acquire("a")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("a")
+
+        await controller.acquire("b")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("c")
+
+        a1.release()
+        a1.release()
+        assert controller.stats()["active"] == 2
+        await controller.acquire("c")
+        assert controller.stats()["rejected"] == 2
+
+    asyncio.run(run())
+
+
+def test_queue_is_served_round_robin():
+    async def run():
+        controller = AdmissionController(1, 1, 10, 5)
+        ticket = await controller.acquire("x")
+        order = []
+
+        async def download(client):
+            granted = await controller.acquire(client)
+            order.append(client)
+            granted.release()
+
+        tasks = [asyncio.create_task(download(c)) for c in ("a", "a", "a", "b", "c")]
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 5
+        ticket.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c", "a", "a"]
+
+    asyncio.run(run())
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def run():
+        controller = AdmissionController(1, 1, 1, 5)
+        ticket = await controller.acquire("a")
+        waiting = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            await controller.acquire("c")
+        assert e.value.retry_after >= 1
+
+        ticket.release()
+        (await waiting).release()
+        assert controller.stats() == {
+            "active": 0,
+            "queued": 0,
+            "rejected": 1,
+            "max_streams": 1,
+            "max_streams_per_client": 1,
+        }
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import asyncio
+import io
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from src.routers.arrow_export import ARROW, PARQUET, generate_arrow
+
+
+async def batches():
+    yield [
+        {"_id": "1:5", "_source": {"chr": "1", "pos": 5, "1000Gp3_AC": "bad"}},
+        {"_id": "1:7", "_source": {"chr": "1", "pos": 7, "1000Gp3_AC": 4}},
+    ]
+    yield [{"_id": "X:9", "_source": {"chr": "X", "pos": 9}}]
+
+
+async def collect(format_type):
+    fields = ["id", "chr", "pos", "1000Gp3_AC"]
+    return b"".join([chunk async for chunk in generate_arrow(batches(), format_type, fields, False)])
+
+
+EXPECTED = [
+    {"id": "1:5", "chr": "1", "pos": 5, "1000Gp3_AC": None},
+    {"id": "1:7", "chr": "1", "pos": 7, "1000Gp3_AC": 4},
+    {"id": "X:9", "chr": "X", "pos": 9, "1000Gp3_AC": None},
+]
+
+
+def test_parquet_row_group_per_batch():
+    parquet = pq.ParquetFile(io.BytesIO(asyncio.run(collect(PARQUET))))
+    assert parquet.metadata.num_row_groups == 2
+    assert parquet.schema_arrow.field("pos").type == pa.int64()
+    assert parquet.schema_arrow.field("chr").type == pa.string()
+    assert parquet.read().to_pylist() == EXPECTED
+
+
+def test_arrow_ipc_stream():
+    table = pa.ipc.open_stream(asyncio.run(collect(ARROW))).read_all()
+    assert table.to_pylist() == EXPECTED
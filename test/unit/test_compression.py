@@ -0,0 +1,34 @@
+import asyncio
+import gzip
+
+from src.routers import compression
+from src.routers.compression import GZIP, ZSTD, compress_stream, negotiate_encoding
+
+
+async def chunks_of(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+async def collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+def test_gzip_stream_round_trip():
+    data = b"chr,pos,ref,alt\n" + b"".join(b"1,%d,A,G\n" % i for i in range(20000))
+    body = asyncio.run(collect(compress_stream(chunks_of(data, 4096), GZIP, 1)))
+    assert gzip.decompress(body) == data
+    assert len(body) < len(data) // 4
+
+
+def test_negotiate_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "ZSTD_AVAILABLE", False)
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate, br") == GZIP
+    assert negotiate_encoding("zstd, gzip;q=0") is None
+    assert negotiate_encoding("*") == GZIP
+
+    monkeypatch.setattr(compression, "ZSTD_AVAILABLE", True)
+    assert negotiate_encoding("gzip, zstd") == ZSTD
+    assert negotiate_encoding("gzip, zstd;q=0") == GZIP
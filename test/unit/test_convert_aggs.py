@@ -0,0 +1,43 @@
+import asyncio
+
+from src.graphql.models.annotation_model import Histogram
+from src.graphql.resolvers.helper_resolver import convert_aggs, get_aggregation_query
+
+
+def es_aggregations(query):
+    values = {
+        "filter": {"doc_count": 7},
+        "min": {"value": 1.0},
+        "max": {"value": 9.0},
+        "missing": {"doc_count": 3},
+        "terms": {"buckets": [{"key": "1", "doc_count": 5}, {"key": "2", "doc_count": 2}]},
+        "histogram": {"buckets": [{"key": 0.0, "doc_count": 7}]},
+    }
+    return {name: values[next(iter(agg))] for name, agg in query.items()}
+
+
+def test_convert_aggs_fills_planned_slots():
+    query = asyncio.run(
+        get_aggregation_query(
+            [("chr", ["doc_count", "min", "max", "frequency", "missing", "histogram"])],
+            Histogram(),
+        )
+    )
+    aggs = convert_aggs(es_aggregations(query))
+    assert aggs.chr.doc_count == 7
+    assert (aggs.chr.min, aggs.chr.max) == (1.0, 9.0)
+    assert [(b.key, b.doc_count) for b in aggs.chr.frequency] == [("1", 5), ("2", 2)]
+    assert aggs.chr.missing.doc_count == 3
+    assert aggs.chr.histogram[0].doc_count == 7
+
+
+def test_convert_aggs_parses_unplanned_names_and_skips_unknown_fields():
+    aggs = convert_aggs(
+        {
+            "chr_missing": {"doc_count": 4},
+            "not_a_field_doc_count": {"doc_count": 1},
+            "chr_unknown": {"value": 1},
+        }
+    )
+    assert aggs.chr.missing.doc_count == 4
+    assert aggs.chr.doc_count is None
@@ -0,0 +1,147 @@
+import asyncio
+
+from src.cache.backends import InMemoryCacheBackend
+from src.cache.result_cache import ResultCache
+from src.cache.singleflight import SingleFlight
+from src.graphql.resolvers import api_count_resolver
+
+
+class FakeCountES:
+    def __init__(self, count=42, buckets=None, fail_search=False):
+        self.count_calls = 0
+        self.search_calls = 0
+        self.result = count
+        self.buckets = buckets or []
+        self.fail_search = fail_search
+
+    async def count(self, index, query):
+        self.count_calls += 1
+        await asyncio.sleep(0)
+        return {"count": self.result}
+
+    async def search(self, index, size, aggs):
+        self.search_calls += 1
+        if self.fail_search:
+            raise ConnectionError("search failed")
+        return {"aggregations": {"chromosomes": {"buckets": self.buckets}}}
+
+
+def use_fake_es(monkeypatch, fake):
+    monkeypatch.setattr(api_count_resolver, "es", fake)
+    monkeypatch.setattr(
+        api_count_resolver,
+        "count_cache",
+        ResultCache("count", InMemoryCacheBackend(max_size=10, ttl_seconds=60)),
+    )
+    monkeypatch.setattr(api_count_resolver, "_count_flight", SingleFlight())
+    monkeypatch.setattr(api_count_resolver, "_chromosome_totals", {})
+    return fake
+
+
+def chromosome_bucket(chr, count, min_pos, max_pos):
+    return {
+        "key": chr,
+        "doc_count": count,
+        "min_pos": {"value": min_pos},
+        "max_pos": {"value": max_pos},
+    }
+
+
+def test_cached_count_miss_then_hit(monkeypatch):
+    fake = use_fake_es(monkeypatch, FakeCountES())
+    query = {"term": {"chr": "1"}}
+
+    async def run():
+        return [await api_count_resolver.cached_count(query) for _ in range(2)]
+
+    assert asyncio.run(run()) == [42, 42]
+    assert fake.count_calls == 1
+    assert api_count_resolver.count_cache.stats()["hits"] == 1
+
+
+def test_cached_count_coalesces_concurrent_counts(monkeypatch):
+    fake = use_fake_es(monkeypatch, FakeCountES())
+    query = {"term": {"chr": "2"}}
+
+    async def run():
+        return await asyncio.gather(*[api_count_resolver.cached_count(query) for _ in range(5)])
+
+    assert asyncio.run(run()) == [42] * 5
+    assert fake.count_calls == 1
+
+
+class FakeDocsES:
+    """
+    Counts documents like elasticsearch does for chromosome_query: the term
+    query on chr matches the lowercased token of the analyzed field, while
+    the totals aggregation runs on chr.keyword
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.count_calls = 0
+        self.search_calls = 0
+
+    async def count(self, index, query):
+        self.count_calls += 1
+        term, pos_range = query["bool"]["filter"]
+        chr, bounds = term["term"]["chr"], pos_range["range"]["pos"]
+        return {
+            "count": sum(
+                1
+                for doc_chr, pos in self.docs
+                if doc_chr.lower() == chr and bounds["gte"] <= pos <= bounds["lte"]
+            )
+        }
+
+    async def search(self, index, size, aggs):
+        self.search_calls += 1
+        by_chr = {}
+        for doc_chr, pos in self.docs:
+            by_chr.setdefault(doc_chr, []).append(pos)
+        buckets = [
+            chromosome_bucket(chr, len(positions), float(min(positions)), float(max(positions)))
+            for chr, positions in by_chr.items()
+        ]
+        return {"aggregations": {"chromosomes": {"buckets": buckets}}}
+
+
+DOCS = [("X", pos) for pos in range(10, 20)] + [("1", pos) for pos in range(5, 8)]
+
+
+def test_whole_chromosome_count_comes_from_totals(monkeypatch):
+    fake = use_fake_es(monkeypatch, FakeDocsES(DOCS))
+
+    async def run():
+        whole = await api_count_resolver.count_by_chromosome("x", 1, 1000)
+        again = await api_count_resolver.count_by_chromosome("x", 10, 19)
+        part = await api_count_resolver.count_by_chromosome("x", 12, 13)
+        return whole, again, part
+
+    whole, again, part = asyncio.run(run())
+    assert (whole.details, again.details, part.details) == (10, 10, 2)
+    assert fake.search_calls == 1
+    assert fake.count_calls == 1
+
+
+def test_totals_agree_with_counted_query(monkeypatch):
+    async def run(chr):
+        fast = await api_count_resolver.count_by_chromosome(chr, 1, 1000)
+        counted = await fake.count(None, api_count_resolver.chromosome_query(chr, 1, 1000))
+        return fast.details, counted["count"]
+
+    for chr in ("X", "x", "1", "Y"):
+        fake = use_fake_es(monkeypatch, FakeDocsES(DOCS))
+        fast, counted = asyncio.run(run(chr))
+        assert fast == counted, chr
+    # The uppercase spelling the analyzed field never matches is counted by the query
+    fake = use_fake_es(monkeypatch, FakeDocsES(DOCS))
+    assert asyncio.run(run("X")) == (0, 0)
+    assert fake.count_calls == 2
+
+
+def test_chromosome_count_falls_back_when_totals_fail(monkeypatch):
+    fake = use_fake_es(monkeypatch, FakeCountES(fail_search=True))
+    result = asyncio.run(api_count_resolver.count_by_chromosome("x", 1, 1000))
+    assert result.details == 42
+    assert fake.count_calls == 1
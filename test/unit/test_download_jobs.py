@@ -0,0 +1,125 @@
+import asyncio
+import gzip
+import time
+
+from src.cache.download_cache import DownloadCache
+from src.graphql.models.annotation_model import DownloadState
+from src.graphql.resolvers import download_resolver
+from src.graphql.resolvers.download_resolver import DownloadJob, DownloadJobRegistry
+
+
+async def records(count, fail_after=None):
+    for i in range(count):
+        if fail_after is not None and i == fail_after:
+            raise RuntimeError("search failed")
+        await asyncio.sleep(0)
+        yield {"_id": str(i), "_source": {"chr": "1", "pos": i}}
+
+
+def test_download_job_writes_file_in_background(monkeypatch, tmp_path):
+    monkeypatch.setattr(download_resolver.settings, "SITE_DOWNLOAD_DIR", str(tmp_path / "downloads"))
+    monkeypatch.setattr(download_resolver.settings, "SIZE_DOWNLOAD_SIZE", 500)
+    monkeypatch.setattr(download_resolver.settings, "DOWNLOAD_WRITE_BUFFER_BYTES", 64)
+    monkeypatch.setattr(download_resolver.settings, "DOWNLOAD_GZIP_COPIES", True)
+    (tmp_path / "downloads").mkdir()
+    registry = DownloadJobRegistry(1)
+    monkeypatch.setattr(download_resolver, "download_jobs", registry)
+
+    async def run():
+        job_id = await download_resolver.download_annotations_from_stream(
+            ["id", "pos", "ref"], records(1000)
+        )
+        job = registry.get(job_id)
+        assert job.state == DownloadState.PENDING
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == DownloadState.DONE
+    assert job.records == 500
+    assert job.url.startswith("/download/downloads/")
+    path = tmp_path / job.url[len("/download/"):]
+    lines = path.read_text().splitlines()
+    assert lines[0] == "id\tpos\tref"
+    assert lines[1] == "0\t0\t."
+    assert len(lines) == 501
+    assert job.bytes_written == sum(len(line) + 1 for line in lines)
+    assert gzip.decompress(path.with_name(path.name + ".gz").read_bytes()) == path.read_bytes()
+
+
+def test_failed_download_job_removes_partial_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(download_resolver.settings, "SITE_DOWNLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(download_resolver.settings, "SIZE_DOWNLOAD_SIZE", 500)
+    registry = DownloadJobRegistry(1)
+
+    async def run():
+        job = registry.start(DownloadJob(["pos"]), records(100, fail_after=10))
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == DownloadState.FAILED
+    assert job.error == "search failed"
+    assert job.url is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_identical_downloads_share_writer_and_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(download_resolver.settings, "SITE_DOWNLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(download_resolver.settings, "SIZE_DOWNLOAD_SIZE", 500)
+    monkeypatch.setattr(download_resolver, "download_jobs", DownloadJobRegistry(2))
+    monkeypatch.setattr(download_resolver, "download_cache", DownloadCache(10**6))
+    query = {"bool": {"filter": [{"term": {"chr": "1"}}]}}
+
+    async def run():
+        download = download_resolver.download_annotations_from_stream
+        first = await download(["pos"], records(100), query)
+        second = await download(["pos"], records(100), query)
+        other = await download(["chr"], records(100), query)
+        assert first == second != other
+        jobs = download_resolver.download_jobs
+        await asyncio.gather(jobs.get(first).task, jobs.get(other).task)
+        third = await download(["pos"], records(100), {"bool": {"filter": [{"term": {"chr": "1"}}]}})
+        return [jobs.get(job_id) for job_id in (first, other, third)]
+
+    first, other, third = asyncio.run(run())
+    assert third.state == DownloadState.DONE and third.cached
+    assert third.url == first.url != other.url
+    assert len(list(tmp_path.iterdir())) == 2
+    assert download_resolver.download_cache.stats()["hits"] == 1
+
+
+def test_download_cache_evicts_least_recently_used_bytes(tmp_path):
+    cache = DownloadCache(100)
+    for key in "abc":
+        (tmp_path / key).write_bytes(b"x" * 40)
+    assert cache.add("a", str(tmp_path / "a"), 40) == []
+    assert cache.add("b", str(tmp_path / "b"), 40) == []
+    assert cache.get("a") == str(tmp_path / "a")
+    assert cache.add("c", str(tmp_path / "c"), 40) == [str(tmp_path / "b")]
+    assert cache.get("b") is None
+    assert cache.stats()["bytes"] == 80
+    # A file larger than the cache stays until the next download replaces it
+    assert cache.add("d", str(tmp_path / "d"), 500) == [str(tmp_path / "a"), str(tmp_path / "c")]
+
+
+def test_download_cache_file_quota_expiry_and_load(tmp_path):
+    cache = DownloadCache(10**6, max_files=2)
+    now = time.time()
+    assert cache.add("a", "a", 1, mtime=now - 500) == []
+    assert cache.add("b", "b", 1, mtime=now - 300) == []
+    cache.mark_used("a")
+    assert cache.add("c", "c", 1) == ["b"]
+    assert cache.expire(200) == []
+    assert cache.expire(0) == ["a", "c"]
+    assert len(cache) == 0
+
+    key = "0" * 64
+    (tmp_path / f"{key}.txt").write_bytes(b"x" * 10)
+    (tmp_path / f"{key}.txt.gz").write_bytes(b"x" * 5)
+    (tmp_path / f"{key}.txt.1234.part").write_bytes(b"x")
+    (tmp_path / "notes.md").write_bytes(b"x")
+    cache = DownloadCache(10**6)
+    assert cache.load(str(tmp_path)) == [str(tmp_path / f"{key}.txt.1234.part")]
+    assert cache.get(key) == str(tmp_path / f"{key}.txt")
+    assert cache.stats()["bytes"] == 15
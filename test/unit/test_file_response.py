@@ -0,0 +1,63 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.routers.file_response import RangeNotSatisfiable, RangedFileResponse, parse_range
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 10)
+    assert parse_range("bytes=90-", 100) == (90, 100)
+    assert parse_range("bytes=-10", 100) == (90, 100)
+    assert parse_range("bytes=50-500", 100) == (50, 100)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+@pytest.fixture
+def client(tmp_path):
+    data = b"".join(b"%d\tA\tG\n" % i for i in range(100000))
+    (tmp_path / "export.txt").write_bytes(data)
+    app = FastAPI()
+
+    @app.get("/file/{name}")
+    async def serve(name: str, request: Request):
+        return RangedFileResponse(str(tmp_path / name), request.headers)
+
+    return TestClient(app), data, tmp_path
+
+
+def test_ranges_and_conditional_requests(client):
+    client, data, _ = client
+    full = client.get("/file/export.txt")
+    assert full.status_code == 200
+    assert full.content == data
+    assert full.headers["accept-ranges"] == "bytes"
+    etag = full.headers["etag"]
+
+    part = client.get("/file/export.txt", headers={"Range": "bytes=1000-2999999"})
+    assert part.status_code == 206
+    assert part.content == data[1000:]
+    assert part.headers["content-range"] == f"bytes 1000-{len(data) - 1}/{len(data)}"
+
+    assert client.get("/file/export.txt", headers={"If-None-Match": etag}).status_code == 304
+    stale = client.get("/file/export.txt", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert stale.status_code == 200
+    assert client.get("/file/export.txt", headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+    assert client.get("/file/missing.txt").status_code == 404
+
+
+def test_gzip_copy_is_served_when_accepted(client):
+    client, data, tmp_path = client
+    (tmp_path / "export.txt.gz").write_bytes(gzip.compress(data))
+    compressed = client.get("/file/export.txt", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.content == data
+    plain = client.get("/file/export.txt", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] != compressed.headers["etag"]
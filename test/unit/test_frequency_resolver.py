@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from src.cache.lru_ttl_cache import LRUTTLCache
+from src.graphql.resolvers import frequency_resolver
+from src.graphql.resolvers.frequency_resolver import decode_after_key, encode_after_key
+
+
+class FakeCompositeES:
+    """Answers composite aggregations over a fixed set of terms"""
+
+    def __init__(self, counts: dict):
+        self.keys = sorted(counts)
+        self.counts = counts
+        self.calls = []
+
+    async def search(self, index, query, size, aggs):
+        composite = aggs["frequency"]["composite"]
+        after = composite.get("after", {}).get("key")
+        self.calls.append((after, composite["size"]))
+        keys = [k for k in self.keys if after is None or k > after][: composite["size"]]
+        buckets = [{"key": {"key": k}, "doc_count": self.counts[k]} for k in keys]
+        return {"aggregations": {"frequency": {"buckets": buckets}}}
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    es = FakeCompositeES({f"v{i:03d}": i + 1 for i in range(250)})
+    monkeypatch.setattr(frequency_resolver, "es", es)
+    monkeypatch.setattr(frequency_resolver, "aggregation_field", lambda field: field)
+    monkeypatch.setattr(frequency_resolver, "FETCH_SIZE", 100)
+    monkeypatch.setattr(frequency_resolver, "frequency_cache", LRUTTLCache(10, 60))
+    return es
+
+
+def read_all(field, query, size):
+    async def run():
+        keys, after = [], None
+        while True:
+            page = await frequency_resolver.frequency_page(field, query, after, size)
+            keys += [b.key for b in page.buckets]
+            if page.after_key is None:
+                return keys
+            after = page.after_key
+
+    return asyncio.run(run())
+
+
+def test_pages_cover_all_buckets_once(fake_es):
+    keys = read_all("chr", {"match_all": {}}, 70)
+    assert keys == fake_es.keys
+    # Later pages reuse the cached buckets instead of recomputing earlier ones
+    assert fake_es.calls == [(None, 100), ("v099", 100), ("v199", 100)]
+
+    fake_es.calls.clear()
+    assert read_all("chr", {"match_all": {}}, 250) == fake_es.keys
+    assert fake_es.calls == []
+
+
+def test_page_resumes_from_after_key_without_cache(fake_es):
+    async def run():
+        first = await frequency_resolver.frequency_page("chr", {"match_all": {}}, None, 10)
+        frequency_resolver.frequency_cache = LRUTTLCache(10, 60)
+        return await frequency_resolver.frequency_page("chr", {"match_all": {}}, first.after_key, 10)
+
+    page = asyncio.run(run())
+    assert [b.key for b in page.buckets] == fake_es.keys[10:20]
+    assert page.buckets[0].doc_count == 11
+    assert fake_es.calls[-1] == ("v009", 100)
+
+
+def test_full_bucket_list_falls_back_to_elasticsearch(fake_es, monkeypatch):
+    monkeypatch.setattr(frequency_resolver, "MAX_CACHED_BUCKETS", 120)
+    assert read_all("chr", {"match_all": {}}, 70) == fake_es.keys
+    entries = list(frequency_resolver.frequency_cache._data.values())
+    assert entries and all(len(entry.buckets) <= 120 for _, entry in entries)
+    # The second page runs past the full list and is fetched on its own
+    assert fake_es.calls[:3] == [(None, 100), ("v099", 20), ("v069", 71)]
+
+
+def test_after_key_round_trip():
+    assert decode_after_key(encode_after_key(20, "v019")) == (20, "v019")
+    with pytest.raises(ValueError):
+        decode_after_key("not a token")
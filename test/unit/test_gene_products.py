@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from src.cache.backends import InMemoryCacheBackend
+from src.cache.result_cache import ResultCache
+from src.cache.singleflight import SingleFlight
+from src.graphql.gene_pos import GeneRecord
+from src.graphql.models.annotation_model import FilterArgs, PageArgs
+from src.graphql.resolvers import api_count_resolver, api_snp_resolver, helper_resolver
+from src.graphql.resolvers import large_result_streaming_resolver as streaming
+from src.routers.snp_router_helpers import parse_gene_list
+
+BRCA2 = GeneRecord("13", 100, 200, "HGNC:1101")
+ABCA1 = GeneRecord("9", 500, 900, "HGNC:29")
+# Symbol and id of the same gene resolve to the same record
+GENES = {"BRCA2": BRCA2, "HGNC:1101": BRCA2, "ABCA1": ABCA1}
+
+
+class FakeGeneES:
+    def __init__(self):
+        self.queries = []
+
+    async def search(self, index, query, **kwargs):
+        self.queries.append(query)
+        if "aggs" in kwargs:
+            buckets = {gene: {"doc_count": 3} for gene in kwargs["aggs"]["genes"]["filters"]["filters"]}
+            return {"hits": {"total": {"value": 5}}, "aggregations": {"genes": {"buckets": buckets}}}
+        return {"hits": {"hits": [{"_id": "13:150A>G", "_source": {"chr": "13", "pos": 150}}]}}
+
+    async def count(self, index, query):
+        self.queries.append(query)
+        return {"count": 5}
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    async def resolve_gene(gene):
+        return GENES.get(gene)
+
+    fake = FakeGeneES()
+    monkeypatch.setattr(helper_resolver, "resolve_gene", resolve_gene)
+    monkeypatch.setattr(api_snp_resolver, "es", fake)
+    monkeypatch.setattr(api_count_resolver, "es", fake)
+    monkeypatch.setattr(api_snp_resolver, "search_cache", ResultCache("search", InMemoryCacheBackend(10, 60)))
+    monkeypatch.setattr(api_count_resolver, "count_cache", ResultCache("count", InMemoryCacheBackend(10, 60)))
+    monkeypatch.setattr(api_count_resolver, "_count_flight", SingleFlight())
+    return fake
+
+
+def test_genes_query_merges_duplicates_and_skips_unknown_genes(fake_es):
+    query = asyncio.run(
+        helper_resolver.genes_query(["BRCA2", "NOPE", "HGNC:1101", "ABCA1"], FilterArgs(exists=["id"]))
+    )
+    genes, exists = query["bool"]["filter"]
+    assert genes["bool"]["minimum_should_match"] == 1
+    assert genes["bool"]["should"] == [
+        helper_resolver.gene_interval_filter(BRCA2),
+        helper_resolver.gene_interval_filter(ABCA1),
+    ]
+    assert genes["bool"]["should"][0]["bool"]["filter"] == [
+        {"term": {"chr": "13"}},
+        {"range": {"pos": {"gte": 100, "lte": 200}}},
+    ]
+    assert exists == {"exists": {"field": "_id"}}
+
+
+def test_no_resolved_gene_gives_empty_results(fake_es):
+    async def run():
+        query = await helper_resolver.genes_query(["NOPE", "NADA"])
+        search = await api_snp_resolver.search_by_gene_products(["chr"], ["NOPE"], PageArgs())
+        count = await api_count_resolver.count_by_gene_products(["NOPE", "NADA"])
+        streamed = [hit async for hit in streaming.stream_by_gene_products(["chr"], ["NOPE"], 10)]
+        return query, search, count, streamed
+
+    query, search, count, streamed = asyncio.run(run())
+    assert query is None
+    assert json.loads(search.body)["success"] is False
+    assert (count.success, count.details, count.unresolved_genes) == (False, -1, ["NOPE", "NADA"])
+    assert streamed == []
+    assert fake_es.queries == []
+
+
+def test_search_and_count_by_gene_products(fake_es):
+    async def run():
+        search = await api_snp_resolver.search_by_gene_products(
+            ["chr", "pos"], ["BRCA2", "ABCA1", "NOPE"], PageArgs(from_=0, size=10)
+        )
+        total = await api_count_resolver.count_by_gene_products(["BRCA2", "NOPE"])
+        per_gene = await api_count_resolver.count_by_gene_products(["BRCA2", "ABCA1"], per_gene=True)
+        return search, total, per_gene
+
+    search, total, per_gene = asyncio.run(run())
+    body = json.loads(search.body)
+    assert body["success"] is True
+    assert body["details"] == [{"chr": "13", "pos": 150}]
+    assert len(fake_es.queries[0]["bool"]["filter"][0]["bool"]["should"]) == 2
+
+    assert (total.success, total.details, total.unresolved_genes) == (True, 5, ["NOPE"])
+    assert per_gene.details == 5
+    assert per_gene.gene_counts == {"BRCA2": 3, "ABCA1": 3}
+    assert per_gene.unresolved_genes is None
+
+
+def test_parse_gene_list():
+    assert parse_gene_list(" BRCA2,ABCA1,,BRCA2 ") == ["BRCA2", "ABCA1"]
+    with pytest.raises(HTTPException):
+        parse_gene_list(" , ")
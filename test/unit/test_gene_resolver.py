@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from src.cache.lru_ttl_cache import MISSING, LRUTTLCache
+from src.graphql.gene_pos import GeneResolver
+
+
+class CountingResolver(GeneResolver):
+    def __init__(self, results):
+        super().__init__()
+        self.results = results
+        self.calls = 0
+
+    async def _fetch(self, gene):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        accession = self.results.get(gene, '')
+        self._cache.set(gene, accession)
+        return accession
+
+
+def test_lru_ttl_cache_eviction_and_expiry():
+    cache = LRUTTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    cache.set("d", '', ttl_seconds=-1)
+    assert cache.get("d") is MISSING
+
+
+@pytest.mark.asyncio_cooperative
+async def test_gene_resolver_coalesces_and_caches():
+    resolver = CountingResolver({"ZMYND11": "HUMAN|HGNC=16966|UniProtKB=Q15326"})
+    results = await asyncio.gather(*[resolver.resolve("ZMYND11") for _ in range(10)])
+    assert set(results) == {"HUMAN|HGNC=16966|UniProtKB=Q15326"}
+    assert resolver.calls == 1
+
+    assert await resolver.resolve("NOT_A_GENE") == ''
+    assert await resolver.resolve("NOT_A_GENE") == ''
+    assert resolver.calls == 2
+
+
+def test_gene_index_lookup_by_identifier():
+    from src.graphql.gene_pos import gene_index
+
+    record = gene_index.lookup("HUMAN|HGNC=10741|UniProtKB=O75326")
+    assert record == ("15", 74708980, 74726001, "HUMAN|HGNC=10741|UniProtKB=O75326")
+    assert gene_index.lookup("HGNC:10741") == record
+    assert gene_index.lookup("hgnc=10741") == record
+    assert gene_index.lookup("o75326") == record
+    assert gene_index.lookup("ENSG00000216921").contig == "2"
+    assert gene_index.lookup("NOT_A_GENE") is None
+
+
+def test_gene_overlap_index():
+    from src.graphql.gene_pos import GeneOverlapIndex, GeneRecord
+
+    index = GeneOverlapIndex([
+        GeneRecord("1", 100, 200, "A"),
+        GeneRecord("1", 150, 300, "B"),
+        GeneRecord("1", 260, 250, "C"),
+        GeneRecord("2", 100, 200, "D"),
+    ])
+    assert index.genes_at("1", 99) == ()
+    assert index.genes_at("1", 100) == ("A",)
+    assert set(index.genes_at("1", 200)) == {"A", "B"}
+    assert set(index.genes_at("1", 255)) == {"B", "C"}
+    assert index.genes_at("1", 301) == ()
+    assert index.genes_at("2", 150) == ("D",)
+    assert index.genes_at("Y", 150) == ()
@@ -40,3 +40,58 @@ def test_class_schema():
         assert data['title'] == "Snp"
         assert data['properties']['chr'] == {"type": "model.Annotation"}
         assert data['properties']['_1000Gp3_AC'] == {"type": "model.Annotation"}
+
+
+def validated_snp_output(fields, hits, include_genes=False) -> bytes:
+    """
+    Body of an OutputSnpInfo response built by validating the requested
+    fields of every hit with SnpModel, as the routes did before rendering
+    """
+    import orjson
+    from src.data_adapter.snp_attributes import get_version_info
+    from src.graphql.gene_pos import get_overlapping_genes
+    from src.graphql.models.generated.snp import SnpModel
+    from src.graphql.models.return_info_model import OutputSnpInfo
+    from src.utils import clean_field_name
+
+    details = [
+        SnpModel(**{clean_field_name(f): hit["_source"][f] for f in fields if f in hit["_source"]})
+        for hit in hits
+    ]
+    genes = None
+    if include_genes:
+        genes = [
+            list(get_overlapping_genes(hit["_source"].get("chr"), hit["_source"].get("pos")))
+            for hit in hits
+        ]
+    output = OutputSnpInfo(
+        success=True, message="OK", details=details, version=get_version_info(fields), genes=genes
+    )
+    # Revalidated and dumped the way FastAPI serializes a response_model
+    return orjson.dumps(
+        OutputSnpInfo.model_validate(output.model_dump(by_alias=True)).model_dump(
+            mode="json", by_alias=True, exclude_none=True
+        )
+    )
+
+
+def test_render_snp_output_matches_response_model():
+    from src.graphql.resolvers.api_snp_helper_resolver import render_snp_output
+
+    fields = ["ref", "pos", "chr", "1000Gp3_AC", "1000Gp3_AF"]
+    hits = [
+        {"_source": {"ref": "A", "pos": 5, "chr": "1", "1000Gp3_AC": None}},
+        {"_source": {"pos": 7, "chr": "1", "1000Gp3_AC": 3, "1000Gp3_AF": 0.5}},
+        # int-valued float fields and numeric strings in long fields
+        {"_source": {"pos": "7", "chr": "X", "1000Gp3_AC": "3", "1000Gp3_AF": 1}},
+    ]
+    rendered = render_snp_output(fields, hits)
+    assert rendered == validated_snp_output(fields, hits)
+    assert b'"pos":7,"_1000Gp3_AC":3,"_1000Gp3_AF":1.0' in rendered
+    assert render_snp_output(fields, hits[:2], include_genes=True) == validated_snp_output(
+        fields, hits[:2], include_genes=True
+    )
+    # chr and pos fetched only for the gene lookup stay out of the details
+    located = render_snp_output(["ref"], hits[:2], include_genes=True)
+    assert located == validated_snp_output(["ref"], hits[:2], include_genes=True)
+    assert b'"pos"' not in located
@@ -0,0 +1,196 @@
+import asyncio
+from src.graphql.resolvers import large_result_streaming_resolver as streaming
+from src.graphql.resolvers.stream_metrics import StreamMetrics
+
+
+class FakeSlicedES:
+    """Serves search_after pages of sorted docs split across PIT slices"""
+
+    def __init__(self, positions):
+        self.docs = [{"_id": str(i), "pos": pos} for i, pos in enumerate(positions)]
+        self.closed = False
+
+    async def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit"}
+
+    async def close_point_in_time(self, body):
+        self.closed = True
+
+    async def search(self, body):
+        await asyncio.sleep(0)
+        docs = self.docs
+        if "slice" in body:
+            docs = [d for d in docs if int(d["_id"]) % body["slice"]["max"] == body["slice"]["id"]]
+        hits = sorted(
+            ({"_id": d["_id"], "_source": {"pos": d["pos"]}, "sort": [d["pos"], int(d["_id"])]} for d in docs),
+            key=lambda hit: hit["sort"],
+        )
+        if "search_after" in body:
+            hits = [hit for hit in hits if hit["sort"] > body["search_after"]]
+        return {"hits": {"hits": hits[: body["size"]]}}
+
+
+async def collect(stream):
+    return [hit async for hit in stream]
+
+
+# These tests patch the module level client, so they run outside the
+# cooperative runner to keep them from interleaving.
+def test_sliced_stream_ordered_merge(monkeypatch):
+    fake = FakeSlicedES([7, 3, 9, 1, 3, 8, 2, 6, 5, 4, 0])
+    monkeypatch.setattr(streaming, "es_bulk", fake)
+    metrics = StreamMetrics()
+    hits = asyncio.run(
+        collect(
+            streaming._stream_search_with_pit(
+                ["pos"],
+                {},
+                100,
+                batch_size=2,
+                sort=[{"pos": "asc"}],
+                ordered=True,
+                slices=3,
+                metrics=metrics,
+            )
+        )
+    )
+    assert [hit["_source"]["pos"] for hit in hits] == sorted(d["pos"] for d in fake.docs)
+    assert metrics.hits == 11
+    assert metrics.batches == 6
+    assert fake.closed
+
+
+def test_sliced_stream_unordered_respects_max_results(monkeypatch):
+    fake = FakeSlicedES(range(50))
+    monkeypatch.setattr(streaming, "es_bulk", fake)
+    hits = asyncio.run(
+        collect(streaming._stream_search_with_pit(["pos"], {}, 20, batch_size=4, slices=4))
+    )
+    assert len(hits) == 20
+    assert len({hit["_id"] for hit in hits}) == 20
+    assert fake.closed
+
+
+def test_resume_point_restarts_after_consumed_batches(monkeypatch):
+    fake = FakeSlicedES(range(40))
+    monkeypatch.setattr(streaming, "es_bulk", fake)
+
+    async def interrupted():
+        metrics = StreamMetrics()
+        received = []
+        stream = streaming._stream_search_with_pit(
+            ["pos"], {}, 100, batch_size=3, slices=2, metrics=metrics, batched=True
+        )
+        async for hits in stream:
+            received += hits
+            if len(received) >= 12:
+                break
+        await stream.aclose()
+        return received, metrics.resume_points[-1]
+
+    received, point = asyncio.run(interrupted())
+    # The PIT is kept for resuming and the batch being consumed is not covered
+    assert not fake.closed
+    assert point.rows == len(received) - 3
+
+    rest = asyncio.run(
+        collect(streaming._stream_search_with_pit(["pos"], {}, 100, batch_size=3, resume=point))
+    )
+    ids = [hit["_id"] for hit in received[: point.rows] + rest]
+    assert sorted(ids, key=int) == [str(i) for i in range(40)]
+    assert fake.closed
+
+
+def test_failed_stream_closes_pit(monkeypatch):
+    class FailingES(FakeSlicedES):
+        async def search(self, body):
+            if "search_after" in body:
+                raise ConnectionError("search failed")
+            return await super().search(body)
+
+    fake = FailingES(range(40))
+    monkeypatch.setattr(streaming, "es_bulk", fake)
+
+    async def run():
+        received = []
+        try:
+            async for hits in streaming._stream_search_with_pit(
+                ["pos"], {}, 100, batch_size=3, slices=2, batched=True
+            ):
+                received += hits
+        except ConnectionError:
+            return received
+        raise AssertionError("the search error was not raised")
+
+    assert len(asyncio.run(run())) <= 6
+    assert fake.closed
+
+
+def test_resume_token_positions_are_range_checked():
+    import pytest
+    from src.graphql.resolvers.resume_token import (
+        ResumePoint,
+        decode_resume_token,
+        encode_resume_token,
+    )
+
+    point = ResumePoint("pit", ([3, 7], None), 10, 1)
+    assert decode_resume_token(encode_resume_token("h", point), 100) == ("h", point)
+    for bad in (
+        ResumePoint("pit", (), -1, 0),
+        ResumePoint("pit", (), 0, -1),
+        ResumePoint("pit", (), 101, 0),
+        ResumePoint("pit", ({"a": 1},), 0, 0),
+        ResumePoint("pit", ([[1]],), 0, 0),
+        ResumePoint(5, (), 0, 0),
+    ):
+        with pytest.raises(ValueError):
+            decode_resume_token(encode_resume_token("h", bad), 100)
+
+
+def test_resume_point_at_max_results_reads_nothing(monkeypatch):
+    fake = FakeSlicedES(range(10))
+    monkeypatch.setattr(streaming, "es_bulk", fake)
+    point = streaming.ResumePoint("pit", (None,), 5, 0)
+    hits = asyncio.run(collect(streaming._stream_search_with_pit(["pos"], {}, 5, resume=point)))
+    assert hits == []
+    assert fake.closed
+
+
+def test_adaptive_batch_size_follows_measured_bytes(monkeypatch):
+    monkeypatch.setattr(streaming.settings, "STREAM_TARGET_BATCH_BYTES", 100_000)
+    monkeypatch.setattr(streaming.settings, "STREAM_MIN_BATCH_SIZE", 10)
+    monkeypatch.setattr(streaming.settings, "STREAM_MAX_BATCH_SIZE", 5000)
+
+    narrow = streaming.AdaptiveBatchSize(3)
+    wide = streaming.AdaptiveBatchSize(40)
+    assert narrow.size > wide.size
+
+    wide.observe(100, 100 * 2000)
+    assert wide.size == 50
+    wide.observe(100, 100 * 1_000_000)
+    assert wide.size == 10
+    narrow.observe(1000, 1000 * 10)
+    assert narrow.size == 5000
+
+    fixed = streaming.AdaptiveBatchSize(3, batch_size=7)
+    fixed.observe(100, 100 * 2000)
+    assert fixed.size == 7
+
+
+def test_stream_records_batch_sizes(monkeypatch):
+    monkeypatch.setattr(streaming.settings, "STREAM_TARGET_BATCH_BYTES", 400)
+    monkeypatch.setattr(streaming.settings, "STREAM_MIN_BATCH_SIZE", 2)
+    monkeypatch.setattr(streaming.settings, "STREAM_MAX_BATCH_SIZE", 1000)
+    fake = FakeSlicedES(range(60))
+    monkeypatch.setattr(streaming, "es_bulk", fake)
+    metrics = StreamMetrics()
+    hits = asyncio.run(
+        collect(streaming._stream_search_with_pit(["pos"], {}, 100, slices=1, metrics=metrics))
+    )
+    assert len(hits) == 60
+    stats = metrics.as_dict()
+    # The first page is sized from the field count, the next ones from the hits seen
+    assert stats["recent_responses"][0]["size"] == 2
+    assert stats["batch_size_max"] > 2
+    assert stats["response_bytes"] > 0
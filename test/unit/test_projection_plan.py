@@ -0,0 +1,45 @@
+from src.graphql.resolvers import helper_resolver
+from src.graphql.resolvers.api_snp_helper_resolver import (
+    ProjectionPlan,
+    get_projection_plan,
+)
+
+
+def test_projection_plan_renames_and_orders_fields():
+    plan = ProjectionPlan(("ref", "1000Gp3_AC", "chr", "not_in_model"))
+    source = {"ref": None, "1000Gp3_AC": 3, "chr": "1", "not_in_model": "x", "pos": 5}
+
+    assert plan.project(source) == {
+        "ref": None,
+        "_1000Gp3_AC": 3,
+        "chr": "1",
+        "not_in_model": "x",
+    }
+    assert plan.project_attributes(source)["field_1000Gp3_AC"] == 3
+    # Only the non-null SnpModel fields, in SnpModel order
+    assert list(plan.project_output(source).items()) == [("chr", "1"), ("_1000Gp3_AC", 3)]
+    assert plan.project({}) == {}
+
+
+def test_get_projection_plan_is_cached_per_field_list():
+    plan = get_projection_plan(["chr", "pos"])
+    assert get_projection_plan(["chr", "pos"]) is plan
+    assert get_projection_plan(["pos", "chr"]) is not plan
+
+
+def test_hits_to_snps_with_and_without_validation(monkeypatch):
+    hits = [
+        {"_id": "1:5A>G", "_source": {"chr": "1", "pos": 5, "1000Gp3_AC": 2}},
+        {"_id": "1:7C>T", "_source": {"chr": "1", "pos": 7}},
+    ]
+
+    def as_tuples(snps):
+        return [(s.id, s.chr, s.pos, s.field_1000Gp3_AC) for s in snps]
+
+    expected = [("1:5A>G", "1", 5, 2), ("1:7C>T", "1", 7, None)]
+    assert as_tuples(helper_resolver._hits_to_snps(hits, ["chr", "pos", "1000Gp3_AC"])) == expected
+    # Without the requested fields, each hit is projected on its own keys
+    assert as_tuples(helper_resolver._hits_to_snps(hits)) == expected
+
+    monkeypatch.setattr(helper_resolver.settings, "VALIDATE_SNP_OUTPUT", True)
+    assert as_tuples(helper_resolver._hits_to_snps(hits, ["chr", "pos", "1000Gp3_AC"])) == expected
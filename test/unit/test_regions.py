@@ -0,0 +1,90 @@
+import pytest
+from src.graphql.regions import (
+    Region,
+    chunk_regions,
+    merge_regions,
+    parse_bed,
+    parse_inline_regions,
+)
+
+
+def test_parse_inline_regions():
+    assert parse_inline_regions("1:100-200, chrX:5-10,") == [
+        Region("1", 100, 200),
+        Region("X", 5, 10),
+    ]
+    with pytest.raises(ValueError):
+        parse_inline_regions("1:100")
+    with pytest.raises(ValueError):
+        parse_inline_regions("1:200-100")
+
+
+def test_parse_bed_converts_to_one_based():
+    bed = "track name=panel\n# comment\nchr2\t99\t200\tgeneA\n\nchr1 0 10\n"
+    assert parse_bed(bed) == [Region("2", 100, 200), Region("1", 1, 10)]
+    with pytest.raises(ValueError):
+        parse_bed("chr1\tx\t10")
+
+
+def test_parse_bed_skips_empty_and_rejects_reversed_intervals():
+    assert parse_bed("chr1\t100\t100\nchr1\t100\t101\n") == [Region("1", 101, 101)]
+    with pytest.raises(ValueError):
+        parse_bed("chr1\t200\t100")
+
+
+def test_merge_regions_genomic_order():
+    regions = [
+        Region("10", 5, 9),
+        Region("2", 300, 400),
+        Region("2", 100, 200),
+        Region("2", 150, 250),
+        Region("2", 251, 260),
+        Region("X", 1, 2),
+        Region("1", 10, 50),
+    ]
+    assert merge_regions(regions) == [
+        Region("1", 10, 50),
+        Region("2", 100, 260),
+        Region("2", 300, 400),
+        Region("10", 5, 9),
+        Region("X", 1, 2),
+    ]
+
+
+def test_chunk_regions_single_chromosome_chunks():
+    regions = [Region("1", i * 10, i * 10 + 5) for i in range(5)] + [Region("2", 1, 2)]
+    chunks = chunk_regions(regions, chunk_size=2)
+    assert [len(c) for c in chunks] == [2, 2, 1, 1]
+    assert all(len({r.contig for r in c}) == 1 for c in chunks)
+
+
+def test_search_by_regions_sorts_with_unique_tiebreaker(monkeypatch):
+    import asyncio
+    import json
+
+    from src.cache.backends import InMemoryCacheBackend
+    from src.cache.result_cache import ResultCache
+    from src.graphql.models.annotation_model import PageArgs
+    from src.graphql.resolvers import api_snp_resolver
+
+    class FakeES:
+        def __init__(self):
+            self.searches = []
+
+        async def count(self, index, query):
+            return {"count": 3}
+
+        async def search(self, **kwargs):
+            self.searches.append(kwargs)
+            return {"hits": {"hits": [{"_id": "1:5A>G", "_source": {"pos": 5}}]}}
+
+    fake = FakeES()
+    monkeypatch.setattr(api_snp_resolver, "es", fake)
+    monkeypatch.setattr(api_snp_resolver, "search_cache", ResultCache("search", InMemoryCacheBackend(10, 60)))
+    regions = [Region("1", 1, 10), Region("2", 1, 10)]
+    response = asyncio.run(api_snp_resolver.search_by_regions(["pos"], regions, PageArgs(from_=2, size=2)))
+    assert json.loads(response.body)["success"] is True
+    # The page spans the last record of the first chunk and the first of the second
+    assert [(s["from_"], s["size"]) for s in fake.searches] == [(2, 1), (0, 1)]
+    assert all(s["sort"] == api_snp_resolver.REGION_SORT for s in fake.searches)
+    assert api_snp_resolver.REGION_SORT[0] == {"pos": "asc"}
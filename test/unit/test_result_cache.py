@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from src.cache import result_cache
+from src.cache.backends import InMemoryCacheBackend
+from src.cache.lru_ttl_cache import MISSING
+from src.cache.result_cache import ResultCache
+
+
+@pytest.mark.asyncio_cooperative
+async def test_result_cache_canonical_keys_and_counters():
+    cache = ResultCache("test", InMemoryCacheBackend(max_size=10, ttl_seconds=60))
+    key = cache.make_key({"bool": {"filter": [1], "must": 2}}, ["chr", "pos"], 0, 50)
+    same = cache.make_key({"bool": {"must": 2, "filter": [1]}}, ["chr", "pos"], 0, 50)
+    other_page = cache.make_key({"bool": {"must": 2, "filter": [1]}}, ["chr", "pos"], 50, 50)
+    assert key == same
+    assert key != other_page
+
+    assert await cache.get(key) is MISSING
+    await cache.set(key, "result")
+    assert await cache.get(same) == "result"
+    assert cache.stats() == {"hits": 1, "misses": 1, "errors": 0, "size": 1}
+
+
+def test_result_cache_index_generation_invalidates(monkeypatch):
+    cache = ResultCache("test", InMemoryCacheBackend(max_size=10, ttl_seconds=60))
+
+    async def run():
+        key = cache.make_key("query")
+        await cache.set(key, "result")
+        monkeypatch.setattr(result_cache.settings, "ES_INDEX_GENERATION", "reloaded")
+        return await cache.get(cache.make_key("query"))
+
+    assert asyncio.run(run()) is MISSING
+
+
+class FailingBackend(InMemoryCacheBackend):
+    async def get(self, key):
+        raise ConnectionError("cache down")
+
+    async def set(self, key, value, ttl_seconds=None):
+        raise ConnectionError("cache down")
+
+
+@pytest.mark.asyncio_cooperative
+async def test_result_cache_backend_failures_are_misses():
+    cache = ResultCache("test", FailingBackend(max_size=10, ttl_seconds=60))
+    key = cache.make_key("query")
+    await cache.set(key, "result")
+    assert await cache.get(key) is MISSING
+    assert cache.stats()["errors"] == 2
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,122 @@
+import asyncio
+import csv
+from io import StringIO
+
+from src.routers import streaming
+
+
+async def batches_of(hits, size):
+    for i in range(0, len(hits), size):
+        yield hits[i : i + size]
+
+
+async def collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def stream_nothing(*args, **kwargs):
+    return
+    yield
+
+
+def per_row_csv(hits, fields):
+    """CSV written one record at a time, as downloads were originally encoded"""
+    out = []
+    for n, snp in enumerate(hits):
+        if n == 0:
+            buffer = StringIO()
+            csv.writer(buffer, quoting=csv.QUOTE_MINIMAL).writerow(fields)
+            out.append(buffer.getvalue().encode("utf-8"))
+        buffer = StringIO()
+        values = []
+        for k in fields:
+            if k == "id":
+                values.append(str(snp["_id"]))
+            else:
+                value = snp["_source"].get(k, "")
+                values.append(str(value) if value is not None else "")
+        csv.writer(buffer, quoting=csv.QUOTE_MINIMAL).writerow(values)
+        out.append(buffer.getvalue().encode("utf-8"))
+    return b"".join(out)
+
+
+def test_batched_csv_matches_per_row_encoding(monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_CHUNK_SIZE", 256)
+    fields = ["id", "chr", "pos", "ref", "note"]
+    hits = [
+        {
+            "_id": f"1:{i}",
+            "_source": {"chr": "1", "pos": i, "ref": None, "note": 'a,"b"\n' if i % 3 else 0.5},
+        }
+        for i in range(100)
+    ]
+    body = asyncio.run(collect(streaming._generate_csv(batches_of(hits, 7), fields, False)))
+    assert body == per_row_csv(hits, fields)
+
+
+def test_batched_csv_empty_stream_has_no_header():
+    body = asyncio.run(collect(streaming._generate_csv(batches_of([], 7), ["chr"], False)))
+    assert body == b""
+
+
+def test_batched_ndjson_matches_per_row_encoding(monkeypatch):
+    import orjson
+    from src.graphql.gene_pos import get_overlapping_genes
+    from src.graphql.models.generated.snp import SnpModel
+
+    monkeypatch.setattr(streaming, "STREAM_CHUNK_SIZE", 64)
+    # chr and pos are fetched for the gene lookup only and left out of the rows
+    fields = ["ref", "1000Gp3_AC"]
+    hits = [
+        {"_id": str(i), "_source": {"chr": "1", "pos": i, "ref": None, "1000Gp3_AC": i % 2 or None}}
+        for i in range(50)
+    ]
+    expected = b""
+    for snp in hits:
+        source = snp["_source"]
+        row = SnpModel(_1000Gp3_AC=source["1000Gp3_AC"], ref=source["ref"]).model_dump(
+            mode="json", by_alias=True, exclude_none=True
+        )
+        row["genes"] = list(get_overlapping_genes(source["chr"], source["pos"]))
+        expected += orjson.dumps(row) + b"\n"
+
+    body = asyncio.run(collect(streaming._generate_ndjson(batches_of(hits, 9), fields, True)))
+    assert body == expected
+
+
+def test_negotiated_gzip_rejects_zstd_only_levels(monkeypatch):
+    import pytest
+    from fastapi import HTTPException
+    from src.routers import compression
+    from src.routers.snp_router_helpers import StreamingFormatType
+
+    monkeypatch.setattr(compression, "ZSTD_AVAILABLE", False)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(
+            streaming.create_streaming_response(
+                stream_nothing,
+                StreamingFormatType.CSV,
+                ["chr", "pos"],
+                None,
+                compression_level=12,
+                accept_encoding="gzip",
+            )
+        )
+    assert e.value.status_code == 400
+    assert "at most 9" in e.value.detail
+
+
+def test_resume_from_is_rejected_for_columnar_formats():
+    import pytest
+    from fastapi import HTTPException
+    from src.routers.snp_router_helpers import StreamingFormatType
+
+    for format_type in (StreamingFormatType.PARQUET, StreamingFormatType.ARROW):
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(
+                streaming.create_streaming_response(
+                    stream_nothing, format_type, ["chr", "pos"], None, resume_from="token"
+                )
+            )
+        assert e.value.status_code == 400
+        assert "not supported" in e.value.detail